@@ -0,0 +1,176 @@
+"""
+JWT認証でのユーザー取得をキャッシュする認証クラス
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+logger = logging.getLogger(__name__)
+
+
+def user_cache_key(user_id):
+    # v2: User インスタンスではなくフィールドの値を保存する形式
+    return f'auth_user:v2:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """ユーザー情報の変更時にキャッシュを削除する"""
+    try:
+        cache.delete(user_cache_key(user_id))
+    except Exception:
+        logger.warning('Failed to invalidate cached user %s', user_id, exc_info=True)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication と同じ検証を行い、ユーザーの取得だけを短時間キャッシュする
+    - キャッシュ時間: AUTH_USER_CACHE_TIMEOUT 秒（0でキャッシュ無効）
+    - キャッシュするのはパスワードハッシュを除いたフィールドの値だけ（復元したユーザーの password は遅延読み込み）
+    - ユーザー保存・削除時にシグナルでキャッシュを削除（accounts.signals）
+    - キャッシュで省略したクエリ数を request.auth_queries_saved に記録
+    """
+
+    def authenticate(self, request):
+        self.queries_saved = 0
+        result = super().authenticate(request)
+        if result is not None:
+            request._request.auth_queries_saved = self.queries_saved
+        return result
+
+    def get_user(self, validated_token):
+        user_id = self._get_user_id(validated_token)
+
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+        cached = self._get_cached_user(user_id) if timeout else None
+
+        if cached is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cached = self._dump_user(user)
+            if timeout:
+                self._set_cached_user(user_id, cached, timeout)
+        else:
+            user = self._load_user(cached)
+            self.queries_saved = 1
+
+        self._check_user(user, validated_token, cached.get('password_md5'))
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        非同期ビュー用の authenticate()
+        トークンの検証は同期処理のまま、キャッシュとDBへのアクセスを非同期で行う
+        """
+        self.queries_saved = 0
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        request.auth_queries_saved = self.queries_saved
+        return user, validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self._get_user_id(validated_token)
+
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+        cached = await self._aget_cached_user(user_id) if timeout else None
+
+        if cached is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cached = self._dump_user(user)
+            if timeout:
+                await self._aset_cached_user(user_id, cached, timeout)
+        else:
+            user = self._load_user(cached)
+            self.queries_saved = 1
+
+        self._check_user(user, validated_token, cached.get('password_md5'))
+        return user
+
+    def _get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _dump_user(self, user):
+        """
+        キャッシュに保存する値（パスワードハッシュを除いたフィールドの値）
+        CHECK_REVOKE_TOKEN のときはトークンとの照合に使うハッシュのMD5だけを持つ
+        """
+        data = {
+            'fields': {
+                field.attname: getattr(user, field.attname)
+                for field in self.user_model._meta.concrete_fields
+                if field.attname != 'password'
+            },
+        }
+        if api_settings.CHECK_REVOKE_TOKEN:
+            data['password_md5'] = get_md5_hash_password(user.password)
+        return data
+
+    def _load_user(self, data):
+        # password は遅延フィールドとして復元する（参照すると読み込み、save() では書き込まない）
+        fields = data['fields']
+        names = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in fields]
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model), names, [fields[name] for name in names],
+        )
+
+    def _check_user(self, user, validated_token, password_md5=None):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if password_md5 is None:
+                password_md5 = get_md5_hash_password(user.password)
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_md5:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+    def _get_cached_user(self, user_id):
+        # キャッシュ障害時はDBから取得する
+        try:
+            return cache.get(user_cache_key(user_id))
+        except Exception:
+            logger.warning('Failed to read cached user %s', user_id, exc_info=True)
+            return None
+
+    def _set_cached_user(self, user_id, data, timeout):
+        try:
+            cache.set(user_cache_key(user_id), data, timeout)
+        except Exception:
+            logger.warning('Failed to cache user %s', user_id, exc_info=True)
+
+    async def _aget_cached_user(self, user_id):
+        try:
+            return await cache.aget(user_cache_key(user_id))
+        except Exception:
+            logger.warning('Failed to read cached user %s', user_id, exc_info=True)
+            return None
+
+    async def _aset_cached_user(self, user_id, data, timeout):
+        try:
+            await cache.aset(user_cache_key(user_id), data, timeout)
+        except Exception:
+            logger.warning('Failed to cache user %s', user_id, exc_info=True)
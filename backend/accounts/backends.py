@@ -0,0 +1,24 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    メールアドレスとパスワードで認証するバックエンド
+    小文字化したメールアドレスの一意インデックスを1回検索するだけで認証する
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+
+        user = User.get_by_email(email)
+        if user is None:
+            # ユーザーの有無で応答時間が変わらないようにハッシュ計算を行う
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,67 @@
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from accounts.models import RevokedToken
+from accounts.token_blacklist import RedisTokenBlacklist, get_token_blacklist
+
+LEGACY_BLACKLIST_TABLE = 'token_blacklist_blacklistedtoken'
+LEGACY_OUTSTANDING_TABLE = 'token_blacklist_outstandingtoken'
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy still-valid blacklisted JTIs from the simplejwt token_blacklist tables '
+        'and the database into the configured token blacklist store'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--purge-legacy',
+            action='store_true',
+            help='Delete all rows from the simplejwt token_blacklist tables after copying'
+        )
+
+    def handle(self, *args, **options):
+        store = get_token_blacklist()
+        now = timezone.now()
+        self.stdout.write(f'Token blacklist store: {store.__class__.__name__}')
+
+        # simplejwt の token_blacklist テーブル（存在する場合のみ）
+        tables = connection.introspection.table_names()
+        if LEGACY_BLACKLIST_TABLE in tables and LEGACY_OUTSTANDING_TABLE in tables:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT o.jti, o.expires_at FROM {LEGACY_BLACKLIST_TABLE} b '
+                    f'JOIN {LEGACY_OUTSTANDING_TABLE} o ON o.id = b.token_id '
+                    f'WHERE o.expires_at > %s',
+                    [now]
+                )
+                legacy_rows = cursor.fetchall()
+
+            for jti, expires_at in legacy_rows:
+                if timezone.is_naive(expires_at):
+                    expires_at = timezone.make_aware(expires_at, dt_timezone.utc)
+                store.add(jti, expires_at)
+            self.stdout.write(f'Copied {len(legacy_rows)} blacklisted tokens from {LEGACY_BLACKLIST_TABLE}')
+
+            if options['purge_legacy']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {LEGACY_BLACKLIST_TABLE}')
+                    cursor.execute(f'DELETE FROM {LEGACY_OUTSTANDING_TABLE}')
+                self.stdout.write('Purged legacy token_blacklist tables')
+        else:
+            self.stdout.write('simplejwt token_blacklist tables not found, skipping')
+
+        # DBに保存した行（TOKEN_BLACKLIST_REDIS_URL の設定前・DatabaseTokenBlacklist からの切り替え）を Redis へコピーする
+        if isinstance(store, RedisTokenBlacklist) and store.client is not None:
+            database_rows = list(
+                RevokedToken.objects.filter(expires_at__gt=now).values_list('jti', 'expires_at')
+            )
+            for jti, expires_at in database_rows:
+                store.add(jti, expires_at)
+            self.stdout.write(f'Copied {len(database_rows)} database tokens to Redis')
+
+        purged = store.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired database tokens'))
@@ -0,0 +1,57 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.provisioning import parse_provisioning_csv, provision_users
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create users from a CSV file (username, email, display_name, department, role[, password])'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv-file',
+            type=str,
+            required=True,
+            help='Path to CSV file'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes used for password hashing (default: CPU count)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write created users and generated passwords to this CSV file'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate rows without creating users'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], encoding='utf-8-sig') as f:
+                rows = parse_provisioning_csv(f.read())
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        summary = provision_users(rows, workers=options['workers'], dry_run=options['dry_run'])
+
+        for error in summary['errors']:
+            self.stdout.write(self.style.WARNING(f"行{error['row']} ({error['username']}): {error['error']}"))
+
+        if options['output'] and not options['dry_run']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['username', 'email', 'password'])
+                for user in summary['users']:
+                    writer.writerow([user['username'], user['email'], user['password'] or ''])
+            self.stdout.write(f"Wrote created users to {options['output']}")
+
+        action = 'Validated' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {summary['success_count']}/{summary['total_rows']} users ({summary['error_count']} errors)"
+        ))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:30
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.functions.text
+
+# エラーメッセージに列挙する重複グループの上限
+MAX_REPORTED_DUPLICATES = 50
+
+
+def check_case_insensitive_duplicates(apps, schema_editor):
+    # 大文字・小文字だけが異なるメールアドレスが残っていると制約の作成が IntegrityError で失敗するため、
+    # 先に検出して解消すべきユーザーを列挙して中断する（どちらを残すかは運用で判断するため自動では統合しない）
+    User = apps.get_model('accounts', 'User')
+    users = User.objects.using(schema_editor.connection.alias).exclude(email='')
+    duplicates = list(
+        users.annotate(email_lower=django.db.models.functions.text.Lower('email'))
+        .values('email_lower')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .order_by('email_lower')
+        .values_list('email_lower', flat=True)
+    )
+    if not duplicates:
+        return
+
+    lines = []
+    for email_lower in duplicates[:MAX_REPORTED_DUPLICATES]:
+        members = users.filter(email__iexact=email_lower).order_by('id')
+        lines.append('  %s: %s' % (
+            email_lower,
+            ', '.join('id=%d username=%s email=%s' % (u.id, u.username, u.email) for u in members),
+        ))
+    if len(duplicates) > MAX_REPORTED_DUPLICATES:
+        lines.append('  ... and %d more' % (len(duplicates) - MAX_REPORTED_DUPLICATES))
+    raise CommandError(
+        '%d email address(es) are shared by several users when compared case-insensitively. '
+        'Change or clear the email of all but one user in each group, then run migrate again:\n%s'
+        % (len(duplicates), '\n'.join(lines))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_insensitive_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='accounts_user_email_ci_unique'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -30,5 +31,37 @@ class User(AbstractUser):
         verbose_name='user permissions',
     )
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # ログイン時のメールアドレス検索用（大文字小文字を区別しない一意インデックス）
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~models.Q(email=''),
+                name='accounts_user_email_ci_unique',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
+
+    @classmethod
+    def email_queryset(cls, email):
+        """メールアドレスで検索するクエリセット（一意インデックスが使われる条件）"""
+        return cls.objects.exclude(email='').alias(email_lower=Lower('email')).filter(email_lower=email.lower())
+
+    @classmethod
+    def get_by_email(cls, email):
+        return cls.email_queryset(email).first()
+
+
+class RevokedToken(models.Model):
+    """
+    失効したリフレッシュトークンのJTI（DBに保存するトークンブラックリスト。TOKEN_BLACKLIST_REDIS_URL が未設定の場合など）
+    有効期限を過ぎた行は migrate_token_blacklist コマンドで削除する
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.jti} (expires {self.expires_at})"
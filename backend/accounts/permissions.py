@@ -0,0 +1,14 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsManager(BasePermission):
+    """成績管理者（role='manager'）と管理者（is_staff）"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'manager' or user.is_staff))
+
+
+def can_view_department(user, department):
+    """部署の成績（ランキング・部署別集計）を表示できるか（管理者（is_staff）は全部署、それ以外は自分の部署のみ）"""
+    return bool(user.is_staff or department == user.department)
@@ -0,0 +1,242 @@
+"""
+ユーザー一括登録
+
+CSV（username, email, display_name, department, role[, password]）の各行を検証し、
+パスワードをハッシュ化してから bulk_create で登録する。
+password 列が空の行にはランダムなパスワードを生成し、結果に含めて返す。
+- 管理コマンド（provision_users）はハッシュ化をプロセスプールで並列に行う
+- API（AdminUserBulkProvisionView）は workers=1 でリクエストのプロセス内でハッシュ化する
+  （gunicorn のワーカー内でプロセスを fork しない）。gevent 環境ではネイティブスレッドで実行し、
+  ハッシュ化の間も他のグリーンレットの処理を止めない（PBKDF2 の計算中は GIL が解放される）
+"""
+
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+
+from .models import User
+
+PROVISIONING_COLUMNS = ['username', 'email', 'display_name', 'department', 'role']
+GENERATED_PASSWORD_LENGTH = 16
+BULK_CREATE_BATCH_SIZE = 500
+
+# これ未満の件数ではプロセスプールを起動しない（起動コストの方が大きいため）
+MIN_ROWS_FOR_POOL = 8
+
+
+def validate_row_count(rows, max_rows):
+    """APIで受け付ける行数の上限を超えていれば ValueError"""
+    if len(rows) > max_rows:
+        raise ValueError(
+            f'一度に登録できるのは{max_rows}行までです（{len(rows)}行）。'
+            f'それ以上は provision_users コマンドを使用してください'
+        )
+
+
+def parse_provisioning_csv(text):
+    """CSVテキストを (行番号, 行データ) のリストに変換する"""
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    missing = [column for column in PROVISIONING_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'必要な列がありません: {", ".join(missing)}')
+    # 行番号は2から開始（ヘッダーの次）
+    return [(row_number, row) for row_number, row in enumerate(reader, start=2)]
+
+
+def _init_hash_worker(settings_module):
+    """spawn 方式でワーカーを起動した場合のDjango初期化"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+        django.setup()
+
+
+def _make_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def _hash_in_process(passwords):
+    """プロセス内でハッシュ化する（gevent で monkey patch されていれば gevent のスレッドプールで実行）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return _make_passwords(passwords)
+    if not monkey.is_module_patched('threading'):
+        return _make_passwords(passwords)
+
+    import gevent
+    return gevent.get_hub().threadpool.apply(_make_passwords, (passwords,))
+
+
+def hash_passwords(passwords, workers=None):
+    """パスワードのハッシュ化をプロセスプールで並列に行う（workers=1 ではプロセス内で行う）"""
+    workers = workers or getattr(settings, 'USER_PROVISIONING_HASH_WORKERS', None) or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < MIN_ROWS_FOR_POOL:
+        return _hash_in_process(passwords)
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_hash_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', ''),),
+    ) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def _validate_rows(rows):
+    """各行を検証し、(登録対象, エラー) を返す"""
+    role_values = {value for value, _ in User.ROLE_CHOICES}
+    username_validator = UnicodeUsernameValidator()
+
+    usernames = [str(row.get('username') or '').strip() for _, row in rows]
+    emails = [str(row.get('email') or '').strip().lower() for _, row in rows]
+
+    # 既存ユーザーとの重複は2回のクエリでまとめて確認
+    existing_usernames = set(
+        User.objects.filter(username__in=[name for name in usernames if name]).values_list('username', flat=True)
+    )
+    existing_emails = set(
+        User.objects.alias(email_lower=Lower('email'))
+        .filter(email_lower__in=[email for email in emails if email])
+        .values_list('email', flat=True)
+    )
+    existing_emails = {email.lower() for email in existing_emails}
+
+    seen_usernames = set()
+    seen_emails = set()
+    valid = []
+    errors = []
+
+    for (row_number, row), username, email_lower in zip(rows, usernames, emails):
+        email = str(row.get('email') or '').strip()
+        role = str(row.get('role') or '').strip() or 'student'
+        password = str(row.get('password') or '').strip()
+
+        try:
+            if not username:
+                raise ValueError('usernameが必要です')
+            try:
+                username_validator(username)
+            except ValidationError:
+                raise ValueError(f'usernameが不正です: {username}')
+            if username in existing_usernames or username in seen_usernames:
+                raise ValueError(f'usernameが重複しています: {username}')
+
+            if email:
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    raise ValueError(f'メールアドレスが不正です: {email}')
+                if email_lower in existing_emails or email_lower in seen_emails:
+                    raise ValueError(f'メールアドレスが重複しています: {email}')
+
+            if role not in role_values:
+                raise ValueError(f'roleが不正です: {role}（{", ".join(sorted(role_values))}）')
+
+            if password:
+                try:
+                    validate_password(password, User(username=username, email=email))
+                except ValidationError as e:
+                    raise ValueError('; '.join(e.messages))
+        except ValueError as e:
+            errors.append({'row': row_number, 'username': username, 'error': str(e)})
+            continue
+
+        seen_usernames.add(username)
+        if email:
+            seen_emails.add(email_lower)
+
+        valid.append({
+            'row': row_number,
+            'username': username,
+            'email': email,
+            'display_name': str(row.get('display_name') or '').strip(),
+            'department': str(row.get('department') or '').strip(),
+            'role': role,
+            'password': password,
+            'generated_password': not password,
+        })
+
+    return valid, errors
+
+
+def _build_user(entry, password_hash):
+    return User(
+        username=entry['username'],
+        email=entry['email'],
+        display_name=entry['display_name'],
+        department=entry['department'],
+        role=entry['role'],
+        password=password_hash,
+    )
+
+
+def provision_users(rows, workers=None, dry_run=False):
+    """
+    ユーザーを一括登録する
+    rows: (行番号, {username, email, display_name, department, role, password}) のリスト
+    """
+    from questions.models import StatCounter
+
+    valid, errors = _validate_rows(rows)
+
+    for entry in valid:
+        if entry['generated_password']:
+            entry['password'] = get_random_string(GENERATED_PASSWORD_LENGTH)
+
+    created = []
+    if valid and not dry_run:
+        password_hashes = hash_passwords([entry['password'] for entry in valid], workers=workers)
+        users = [_build_user(entry, password_hash) for entry, password_hash in zip(valid, password_hashes)]
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=BULK_CREATE_BATCH_SIZE)
+        except IntegrityError:
+            # 検証後に他の処理で登録された場合は1行ずつ登録してエラー行を特定する
+            # （save() はシグナルで統計カウンターも更新する）
+            for entry, user in zip(valid, users):
+                # ロールバックされた bulk_create で設定された主キーを戻す
+                user.pk = None
+                user._state.adding = True
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    created.append(entry)
+                except IntegrityError:
+                    errors.append({'row': entry['row'], 'username': entry['username'], 'error': 'usernameまたはメールアドレスが重複しています'})
+            errors.sort(key=lambda error: error['row'])
+        else:
+            created = valid
+            # bulk_create はシグナルを発行しないため、統計カウンターに反映する
+            StatCounter.apply({'users_total': len(created), 'users_active': len(created)})
+
+    return {
+        'total_rows': len(rows),
+        'success_count': len(created) if not dry_run else len(valid),
+        'error_count': len(errors),
+        'errors': errors,
+        'users': [
+            {
+                'row': entry['row'],
+                'username': entry['username'],
+                'email': entry['email'],
+                # 自動生成したパスワードのみ返す（初回ログイン用）
+                'password': entry['password'] if entry['generated_password'] and not dry_run else None,
+            }
+            for entry in (created if not dry_run else valid)
+        ],
+    }
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import User
+from .token_blacklist import blacklist_token, is_token_blacklisted
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -12,6 +17,15 @@ class UserSerializer(serializers.ModelSerializer):
                  'date_joined', 'last_login')
         read_only_fields = ('id', 'date_joined', 'last_login')
 
+    def validate_email(self, value):
+        if value:
+            queryset = User.email_queryset(value)
+            if self.instance is not None:
+                queryset = queryset.exclude(pk=self.instance.pk)
+            if queryset.exists():
+                raise serializers.ValidationError('このメールアドレスは既に使用されています')
+        return value
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -21,6 +35,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'email', 'password', 'password_confirm', 'first_name', 'last_name')
 
+    def validate_email(self, value):
+        if value and User.email_queryset(value).exists():
+            raise serializers.ValidationError('このメールアドレスは既に使用されています')
+        return value
+
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("パスワードが一致しません")
@@ -41,14 +60,8 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if email and password:
-            # メールアドレスでユーザーを検索
-            try:
-                user = User.objects.get(email=email)
-                username = user.username
-            except User.DoesNotExist:
-                raise serializers.ValidationError('無効なメールアドレスまたはパスワードです')
-
-            user = authenticate(username=username, password=password)
+            # メールアドレスで認証（accounts.backends.EmailBackend が1回の検索で処理）
+            user = authenticate(self.context.get('request'), email=email, password=password)
             
             if not user:
                 raise serializers.ValidationError('無効なメールアドレスまたはパスワードです')
@@ -59,4 +72,31 @@ class LoginSerializer(serializers.Serializer):
             attrs['user'] = user
             return attrs
         else:
-            raise serializers.ValidationError('メールアドレスとパスワードが必要です')
\ No newline at end of file
+            raise serializers.ValidationError('メールアドレスとパスワードが必要です')
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    トークンリフレッシュ用シリアライザー
+    ブラックリストの確認・登録を accounts.token_blacklist のストアで行う
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        if is_token_blacklisted(refresh):
+            raise TokenError(_('Token is blacklisted'))
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                blacklist_token(refresh)
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
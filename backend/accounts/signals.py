@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User, dispatch_uid='invalidate_cached_user_on_save')
+def invalidate_cached_user_on_save(sender, instance, **kwargs):
+    # UserProfileView, AdminUserDetailView, ChangePasswordView などでの保存を反映
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_delete, sender=User, dispatch_uid='invalidate_cached_user_on_delete')
+def invalidate_cached_user_on_delete(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
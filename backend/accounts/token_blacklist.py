@@ -0,0 +1,125 @@
+"""
+リフレッシュトークンのブラックリスト
+
+TOKEN_BLACKLIST_BACKEND で保存先を切り替える。
+- RedisTokenBlacklist: 専用の Redis（TOKEN_BLACKLIST_REDIS_URL）にJTIをトークンの残り有効期間だけ保存する。
+  キャッシュの Redis とは別の、キーを追い出さない（maxmemory-policy noeviction）インスタンス・DBを指定する
+  （キャッシュのクリアや LRU の追い出しで失効が取り消されないように）。
+  Redis に接続できない場合は登録・確認とも TokenBlacklistUnavailable を送出する（失効済みのトークンを受け付けない）。
+  TOKEN_BLACKLIST_REDIS_URL が未設定の場合（開発環境など）は DatabaseTokenBlacklist と同じくDBに保存する
+- DatabaseTokenBlacklist: RevokedToken テーブルに保存する
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+try:
+    import redis
+except ImportError:  # redis がない環境ではDBに保存する
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def token_expires_at(token):
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+class DatabaseTokenBlacklist:
+    """RevokedToken テーブルに保存するブラックリスト"""
+
+    def add(self, jti, expires_at):
+        if expires_at <= timezone.now():
+            return
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+
+    def contains(self, jti):
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def purge_expired(self):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class TokenBlacklistUnavailable(APIException):
+    """ブラックリストの保存先に接続できない（リフレッシュ・ログアウトは 503）"""
+    status_code = 503
+    default_detail = 'トークンの確認ができません。しばらくしてから再度お試しください'
+    default_code = 'token_blacklist_unavailable'
+
+
+@lru_cache(maxsize=None)
+def _redis_client(url):
+    return redis.Redis.from_url(url, **settings.TOKEN_BLACKLIST_REDIS_OPTIONS)
+
+
+class RedisTokenBlacklist:
+    """
+    専用の Redis に TTL 付きで保存するブラックリスト
+    期限切れのJTIは自動的に消えるため、テーブルが増え続けない
+    """
+    key_prefix = 'token_blacklist:'
+
+    def __init__(self):
+        self.database = DatabaseTokenBlacklist()
+
+    @property
+    def client(self):
+        """Redis のクライアント（TOKEN_BLACKLIST_REDIS_URL が未設定・redis がなければ None でDBに保存する）"""
+        if not settings.TOKEN_BLACKLIST_REDIS_URL or redis is None:
+            return None
+        return _redis_client(settings.TOKEN_BLACKLIST_REDIS_URL)
+
+    def cache_key(self, jti):
+        return f'{self.key_prefix}{jti}'
+
+    def add(self, jti, expires_at):
+        client = self.client
+        if client is None:
+            return self.database.add(jti, expires_at)
+        timeout = int((expires_at - timezone.now()).total_seconds()) + 1
+        if timeout <= 1:
+            return
+        try:
+            client.set(self.cache_key(jti), 1, ex=timeout)
+        except redis.RedisError as e:
+            logger.error('Token blacklist store unavailable, refusing to continue', exc_info=True)
+            raise TokenBlacklistUnavailable() from e
+
+    def contains(self, jti):
+        client = self.client
+        if client is None:
+            return self.database.contains(jti)
+        try:
+            return client.exists(self.cache_key(jti)) > 0
+        except redis.RedisError as e:
+            logger.error('Token blacklist store unavailable, refusing to continue', exc_info=True)
+            raise TokenBlacklistUnavailable() from e
+
+    def purge_expired(self):
+        # Redis 側は TTL で消えるため、DBに保存した行（Redis 未設定時・移行前）のみ削除
+        return self.database.purge_expired()
+
+
+@lru_cache(maxsize=None)
+def get_token_blacklist():
+    backend = getattr(settings, 'TOKEN_BLACKLIST_BACKEND', 'accounts.token_blacklist.RedisTokenBlacklist')
+    return import_string(backend)()
+
+
+def blacklist_token(token):
+    """トークンのJTIを有効期限までブラックリストに登録する"""
+    get_token_blacklist().add(token[api_settings.JTI_CLAIM], token_expires_at(token))
+
+
+def is_token_blacklisted(token):
+    return get_token_blacklist().contains(token[api_settings.JTI_CLAIM])
@@ -11,6 +11,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import User
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer
+from .token_blacklist import TokenBlacklistUnavailable, blacklist_token
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -48,7 +49,7 @@ class LoginView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = LoginSerializer(data=request.data)
+        serializer = LoginSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
         user = serializer.validated_data['user']
@@ -78,8 +79,10 @@ class LogoutView(APIView):
         try:
             refresh_token = request.data["refresh"]
             token = RefreshToken(refresh_token)
-            token.blacklist()
+            blacklist_token(token)
             return Response({'message': 'ログアウトしました'}, status=status.HTTP_205_RESET_CONTENT)
+        except TokenBlacklistUnavailable:
+            raise
         except Exception as e:
             return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -0,0 +1,6 @@
+"""
+パフォーマンス計測用ベンチマーク
+
+各モジュールは `python -m benchmarks.<name>` で実行する。
+DJANGO_SETTINGS_MODULE で対象の設定（SQLite / PostgreSQL）を切り替える。
+"""
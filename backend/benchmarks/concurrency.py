@@ -0,0 +1,176 @@
+"""
+同時接続数ごとのスループット計測（読み取り中心のクイズAPI）
+
+起動済みのサーバーに対して、同時接続数を変えながら一定時間リクエストを送り続け、
+1秒あたりのリクエスト数・レイテンシ・エラー数を表示する。
+WSGI（gunicorn + gevent）と ASGI（gunicorn + uvicorn、ASYNC_QUIZ_VIEWS=true）を
+同じ条件で起動し、--label を変えて実行して比較する。
+
+    python -m benchmarks.concurrency --base-url http://localhost:8000 \\
+        --email user@example.com --password ... --concurrency 10 50 200 --label wsgi-gevent
+
+各接続はスレッド1つで keep-alive の HTTP/1.1 接続を使う（Django の初期化は不要）。
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .utils import summarize_latencies
+
+ENDPOINTS = ['genres', 'random', 'detail', 'check-answer']
+
+
+class QuizApiTarget:
+    """計測対象のAPIとリクエスト内容"""
+
+    def __init__(self, base_url, email=None, password=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.token = None
+        self.questions = []
+
+        if email and password:
+            status, body = self.request_once('POST', '/api/auth/login/', {'email': email, 'password': password})
+            if status != 200:
+                raise RuntimeError(f'Login failed: {status} {body[:200]!r}')
+            self.token = json.loads(body)['tokens']['access']
+
+        status, body = self.request_once('GET', '/api/questions/questions/random/?count=50')
+        if status != 200:
+            raise RuntimeError(f'Failed to load questions: {status} {body[:200]!r}')
+        self.questions = [q for q in json.loads(body)['questions'] if q['choices']]
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=30)
+
+    def headers(self, has_body=False):
+        headers = {'Accept': 'application/json'}
+        if has_body:
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return headers
+
+    def request_once(self, method, path, payload=None):
+        connection = self.connect()
+        try:
+            return self.send(connection, method, path, payload)
+        finally:
+            connection.close()
+
+    def send(self, connection, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        connection.request(method, self.prefix + path, body=body, headers=self.headers(body is not None))
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def build_request(self, endpoint):
+        """エンドポイント名から (method, path, payload) を作る"""
+        if endpoint == 'genres':
+            return 'GET', '/api/questions/genres/', None
+        if endpoint == 'random':
+            return 'GET', '/api/questions/questions/random/?count=10&hide_answers=true', None
+
+        if not self.questions:
+            raise RuntimeError('No active questions with choices to benchmark')
+        question = random.choice(self.questions)
+        if endpoint == 'detail':
+            return 'GET', f'/api/questions/questions/{question["id"]}/', None
+        if endpoint == 'check-answer':
+            choice = random.choice(question['choices'])
+            return 'POST', '/api/questions/questions/check-answer/', {
+                'question_id': question['id'],
+                'choice_id': choice['id'],
+            }
+        raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+def run_level(target, endpoints, concurrency, duration):
+    """同時接続数 concurrency で duration 秒間リクエストを送り続ける"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker():
+        connection = target.connect()
+        local_latencies = []
+        local_errors = 0
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            method, path, payload = target.build_request(random.choice(endpoints))
+            start = time.perf_counter()
+            try:
+                status, _ = target.send(connection, method, path, payload)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = target.connect()
+                continue
+            local_latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                local_errors += 1
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    deadline[0] = time.perf_counter() + duration
+    started = time.perf_counter()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 2),
+        'errors': sum(errors),
+        'latency': summarize_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark quiz API throughput at increasing concurrent connections')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--email', help='Login email (required for detail / check-answer)')
+    parser.add_argument('--password')
+    parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, dest='endpoints',
+                        help='Endpoint to request (repeatable, default: all)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency level')
+    parser.add_argument('--label', default='', help='Deployment label included in the output')
+    args = parser.parse_args()
+
+    endpoints = args.endpoints or ENDPOINTS
+    if not args.email and any(endpoint in ('detail', 'check-answer') for endpoint in endpoints):
+        parser.error('--email/--password are required for the detail and check-answer endpoints')
+
+    target = QuizApiTarget(args.base_url, args.email, args.password)
+    results = [run_level(target, endpoints, concurrency, args.duration) for concurrency in args.concurrency]
+    print(json.dumps({
+        'label': args.label,
+        'base_url': args.base_url,
+        'endpoints': endpoints,
+        'duration_seconds': args.duration,
+        'levels': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
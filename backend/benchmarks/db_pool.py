@@ -0,0 +1,170 @@
+"""
+gevent ワーカーでのDB接続数の計測（接続プールあり・なしの比較）
+
+gunicorn の gevent ワーカーと同じく monkey patch した環境で、多数のグリーンレットから
+「クエリを実行してリクエスト終了時の処理（close_old_connections）を行う」を繰り返し、
+PostgreSQL 側の接続数のピーク・スループット・レイテンシ・接続取得のタイムアウト数を表示する。
+
+    # 接続プール（elearning.db.backends.pooled_postgresql、ワーカーあたり最大10接続）
+    python -m benchmarks.db_pool --greenlets 500 --pool-size 10
+
+    # 比較: 標準のバックエンド（グリーンレットごとに永続接続）
+    python -m benchmarks.db_pool --greenlets 500 --pool-size 0 --conn-max-age 600
+
+DBは DJANGO_SETTINGS_MODULE の設定に従う（PostgreSQL が必要）。
+標準のバックエンドでは max_connections を超えた分のグリーンレットがエラーになる。
+"""
+
+import argparse
+import json
+import time
+
+from .utils import setup_django, summarize_latencies
+
+
+def configure_database(args):
+    """計測に使うバックエンドに切り替える（接続を作る前に呼ぶ）"""
+    from django.conf import settings
+
+    database = settings.DATABASES['default']
+    if not database['ENGINE'].endswith('postgresql'):
+        raise SystemExit(f'PostgreSQL is required (ENGINE={database["ENGINE"]})')
+
+    if args.pool_size > 0:
+        database.update({
+            'ENGINE': 'elearning.db.backends.pooled_postgresql',
+            'CONN_MAX_AGE': 0,
+            'POOL': {'MAX_SIZE': args.pool_size, 'TIMEOUT': args.pool_timeout},
+        })
+    else:
+        database.update({'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': args.conn_max_age})
+        database.pop('POOL', None)
+
+
+class ConnectionObserver:
+    """別の接続から pg_stat_activity を定期的に読み、接続数のピークを記録する"""
+
+    def __init__(self, interval):
+        from django.db import connections
+
+        wrapper = connections['default']
+        self.connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        self.connection.autocommit = True
+        self.interval = interval
+        self.baseline = self.count()
+        self.peak = self.baseline
+        self.running = False
+
+    def count(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_stat_activity '
+                'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+            )
+            return cursor.fetchone()[0]
+
+    def run(self):
+        import gevent
+
+        self.running = True
+        while self.running:
+            self.peak = max(self.peak, self.count())
+            gevent.sleep(self.interval)
+
+    def close(self):
+        self.running = False
+        self.connection.close()
+
+
+def worker(queries, hold, latencies, errors):
+    """リクエスト1件分の処理（クエリ実行 → リクエスト終了時の接続処理）を繰り返す"""
+    from django.db import close_old_connections, connection
+
+    for _ in range(queries):
+        start = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(%s)', [hold])
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            # 失敗した接続を残さない
+            connection.close()
+        else:
+            latencies.append(time.perf_counter() - start)
+        finally:
+            # request_finished シグナルと同じ処理（CONN_MAX_AGE に応じて閉じる・プールへ返却する）
+            close_old_connections()
+
+
+def run(args):
+    import gevent
+    from django.db import connection
+
+    observer = ConnectionObserver(args.sample_interval)
+    observer_greenlet = gevent.spawn(observer.run)
+
+    latencies = []
+    errors = {}
+    start = time.perf_counter()
+    greenlets = [
+        gevent.spawn(worker, args.queries, args.hold, latencies, errors)
+        for _ in range(args.greenlets)
+    ]
+    gevent.joinall(greenlets)
+    elapsed = time.perf_counter() - start
+
+    # 標準のバックエンドで残っている永続接続の数も含めて記録してから閉じる
+    observer.peak = max(observer.peak, observer.count())
+    observer.close()
+    observer_greenlet.kill()
+
+    return {
+        'backend': connection.settings_dict['ENGINE'],
+        'elapsed_seconds': round(elapsed, 3),
+        'queries_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency': summarize_latencies(latencies),
+        'errors': errors,
+        'server_connections': {
+            'before': observer.baseline,
+            'peak': observer.peak,
+            'opened_by_benchmark': observer.peak - observer.baseline,
+        },
+        'pool': connection.pool_stats() if hasattr(connection, 'pool_stats') else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Postgres connections under many concurrent gevent greenlets')
+    parser.add_argument('--greenlets', type=int, default=200, help='Concurrent greenlets (simulated requests in flight)')
+    parser.add_argument('--queries', type=int, default=20, help='Queries per greenlet')
+    parser.add_argument('--hold', type=float, default=0.01, help='Seconds each query holds the connection (pg_sleep)')
+    parser.add_argument('--pool-size', type=int, default=10,
+                        help='Max connections of the pooled backend (0 to use the stock backend)')
+    parser.add_argument('--pool-timeout', type=float, default=10, help='Seconds to wait for a pooled connection')
+    parser.add_argument('--conn-max-age', type=int, default=600, help='CONN_MAX_AGE for the stock backend')
+    parser.add_argument('--sample-interval', type=float, default=0.05,
+                        help='Seconds between pg_stat_activity samples')
+    parser.add_argument('--label', default='', help='Label included in the output')
+    args = parser.parse_args()
+
+    # gunicorn の gevent ワーカーと同じく、Django より先に標準ライブラリを patch する
+    from gevent import monkey
+    monkey.patch_all()
+
+    setup_django()
+    configure_database(args)
+
+    result = {
+        'label': args.label,
+        'parameters': {
+            'greenlets': args.greenlets, 'queries': args.queries, 'hold': args.hold,
+            'pool_size': args.pool_size, 'pool_timeout': args.pool_timeout,
+            'conn_max_age': None if args.pool_size > 0 else args.conn_max_age,
+        },
+        **run(args),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+問題の項目分析（questions.item_analysis）の計測と検算
+
+compute_item_stats()（チャンク単位の NumPy / pandas 集計）の時間を計測し、
+回答履歴を1行ずつ Python で集計した結果（正答率・点双列相関・選択率・回答時間の中央値）と一致することを確認する。
+
+    python -m benchmarks.item_analysis
+    python -m benchmarks.item_analysis --chunk-size 10000 --label small-chunks
+
+データは DJANGO_SETTINGS_MODULE のDBから読む（generate_synthetic_data で作成したデータなど）。
+"""
+
+import argparse
+import json
+import math
+import statistics
+import time
+
+from .utils import setup_django
+
+
+def naive_item_stats(max_id):
+    """回答履歴を1行ずつ読んで問題ごとの項目統計を求める {question_id: dict}"""
+    from progress.models import UserAttempt
+
+    rows = list(
+        UserAttempt.objects.filter(id__lte=max_id).order_by()
+        .values_list('question_id', 'user_id', 'selected_choice_id', 'is_correct', 'response_time_seconds')
+    )
+    user_totals = {}
+    for _, user_id, _, is_correct, _ in rows:
+        total, correct = user_totals.get(user_id, (0, 0))
+        user_totals[user_id] = (total + 1, correct + int(is_correct))
+
+    by_question = {}
+    for question_id, user_id, choice_id, is_correct, seconds in rows:
+        item = by_question.setdefault(question_id, {'x': [], 'pairs': [], 'choices': {}, 'times': []})
+        x = int(is_correct)
+        item['x'].append(x)
+        total, correct = user_totals[user_id]
+        if total > 1:
+            item['pairs'].append((x, (correct - x) / (total - 1)))
+        item['choices'][choice_id] = item['choices'].get(choice_id, 0) + 1
+        if seconds is not None:
+            item['times'].append(seconds)
+
+    results = {}
+    for question_id, item in by_question.items():
+        results[question_id] = {
+            'attempts': len(item['x']),
+            'p_value': sum(item['x']) / len(item['x']),
+            'discrimination': pearson(item['pairs']),
+            'choice_counts': item['choices'],
+            'median_response_time': statistics.median(item['times']) if item['times'] else None,
+        }
+    return results
+
+
+def pearson(pairs):
+    if len(pairs) < 2:
+        return None
+    xs, ys = zip(*pairs)
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in pairs)
+    variance_x = sum((x - mean_x) ** 2 for x in xs)
+    variance_y = sum((y - mean_y) ** 2 for y in ys)
+    if variance_x * variance_y <= 1e-12:
+        return None
+    return covariance / math.sqrt(variance_x * variance_y)
+
+
+def close(a, b, tolerance=1e-6):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tolerance
+
+
+def verify(stats, expected):
+    """一致しない問題のIDのリスト（選択率は問題の選択肢のみ比較する）"""
+    mismatched = []
+    for item in stats:
+        reference = expected.get(item.question_id)
+        choice_rates_match = reference is not None and all(
+            close(rate, round(reference['choice_counts'].get(choice_id, 0) / reference['attempts'], 4))
+            for choice_id, rate in item.choice_rates.items()
+        )
+        if not (
+            choice_rates_match
+            and item.attempts == reference['attempts']
+            and close(item.p_value, reference['p_value'])
+            and close(item.discrimination, reference['discrimination'])
+            and close(item.median_response_time, reference['median_response_time'])
+        ):
+            mismatched.append(item.question_id)
+    if len(stats) != len(expected):
+        mismatched.extend(sorted(set(expected) - {item.question_id for item in stats}))
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time questions.item_analysis and check it against a row-by-row computation')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Attempts per chunk')
+    parser.add_argument('--iterations', type=int, default=3, help='Runs per measurement (median is reported)')
+    parser.add_argument('--skip-verify', action='store_true', help='Skip the row-by-row comparison')
+    parser.add_argument('--label', default='', help='Label included in the output')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Max
+
+    from progress.models import UserAttempt
+    from questions.item_analysis import compute_item_stats
+
+    max_id = UserAttempt.objects.aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        raise SystemExit('No attempts (run generate_synthetic_data first)')
+
+    timings = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        stats = compute_item_stats(args.chunk_size)
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        'label': args.label,
+        'attempts': UserAttempt.objects.filter(id__lte=max_id).count(),
+        'questions': len(stats),
+        'chunk_size': args.chunk_size,
+        'vectorized_ms': round(statistics.median(timings) * 1000, 1),
+    }
+    if not args.skip_verify:
+        start = time.perf_counter()
+        expected = naive_item_stats(max_id)
+        result['row_by_row_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        mismatched = verify(stats, expected)
+        result['mismatched_questions'] = mismatched[:20]
+        if mismatched:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+            raise SystemExit(f'{len(mismatched)} questions differ from the row-by-row computation')
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
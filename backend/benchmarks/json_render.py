@@ -0,0 +1,121 @@
+"""
+API の JSON レンダラー・パーサーの比較（DRF 標準 / orjson）
+
+実データをシリアライザーで変換したペイロード（問題一覧・回答履歴・クイズセッション・学習進捗）を
+JSONRenderer と ORJSONRenderer（elearning.fast_json）でそれぞれ出力し、
+出力を JSONParser と ORJSONParser で読み込む時間を比較する。
+両方の出力を読み込んだ結果が一致すること（datetime・Decimal・遅延翻訳文字列の変換を含む）も確認する。
+
+    python -m benchmarks.json_render --iterations 50
+    python -m benchmarks.json_render --questions 1000 --attempts 5000 --label large
+
+データは DJANGO_SETTINGS_MODULE のDBから読む（generate_synthetic_data で作成したデータなど）。
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+from .utils import setup_django
+
+
+def load_payloads(args):
+    """シリアライザーで変換したペイロード {名前: data}"""
+    from progress.models import QuizSession, UserAttempt, UserProgress
+    from progress.serializers import QuizSessionSerializer, UserAttemptSerializer, UserProgressSerializer
+    from questions.models import Question
+    from questions.serializers import QuestionSerializer
+
+    questions = (
+        Question.objects.filter(is_active=True)
+        .select_related('genre', 'author_user').prefetch_related('choices')
+        .order_by('id')[:args.questions]
+    )
+    attempts = UserAttemptSerializer.setup_eager_loading(
+        UserAttempt.objects.order_by('-attempt_time')
+    )[:args.attempts]
+    payloads = {
+        'questions': QuestionSerializer(questions, many=True).data,
+        'user_attempts': UserAttemptSerializer(attempts, many=True).data,
+    }
+
+    # セッションは受講者の回答履歴をすべて含むため、回答履歴のある受講者1人分
+    session = QuizSession.objects.filter(user__attempts__isnull=False).order_by('-start_time').first()
+    if session is not None:
+        sessions = QuizSessionSerializer.setup_eager_loading(
+            QuizSession.objects.filter(user_id=session.user_id).order_by('-start_time')
+        )[:args.sessions]
+        payloads['quiz_sessions'] = QuizSessionSerializer(sessions, many=True).data
+        progress = UserProgressSerializer.setup_eager_loading(UserProgress.objects.filter(user_id=session.user_id))
+        payloads['user_progress'] = UserProgressSerializer(progress, many=True).data
+
+    empty = [name for name, data in payloads.items() if not data]
+    if empty:
+        raise SystemExit(
+            f'No data for {", ".join(empty)} (run generate_synthetic_data first)'
+        )
+    return payloads
+
+
+def measure(function, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def compare(name, data, iterations):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from elearning.fast_json import ORJSONParser, ORJSONRenderer
+
+    stdlib_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+    stdlib_parser, fast_parser = JSONParser(), ORJSONParser()
+    stdlib_body = stdlib_renderer.render(data)
+    fast_body = fast_renderer.render(data)
+
+    # float の表記（1e-07 と 1e-7 など）が異なる場合があるため、読み込んだ結果で比較する
+    if json.loads(stdlib_body) != json.loads(fast_body):
+        raise SystemExit(f'{name}: orjson output differs from JSONRenderer')
+
+    render_stdlib = measure(lambda: stdlib_renderer.render(data), iterations)
+    render_fast = measure(lambda: fast_renderer.render(data), iterations)
+    parse_stdlib = measure(lambda: stdlib_parser.parse(io.BytesIO(stdlib_body)), iterations)
+    parse_fast = measure(lambda: fast_parser.parse(io.BytesIO(stdlib_body)), iterations)
+    return {
+        'items': len(data),
+        'bytes': len(stdlib_body),
+        'identical_bytes': stdlib_body == fast_body,
+        'render_ms': {'json': render_stdlib, 'orjson': render_fast,
+                      'speedup': round(render_stdlib / render_fast, 1) if render_fast else None},
+        'parse_ms': {'json': parse_stdlib, 'orjson': parse_fast,
+                     'speedup': round(parse_stdlib / parse_fast, 1) if parse_fast else None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare DRF JSONRenderer/JSONParser with the orjson versions')
+    parser.add_argument('--iterations', type=int, default=30, help='Runs per measurement (median is reported)')
+    parser.add_argument('--questions', type=int, default=500, help='Questions in the QuestionSerializer payload')
+    parser.add_argument('--attempts', type=int, default=2000, help='Attempts in the UserAttemptSerializer payload')
+    parser.add_argument('--sessions', type=int, default=5, help='Sessions in the QuizSessionSerializer payload')
+    parser.add_argument('--label', default='', help='Label included in the output')
+    args = parser.parse_args()
+
+    setup_django()
+    payloads = load_payloads(args)
+    result = {
+        'label': args.label,
+        'iterations': args.iterations,
+        'payloads': {name: compare(name, data, args.iterations) for name, data in payloads.items()},
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+ログインAPIのベンチマーク
+
+1プロセス（= gunicorn ワーカー1つ相当）で LoginView を連続実行し、
+1秒あたりのログイン数とレイテンシ、1回あたりのクエリ数を表示する。
+
+    python -m benchmarks.login --iterations 100
+"""
+
+import argparse
+import json
+import time
+
+from .utils import setup_django, summarize_latencies
+
+BENCHMARK_EMAIL = 'benchmark-login@example.invalid'
+BENCHMARK_USERNAME = 'benchmark_login_user'
+BENCHMARK_PASSWORD = 'Benchmark-Login-Pass-1'
+
+
+def run(iterations, warmup):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from accounts.models import User
+
+    User.objects.filter(username=BENCHMARK_USERNAME).delete()
+    user = User.objects.create_user(
+        username=BENCHMARK_USERNAME,
+        email=BENCHMARK_EMAIL,
+        password=BENCHMARK_PASSWORD,
+    )
+
+    client = Client(SERVER_NAME='localhost')
+    payload = json.dumps({'email': BENCHMARK_EMAIL.upper(), 'password': BENCHMARK_PASSWORD})
+
+    def login():
+        response = client.post('/api/auth/login/', data=payload, content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f'Login failed: {response.status_code} {response.content[:200]!r}')
+
+    try:
+        for _ in range(warmup):
+            login()
+
+        with CaptureQueriesContext(connection) as queries:
+            login()
+        queries_per_login = len(queries)
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            login()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+    finally:
+        user.delete()
+
+    return {
+        'iterations': iterations,
+        'logins_per_second': round(iterations / elapsed, 2),
+        'queries_per_login': queries_per_login,
+        'latency': summarize_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LoginView throughput per worker')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    result = run(args.iterations, args.warmup)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
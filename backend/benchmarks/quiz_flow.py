@@ -0,0 +1,446 @@
+"""
+クイズの利用フロー全体のベンチマーク
+
+受講者1人分のフロー（ログイン → ジャンル一覧 → ランダム出題 → 解答チェック →
+セッション送信 → ダッシュボード表示）を繰り返し、--admin-every 回ごとに
+管理者のレポート画面（統計・ユーザー別統計・進捗一覧・ユーザー詳細）を実行する。
+エンドポイントごとのスループットと p50/p95/p99 レイテンシを JSON で出力する。
+
+    # プロセス内（テストクライアント）: テスト用DBを作成してデータを投入する
+    # DBは DJANGO_SETTINGS_MODULE の設定（SQLite / ローカルの PostgreSQL）に従う
+    python -m benchmarks.quiz_flow --flows 200 --scale 5 --output baseline.json
+
+    # 起動済みのサーバーに対して実行（受講者・管理者のアカウントを指定）
+    python -m benchmarks.quiz_flow --base-url http://localhost:8000 \\
+        --email user@example.com --password ... \\
+        --admin-email admin@example.com --admin-password ... --concurrency 10
+
+    # 保存したベースラインと比較（p95 が 20% 以上悪化したら終了コード1）
+    python -m benchmarks.quiz_flow --compare baseline.json --max-regression 20
+
+    # サーバーで出題するセッション（開始 → 回答送信。解答チェックなし）
+    python -m benchmarks.quiz_flow --session-flow server
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from .utils import setup_django, summarize_latencies
+
+DASHBOARD_ENDPOINTS = [
+    ('dashboard:statistics', '/api/progress/statistics/'),
+    ('dashboard:genre-performance', '/api/progress/genre-performance/'),
+    ('dashboard:weekly-progress', '/api/progress/weekly-progress/'),
+    ('dashboard:daily-activity', '/api/progress/daily-activity/'),
+]
+
+ADMIN_REPORT_ENDPOINTS = [
+    ('admin:stats', '/api/admin/stats/'),
+    ('admin:user-stats', '/api/admin/stats/users/?days=30'),
+    ('admin:users', '/api/admin/users/'),
+    ('admin:users-progress', '/api/admin/users/progress/'),
+]
+
+# 比較に使う指標（値が大きいほど悪化）
+COMPARED_LATENCIES = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+class FlowError(Exception):
+    """フローの途中でリクエストが失敗した（以降のステップは実行しない）"""
+
+
+class ClientConnection:
+    """Django のテストクライアントによる接続（受講者1人分のCookieを持つ）"""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(SERVER_NAME='localhost')
+
+    def request(self, method, path, payload=None, token=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if payload is not None:
+            response = self.client.generic(
+                method, path, json.dumps(payload), content_type='application/json', **extra
+            )
+        else:
+            response = self.client.generic(method, path, **extra)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, body
+
+    def close(self):
+        pass
+
+
+class HttpConnection:
+    """起動済みサーバーへの keep-alive 接続"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, payload=None, token=None):
+        headers = {'Accept': 'application/json'}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # 次のリクエストで再接続させる
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+
+class FlowRecorder:
+    """エンドポイントごとのレイテンシとエラー数（スレッド間で共有）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows = defaultdict(int)
+        self.failed_flows = defaultdict(int)
+        self.enabled = True
+
+    def call(self, connection, endpoint, method, path, payload=None, token=None, expected=200):
+        start = time.perf_counter()
+        try:
+            status, body = connection.request(method, path, payload, token)
+        except (OSError, http.client.HTTPException) as e:
+            self.record(endpoint, None)
+            raise FlowError(f'{endpoint}: {e}')
+        elapsed = time.perf_counter() - start
+
+        if status != expected:
+            self.record(endpoint, None)
+            raise FlowError(f'{endpoint}: HTTP {status} {body[:200]!r}')
+        self.record(endpoint, elapsed)
+        return json.loads(body) if body else None
+
+    def record(self, endpoint, elapsed):
+        if not self.enabled:
+            return
+        with self.lock:
+            if elapsed is None:
+                self.errors[endpoint] += 1
+            else:
+                self.latencies[endpoint].append(elapsed)
+
+    def finish_flow(self, kind, ok):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.flows[kind] += 1
+            if not ok:
+                self.failed_flows[kind] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(endpoint, [])
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(endpoint, 0),
+                'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                'latency': summarize_latencies(latencies),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            'flows': {kind: {'completed': count - self.failed_flows.get(kind, 0), 'failed': self.failed_flows.get(kind, 0)}
+                      for kind, count in sorted(self.flows.items())},
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'requests_per_second': round(total / elapsed, 2) if elapsed else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+def login(recorder, connection, endpoint, account):
+    data = recorder.call(connection, endpoint, 'POST', '/api/auth/login/',
+                         {'email': account['email'], 'password': account['password']})
+    return data['tokens']['access'], data['user']['id']
+
+
+def student_flow(recorder, connection, account, questions_per_session, state, session_flow='client'):
+    """受講者1人分のクイズの流れ"""
+    token, user_id = login(recorder, connection, 'login', account)
+    state['student_id'] = user_id
+
+    genres = recorder.call(connection, 'genres', 'GET', '/api/questions/genres/', token=token)['results']
+    genres = [genre for genre in genres if genre.get('question_count')]
+    if not genres:
+        raise FlowError('genres: no genre has questions')
+    genre = random.choice(genres)
+
+    if session_flow == 'server':
+        server_drawn_session(recorder, connection, token, genre, questions_per_session)
+    else:
+        client_drawn_session(recorder, connection, token, genre, questions_per_session)
+
+    for endpoint, path in DASHBOARD_ENDPOINTS:
+        recorder.call(connection, endpoint, 'GET', path, token=token)
+
+
+def client_drawn_session(recorder, connection, token, genre, questions_per_session):
+    """ランダム出題 → 1問ずつ解答チェック → 結果をまとめて送信"""
+    query = urlencode({'genre': genre['id'], 'count': questions_per_session, 'hide_answers': 'true'})
+    questions = recorder.call(connection, 'random', 'GET', f'/api/questions/questions/random/?{query}',
+                              token=token)['questions']
+
+    answers = []
+    for question in questions:
+        if not question['choices']:
+            continue
+        choice = random.choice(question['choices'])
+        result = recorder.call(connection, 'check-answer', 'POST', '/api/questions/questions/check-answer/',
+                               {'question_id': question['id'], 'choice_id': choice['id']}, token=token)
+        answers.append({
+            'question_id': question['id'],
+            'selected_choice_id': choice['id'],
+            'is_correct': result['is_correct'],
+        })
+
+    recorder.call(connection, 'session-submit', 'POST', '/api/progress/sessions/', {
+        'session_type': 'genre',
+        'genre': genre['id'],
+        'total_questions': len(answers),
+        'answers': answers,
+    }, token=token, expected=201)
+
+
+def server_drawn_session(recorder, connection, token, genre, questions_per_session):
+    """セッション開始（サーバーで出題） → 回答を送信してまとめて採点"""
+    session = recorder.call(connection, 'session-start', 'POST', '/api/progress/sessions/start/', {
+        'session_type': 'genre',
+        'genre': genre['id'],
+        'count': questions_per_session,
+    }, token=token, expected=201)
+
+    answers = [
+        {'question_id': question['id'], 'selected_choice_id': random.choice(question['choices'])['id']}
+        for question in session['questions'] if question['choices']
+    ]
+    recorder.call(connection, 'session-submit', 'POST', f'/api/progress/sessions/{session["id"]}/submit/',
+                  {'answers': answers}, token=token)
+
+
+def admin_flow(recorder, connection, account, state):
+    """管理者のレポート画面の流れ"""
+    token, _ = login(recorder, connection, 'admin:login', account)
+    for endpoint, path in ADMIN_REPORT_ENDPOINTS:
+        recorder.call(connection, endpoint, 'GET', path, token=token)
+    if state.get('student_id'):
+        recorder.call(connection, 'admin:user-progress', 'GET',
+                      f'/api/admin/users/{state["student_id"]}/progress/', token=token)
+
+
+def run_flows(open_connection, students, admin, args):
+    """
+    ウォームアップの後、--flows 回の受講者フローを --concurrency 並列で実行する
+    --admin-every 回ごとに管理者フローを1回実行する
+    """
+    recorder = FlowRecorder()
+    state = {}
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+
+    def run_one(connection, index):
+        account = students[index % len(students)]
+        kinds = [('student', lambda: student_flow(
+            recorder, connection, account, args.questions, state, args.session_flow
+        ))]
+        if admin and args.admin_every and (index + 1) % args.admin_every == 0:
+            kinds.append(('admin', lambda: admin_flow(recorder, connection, admin, state)))
+        for kind, flow in kinds:
+            try:
+                flow()
+            except FlowError as e:
+                recorder.finish_flow(kind, ok=False)
+                print(f'{kind} flow failed: {e}', file=sys.stderr)
+            else:
+                recorder.finish_flow(kind, ok=True)
+
+    recorder.enabled = False
+    connection = open_connection()
+    try:
+        for index in range(args.warmup):
+            run_one(connection, index)
+    finally:
+        connection.close()
+    recorder.enabled = True
+
+    def worker():
+        connection = open_connection()
+        try:
+            while True:
+                with counter_lock:
+                    index = next(counter)
+                if index >= args.flows:
+                    break
+                run_one(connection, index)
+                # 受講者ごとに別のCookie・接続を使う（テストクライアントのみ）
+                if args.base_url is None:
+                    connection = open_connection()
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {'duration_seconds': round(elapsed, 3), **recorder.summary(elapsed)}
+
+
+def run_in_process(args):
+    """テスト用DBを作成し、データを投入してテストクライアントで実行する"""
+    setup_django()
+
+    from django.db import connection
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+    from elearning.query_budgets import SEED_PASSWORD, seed_dataset
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=args.keepdb)
+    try:
+        context = seed_dataset(args.scale)
+        from accounts.models import User
+        students = [
+            {'email': email, 'password': SEED_PASSWORD}
+            for email in User.objects.filter(role='student', email__startswith='budget-student')
+            .order_by('id').values_list('email', flat=True)
+        ]
+        admin = {'email': context['admin'].email, 'password': SEED_PASSWORD}
+        result = run_flows(ClientConnection, students, admin, args)
+        result['database'] = connection.vendor
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=args.keepdb)
+        teardown_test_environment()
+    return result
+
+
+def run_against_server(args):
+    students = [{'email': args.email, 'password': args.password}]
+    admin = {'email': args.admin_email, 'password': args.admin_password} if args.admin_email else None
+    return run_flows(lambda: HttpConnection(args.base_url), students, admin, args)
+
+
+def compare_with_baseline(result, baseline, max_regression):
+    """
+    ベースラインとの差分（%）を計算する
+    レイテンシは増加、スループットは減少を悪化とし、p95 が max_regression% を
+    超えて悪化したエンドポイントを regressions に含める
+    """
+    comparison = {}
+    regressions = []
+    for endpoint, current in result['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(endpoint)
+        if base is None:
+            continue
+        entry = {}
+        for metric in COMPARED_LATENCIES:
+            before, after = base['latency'][metric], current['latency'][metric]
+            entry[metric] = {'baseline': before, 'current': after,
+                             'change_percent': round((after - before) / before * 100, 1) if before else None}
+        before, after = base['requests_per_second'], current['requests_per_second']
+        entry['requests_per_second'] = {'baseline': before, 'current': after,
+                                        'change_percent': round((after - before) / before * 100, 1) if before else None}
+        comparison[endpoint] = entry
+
+        change = entry['p95_ms']['change_percent']
+        if max_regression is not None and change is not None and change > max_regression:
+            regressions.append(endpoint)
+    return {'baseline_created_at': baseline.get('created_at'), 'endpoints': comparison, 'regressions': regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the end-to-end quiz flow and admin reports per endpoint')
+    parser.add_argument('--base-url', help='Run against a running server instead of the in-process test client')
+    parser.add_argument('--email', help='Student login email (required with --base-url)')
+    parser.add_argument('--password')
+    parser.add_argument('--admin-email', help='Admin login email for the report flow (--base-url only)')
+    parser.add_argument('--admin-password')
+    parser.add_argument('--flows', type=int, default=100, help='Number of student flows to measure')
+    parser.add_argument('--warmup', type=int, default=5, help='Flows to run before measuring')
+    parser.add_argument('--questions', type=int, default=10, help='Questions per quiz session')
+    parser.add_argument('--session-flow', choices=['client', 'server'], default='client',
+                        help='client: random questions + check-answer + session POST; '
+                             'server: server-drawn session start + submit')
+    parser.add_argument('--admin-every', type=int, default=10,
+                        help='Run the admin report flow after every N student flows (0 to disable)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Parallel flows (--base-url only)')
+    parser.add_argument('--scale', type=int, default=5, help='Seed dataset size for in-process runs')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database between in-process runs')
+    parser.add_argument('--seed', type=int, help='Random seed for choosing genres and answers')
+    parser.add_argument('--label', default='', help='Label included in the output')
+    parser.add_argument('--output', help='Write the result JSON to this file (use it as a baseline later)')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--max-regression', type=float,
+                        help='Exit with status 1 when an endpoint p95 is more than this percent slower than the baseline')
+    args = parser.parse_args()
+
+    if args.base_url and not (args.email and args.password):
+        parser.error('--email/--password are required with --base-url')
+    if not args.base_url and args.concurrency != 1:
+        parser.error('--concurrency is only supported with --base-url')
+    if args.max_regression is not None and not args.compare:
+        parser.error('--max-regression requires --compare')
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    result = run_against_server(args) if args.base_url else run_in_process(args)
+    result = {
+        'label': args.label,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'transport': 'http' if args.base_url else 'client',
+        'base_url': args.base_url,
+        'python': platform.python_version(),
+        'parameters': {
+            'flows': args.flows, 'warmup': args.warmup, 'questions': args.questions,
+            'session_flow': args.session_flow,
+            'admin_every': args.admin_every, 'concurrency': args.concurrency,
+            'scale': None if args.base_url else args.scale,
+        },
+        **result,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            result['comparison'] = compare_with_baseline(result, json.load(f), args.max_regression)
+        if result['comparison']['regressions']:
+            exit_code = 1
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
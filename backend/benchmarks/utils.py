@@ -0,0 +1,32 @@
+import os
+import statistics
+
+
+def setup_django(default_settings='elearning.settings.development'):
+    """スタンドアロン実行用にDjangoを初期化する"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
+
+    import django
+    django.setup()
+
+
+def percentile(values, percent):
+    """パーセンタイル値（線形補間）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+def summarize_latencies(latencies):
+    """レイテンシ（秒）のリストを集計する（ミリ秒で返す）"""
+    return {
+        'count': len(latencies),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
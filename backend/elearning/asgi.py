@@ -5,3 +5,42 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elearning.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+
+def serve_static_files(app):
+    """
+    STATIC_URL 以下のリクエストだけを WhiteNoise で返し、それ以外は Django に渡す
+    WhiteNoiseMiddleware は同期専用で、ミドルウェアに含めると全リクエストが sync_to_async を経由するため、
+    ASYNC_QUIZ_VIEWS のときはミドルウェアから外してここで返す（STATIC_URL が S3 などの別ドメインなら何もしない）
+    """
+    prefix = settings.STATIC_URL
+    if not prefix.startswith('/'):
+        return app
+
+    from asgiref.wsgi import WsgiToAsgi
+    from whitenoise import WhiteNoise
+
+    def not_found(environ, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+        return [b'Not Found']
+
+    static_app = WsgiToAsgi(WhiteNoise(not_found, root=settings.STATIC_ROOT, prefix=prefix))
+
+    async def dispatch(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(prefix):
+            await static_app(scope, receive, send)
+        else:
+            await app(scope, receive, send)
+
+    return dispatch
+
+
+if settings.ASYNC_QUIZ_VIEWS:
+    application = serve_static_files(application)
+
+# 依存サービスのチェックをバックグラウンドで開始する（/api/health/ready/）
+from elearning.readiness import start_readiness_monitor  # noqa: E402
+
+start_readiness_monitor()
@@ -0,0 +1,44 @@
+"""
+キャッシュのヒット/ミスを elearning.metrics に記録するキャッシュバックエンド
+
+CACHES の BACKEND に指定すると、リクエスト処理中の get() / get_many() の結果が
+ビューごとのメトリクスに集計される。非同期版（aget など）も内部で get() を呼ぶため計測される。
+"""
+
+from django.core.cache.backends.locmem import LocMemCache as _LocMemCache
+
+from .metrics import record_cache_access
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            record_cache_access(0, 1)
+            return default
+        record_cache_access(1, 0)
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, **kwargs)
+        record_cache_access(len(values), len(keys) - len(values))
+        return values
+
+
+class LocMemCache(CacheMetricsMixin, _LocMemCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:  # django-redis を使わない環境
+    _RedisCache = None
+
+if _RedisCache is not None:
+
+    class RedisCache(CacheMetricsMixin, _RedisCache):
+        pass
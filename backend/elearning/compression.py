@@ -0,0 +1,158 @@
+"""
+レスポンスの圧縮（brotli / gzip）
+
+CompressionMiddleware が Accept-Encoding に応じて JSON などのレスポンスを圧縮する。
+- brotli を優先し、使えない場合（ライブラリがない・クライアントが受け付けない）は gzip
+- ストリーミングレスポンス（エクスポート・ファイル配信）、圧縮済みのレスポンス、
+  COMPRESSION_MIN_SIZE バイト未満の本文は圧縮しない
+- GET/HEAD の 200 のレスポンスには本文の ETag を付け、If-None-Match が一致すれば 304 を返す
+- COMPRESSION_CACHE_MIN_SIZE バイト以上の本文は、圧縮した結果を ETag（本文のハッシュ）をキーにキャッシュに保存し、
+  同じ本文を次に返すときは圧縮し直さない（キーは本文のハッシュのため、受講者をまたいで共有しても
+  同じ本文を返すリクエストにしか使われない）
+
+APIはCSRFトークンを本文に含めないため、BREACH 対策のランダムなパディングは行わない
+（パディングを入れると同じ本文の圧縮結果を再利用できなくなる）。
+"""
+
+import gzip
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import quote_etag
+
+try:
+    import brotli
+except ImportError:  # brotli がない環境では gzip のみ
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_CONTENT_TYPE_RE = re.compile(r'^(text/|application/(json|javascript|xml)|[^;]+\+(json|xml))')
+CACHE_KEY_PREFIX = 'compression'
+
+
+def accepted_encodings(accept_encoding):
+    """Accept-Encoding で受け付けるエンコーディング（q=0 のものを除く）"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        token, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """レスポンスに使うエンコーディング（br → gzip の順。どちらも受け付けなければ None）"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def content_digest(content):
+    """本文のハッシュ（ETag と圧縮結果のキャッシュのキーに使う。Django の ETag と同じ md5）"""
+    return hashlib.md5(content, usedforsecurity=False).hexdigest()
+
+
+def cache_key(encoding, digest):
+    # 圧縮の設定を変えたら古い結果を使わないよう、品質もキーに含める
+    quality = settings.COMPRESSION_BROTLI_QUALITY if encoding == 'br' else settings.COMPRESSION_GZIP_LEVEL
+    return f'{CACHE_KEY_PREFIX}:{encoding}{quality}:{digest}'
+
+
+def compress_cached(content, encoding, digest):
+    """圧縮した本文（digest が None ならキャッシュを使わない）"""
+    if digest is None:
+        return compress(content, encoding)
+
+    cache = caches[settings.COMPRESSION_CACHE_ALIAS]
+    key = cache_key(encoding, digest)
+    try:
+        compressed = cache.get(key)
+    except Exception:
+        logger.warning('Failed to read compressed response from cache', exc_info=True)
+        compressed = None
+    if compressed is not None:
+        return compressed
+
+    compressed = compress(content, encoding)
+    try:
+        cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+    except Exception:
+        logger.warning('Failed to store compressed response in cache', exc_info=True)
+    return compressed
+
+
+def is_cacheable(request, response):
+    """圧縮結果をキャッシュしてよいか（no-store のレスポンスは保存しない）"""
+    return (
+        request.method in ('GET', 'HEAD')
+        and response.status_code == 200
+        and 'no-store' not in response.get('Cache-Control', '')
+        and len(response.content) >= settings.COMPRESSION_CACHE_MIN_SIZE
+    )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Accept-Encoding に応じてレスポンスを brotli / gzip で圧縮する
+    本文を読み書きする他のミドルウェアより前（リストの上）に置く
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not COMPRESSIBLE_CONTENT_TYPE_RE.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        content = response.content
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        digest = None
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            digest = content_digest(content)
+            if not response.has_header('ETag'):
+                response['ETag'] = quote_etag(digest)
+            # 条件に一致すれば 304（一致しなければ response がそのまま返る）
+            conditional = get_conditional_response(request, etag=response['ETag'], response=response)
+            if conditional is not response:
+                return conditional
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        # ビューが付けた ETag は本文ごとに一意とは限らないため、キャッシュのキーには本文のハッシュを使う
+        compressed = compress_cached(content, encoding, digest if is_cacheable(request, response) else None)
+        if len(compressed) >= len(content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # 圧縮後の本文はバイト単位では一致しないため、弱い ETag にする（GZipMiddleware と同じ）
+        if response.has_header('ETag') and response['ETag'].startswith('"'):
+            response['ETag'] = 'W/' + response['ETag']
+        return response
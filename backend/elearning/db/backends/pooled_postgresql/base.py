@@ -0,0 +1,116 @@
+"""
+接続プール付きの PostgreSQL バックエンド（gunicorn の gevent ワーカー用）
+
+Django の標準バックエンドはスレッド（gevent ではグリーンレット）ごとに接続を持つため、
+CONN_MAX_AGE > 0 では同時リクエスト数だけ接続が増え続ける。このバックエンドは
+接続を閉じる代わりにプロセス内のプールへ返却し、ワーカーあたりの接続数を POOL['MAX_SIZE'] 以下に抑える。
+
+    DATABASES['default'] = {
+        'ENGINE': 'elearning.db.backends.pooled_postgresql',
+        'CONN_MAX_AGE': 0,  # リクエスト終了時にプールへ返却する
+        'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 10, 'MAX_LIFETIME': 1800, 'MAX_IDLE': 300},
+        ...
+    }
+
+- 空きがない場合は TIMEOUT 秒まで待ち、取得できなければ OperationalError になる
+- 返却時に未完了のトランザクションはロールバックし、状態が不明な接続は破棄する
+- gevent で socket が monkey patch されている場合は psycopg2 の待機をグリーンレット対応にする
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import Database
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from .pool import PoolTimeout, get_pool
+
+# psycopg2 / psycopg 3 共通の transaction_status の値
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_INTRANS = 2
+TRANSACTION_STATUS_INERROR = 3
+
+
+class PoolTimeoutError(Database.OperationalError):
+    """プールから接続を取得できなかった（Django の OperationalError に変換される）"""
+
+
+def gevent_wait_callback(connection, timeout=None):
+    """psycopg2 の待機を gevent のイベントループに任せる（psycogreen と同じ処理）"""
+    import psycopg2.extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = connection.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise Database.OperationalError(f'Bad result from poll: {state!r}')
+
+
+def install_gevent_wait_callback():
+    """gevent 環境でのみ待機コールバックを登録する（psycopg 3 は gevent に対応済み）"""
+    if is_psycopg3:
+        return
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if not monkey.is_module_patched('socket'):
+        return
+
+    import psycopg2.extensions
+    if psycopg2.extensions.get_wait_callback() is None:
+        psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
+
+def reset_connection(connection):
+    """返却前にトランザクションを終了する（再利用できない場合は False）"""
+    status = connection.info.transaction_status
+    if status == TRANSACTION_STATUS_IDLE:
+        return True
+    if status in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+        connection.rollback()
+        return True
+    # クエリ実行中・状態不明
+    return False
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            # 接続を持ち続けると、その間はプールに返却されない
+            raise ImproperlyConfigured(
+                'elearning.db.backends.pooled_postgresql requires CONN_MAX_AGE = 0 '
+                '(connections are returned to the pool when Django closes them)'
+            )
+        install_gevent_wait_callback()
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        try:
+            return self.pool.checkout(lambda: connect(conn_params))
+        except PoolTimeout as e:
+            raise PoolTimeoutError(str(e)) from e
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # atomic ブロック内で閉じられた場合、Django は self.connection を保持し続けるため
+            # 他のリクエストに貸し出さないよう破棄する
+            self.pool.discard(self.connection)
+        else:
+            self.pool.checkin(self.connection, reset=reset_connection)
+
+    def pool_stats(self):
+        return self.pool.stats()
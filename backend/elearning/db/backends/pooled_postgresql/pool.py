@@ -0,0 +1,242 @@
+"""
+ワーカープロセス内で共有するDB接続プール
+
+接続数の上限（max_size）を超えて接続を作らず、空きがない場合は timeout 秒まで待つ。
+返却された接続は待機の古い順に渡す（後から来たリクエストに追い越されない）。
+待機には threading.Event を使うため、gevent の monkey patch 環境では
+スレッドではなくグリーンレット単位で待機する（ワーカー全体は止まらない）。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """timeout 秒以内に接続を取得できなかった"""
+
+
+class _Waiter:
+    """接続の空きを待っているリクエスト（返却された接続か、新規作成の枠を受け取る）"""
+    __slots__ = ('event', 'connection', 'may_connect')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection = None
+        self.may_connect = False
+
+
+class ConnectionPool:
+
+    def __init__(self, max_size, timeout=10.0, max_lifetime=None, max_idle=None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+
+        self.lock = threading.Lock()
+        # (接続, 作成時刻, 返却時刻)。最後に返却された接続から使う（LIFO）
+        self.idle = deque()
+        # 待機中のリクエスト。返却された接続は待機の古い順に直接渡す（FIFO）
+        self.waiters = deque()
+        self.created_at = {}
+        self.size = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.connections_created = 0
+        self.connections_discarded = 0
+
+    def _expired(self, created, returned, now):
+        if self.max_lifetime is not None and now - created >= self.max_lifetime:
+            return True
+        return self.max_idle is not None and now - returned >= self.max_idle
+
+    def checkout(self, connect):
+        """
+        接続を取り出す（空きがなく上限に達している場合は返却を待つ）
+        connect: 新しい接続を作る関数（上限に達していない場合のみ呼ばれる）
+        """
+        start = time.monotonic()
+        expired = []
+        waiter = None
+
+        with self.lock:
+            # 待機中のリクエストがある場合は追い越さない
+            connection = None if self.waiters else self._pop_idle(start, expired)
+            may_connect = False
+            if connection is None and not self.waiters and self.size < self.max_size:
+                # 接続の作成はロックの外で行う（枠だけ先に確保する）
+                self.size += 1
+                may_connect = True
+            if connection is None and not may_connect:
+                waiter = _Waiter()
+                self.waiters.append(waiter)
+            else:
+                self.checkouts += 1
+
+        for stale in expired:
+            self._close(stale)
+
+        if waiter is not None:
+            waiter.event.wait(self.timeout)
+            with self.lock:
+                connection, may_connect = waiter.connection, waiter.may_connect
+                if connection is None and not may_connect:
+                    self.waiters.remove(waiter)
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'Timed out after {self.timeout}s waiting for a database connection '
+                        f'(pool size {self.max_size}, {len(self.waiters)} waiting)'
+                    )
+                elapsed = time.monotonic() - start
+                self.checkouts += 1
+                self.waits += 1
+                self.wait_time += elapsed
+                self.max_wait_time = max(self.max_wait_time, elapsed)
+
+        if connection is not None:
+            return connection
+
+        try:
+            connection = connect()
+        except BaseException:
+            with self.lock:
+                self._release_slot()
+            raise
+
+        with self.lock:
+            self.created_at[id(connection)] = time.monotonic()
+            self.connections_created += 1
+        return connection
+
+    def _pop_idle(self, now, expired):
+        """
+        再利用できる待機中の接続を取り出す（ロックを取得した状態で呼ぶ）
+        閉じている・期限切れの接続は expired に追加し、ロックの外で閉じる
+        """
+        while self.idle:
+            connection, created, returned = self.idle.pop()
+            if getattr(connection, 'closed', False) or self._expired(created, returned, now):
+                self._forget(connection)
+                expired.append(connection)
+                continue
+            return connection
+        return None
+
+    def _release_slot(self):
+        """
+        接続1つ分の枠を空ける（ロックを取得した状態で呼ぶ）
+        待機中のリクエストがあれば、その枠で新しい接続を作らせる
+        """
+        if self.waiters:
+            waiter = self.waiters.popleft()
+            waiter.may_connect = True
+            waiter.event.set()
+        else:
+            self.size -= 1
+
+    def checkin(self, connection, reset=None):
+        """
+        接続を返却する
+        reset: 返却前に接続の状態を戻す関数（False を返すか例外の場合は接続を破棄する）
+        """
+        reusable = not getattr(connection, 'closed', False)
+        if reusable and reset is not None:
+            try:
+                reusable = reset(connection) is not False
+            except Exception:
+                reusable = False
+
+        now = time.monotonic()
+        with self.lock:
+            created = self.created_at.get(id(connection), now)
+            if reusable and self.max_lifetime is not None and now - created >= self.max_lifetime:
+                reusable = False
+            if not reusable:
+                self._forget(connection)
+            elif self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.connection = connection
+                waiter.event.set()
+            else:
+                self.idle.append((connection, created, now))
+
+        if not reusable:
+            self._close(connection)
+
+    def discard(self, connection):
+        """使えなくなった接続を破棄する（枠を空ける）"""
+        with self.lock:
+            self._forget(connection)
+        self._close(connection)
+
+    def _forget(self, connection):
+        # ロックを取得した状態で呼ぶ
+        self.created_at.pop(id(connection), None)
+        self.connections_discarded += 1
+        self._release_slot()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """待機中の接続をすべて閉じる（貸し出し中の接続は返却時に扱われる）"""
+        with self.lock:
+            idle = [connection for connection, _, _ in self.idle]
+            self.idle.clear()
+            for connection in idle:
+                self._forget(connection)
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'waiting': len(self.waiters),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_time, 6),
+                'max_wait_seconds': round(self.max_wait_time, 6),
+                'connections_created': self.connections_created,
+                'connections_discarded': self.connections_discarded,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """
+    DB別名ごとのプールを返す（プロセスごとに1つ）
+    fork した子プロセスでは親の接続を使わないよう、新しいプールを作る
+    """
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    max_size=int(options.get('MAX_SIZE', 10)),
+                    timeout=float(options.get('TIMEOUT', 10)),
+                    max_lifetime=options.get('MAX_LIFETIME'),
+                    max_idle=options.get('MAX_IDLE'),
+                )
+    return pool
@@ -0,0 +1,190 @@
+"""
+読み取り専用のビューをレプリカ（DATABASES['replica']）に振り分けるDBルーター
+
+    DATABASE_ROUTERS = ['elearning.db.routers.ReplicaRouter']
+
+ReplicaReadMixin を継承したビューの GET/HEAD/OPTIONS だけがレプリカを参照し、
+それ以外（書き込み・認証・マークしていないビュー）はすべてプライマリを使う。
+次の場合はマークしたビューでもプライマリから読む。
+- レプリカの遅延が REPLICA_MAX_LAG_SECONDS を超えている・遅延を確認できない
+- 本人がクイズセッションを送信してから REPLICA_PIN_SECONDS 秒以内（自分の書き込みを読めるようにする）
+
+レプリカの遅延はワーカープロセスごとに REPLICA_LAG_CHECK_INTERVAL 秒に1回だけ確認する。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+# 整合性が必要なため、マークしたビューの中でもプライマリから読むアプリ
+PRIMARY_ONLY_APPS = {'sessions', 'token_blacklist'}
+
+# PostgreSQL のストリーミングレプリカの遅延（秒）
+# 受信済みのWALをすべて適用済みなら、更新がないだけなので遅延なしとみなす
+REPLICA_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+# 現在のリクエスト（スレッド・グリーンレット・コルーチン）で読み取りに使うDB
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def measure_replica_lag():
+    """レプリカの遅延（秒）。PostgreSQL 以外（ローカルの検証用DBなど）は 0"""
+    connection = connections[REPLICA_ALIAS]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return None if lag is None else max(float(lag), 0.0)
+
+
+class ReplicaLagMonitor:
+    """レプリカの遅延をプロセス内で保持し、一定間隔で確認し直す"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+
+    @property
+    def max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+
+    def refresh(self):
+        try:
+            lag, error = measure_replica_lag(), None
+        except Exception as e:
+            lag, error = None, str(e)[:200]
+            logger.warning('Replica lag check failed: %s', error)
+            # 次回の確認で再接続する
+            connections[REPLICA_ALIAS].close()
+        self.lag, self.error, self.checked_at = lag, error, time.monotonic()
+
+    def is_usable(self):
+        """レプリカから読んでよいか（確認の時期であれば、1つのリクエストだけが確認する）"""
+        checked_at = self.checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.interval:
+            # 他のリクエストが確認中の場合は前回の結果を使う（初回はプライマリ）
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.refresh()
+                finally:
+                    self.lock.release()
+        lag = self.lag
+        return lag is not None and lag <= self.max_lag
+
+    def status(self):
+        return {
+            'alias': REPLICA_ALIAS,
+            'lag_seconds': None if self.lag is None else round(self.lag, 3),
+            'max_lag_seconds': self.max_lag,
+            'usable': self.lag is not None and self.lag <= self.max_lag,
+            'error': self.error,
+            'checked_seconds_ago': None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1),
+        }
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_primary_reads(user):
+    """本人の書き込み直後の一定時間、マークしたビューでもプライマリから読ませる"""
+    if not replica_configured():
+        return
+    try:
+        cache.set(_pin_key(user.pk), 1, getattr(settings, 'REPLICA_PIN_SECONDS', 15))
+    except Exception:
+        logger.warning('Failed to pin reads to the primary for user %s', user.pk, exc_info=True)
+
+
+def is_pinned_to_primary(user):
+    try:
+        return cache.get(_pin_key(user.pk)) is not None
+    except Exception:
+        # 書き込み直後かどうか分からない場合はプライマリから読む
+        return True
+
+
+def choose_read_alias(request):
+    """マークしたビューで読み取りに使うDB"""
+    if not replica_configured() or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return DEFAULT_DB_ALIAS
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned_to_primary(user):
+        return DEFAULT_DB_ALIAS
+    if not lag_monitor.is_usable():
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    APIView 用: 認証・権限チェックの後の読み取りをレプリカに振り分ける
+    使用したDBはレスポンスヘッダー X-DB-Read-Alias で返す
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # 認証（ユーザーの取得）はプライマリで行う
+        super().initial(request, *args, **kwargs)
+        _read_alias.set(choose_read_alias(request))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        alias = _read_alias.get()
+        if alias is not None:
+            response['X-DB-Read-Alias'] = alias
+        return response
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリの複製なので、どちらから読んだオブジェクトも関連付けてよい
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
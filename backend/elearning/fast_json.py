@@ -0,0 +1,98 @@
+"""
+orjson を使った REST API の JSON レンダラー・パーサー
+
+DRF の JSONRenderer / JSONParser（標準ライブラリの json）と同じ出力・受け付ける入力のまま、
+エンコード・デコードを orjson で行う。FAST_JSON_API = True（既定）のときに
+REST_FRAMEWORK の既定のレンダラー・パーサーとして使う。
+
+- datetime / date / time は orjson の形式ではなく DRF の JSONEncoder に渡す（UTC を Z にするなど DRF の形式を保つ）
+- Decimal・遅延翻訳文字列（gettext_lazy）・UUID 以外の型なども DRF の JSONEncoder.default で変換する
+- orjson で出力できない値（64bit を超える整数など）は標準ライブラリの json にフォールバックする
+- 読み込みでは 64bit を超える整数が float になる（APIの入力のIDは文字列のため影響しない）
+- float の NaN・Infinity は DRF では例外になるが、orjson では null として出力する
+- orjson がインストールされていない場合は常に標準ライブラリの json を使う
+"""
+
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson がない環境では標準ライブラリの json のみ
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+# DRF の JSONEncoder.default（datetime・Decimal・遅延翻訳文字列などの変換）
+_encoder_default = JSONEncoder().default
+
+# JavaScript の文字列リテラルでは改行として扱われるため、DRF と同じくエスケープする
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def dumps(data):
+    """DRF の JSONRenderer と同じ形式（非ASCIIをエスケープしない・空白なし）の JSON バイト列"""
+    if orjson is not None:
+        try:
+            content = orjson.dumps(data, default=_encoder_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            for separator, escaped in _LINE_SEPARATORS:
+                if separator in content:
+                    content = content.replace(separator, escaped)
+            return content
+    content = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+def loads(content):
+    """JSON を読み込む（NaN・Infinity は DRF の JSONParser と同じく受け付けない）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # 不正な入力は標準ライブラリで読み直し、DRF の JSONParser と同じエラーメッセージにする
+            pass
+    return json.loads(content, parse_constant=_reject_constant)
+
+
+def _reject_constant(value):
+    raise ValueError(f'{value} is not a valid JSON value')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer の orjson 版
+    インデントの指定（Accept: application/json; indent=4 など）がある場合は JSONRenderer で出力する
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser の orjson 版"""
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                content = content.decode(encoding)
+            return loads(content)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
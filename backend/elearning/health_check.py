@@ -2,13 +2,19 @@
 Health check views for production monitoring
 """
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.db import connection
-from django.core.cache import cache
 import time
 
+from .metrics import render_prometheus
+from .readiness import monitor
+
+# Status names used by the detailed health check
+DETAILED_STATUS = {'ready': 'healthy', 'degraded': 'degraded', 'unhealthy': 'unhealthy'}
+
 
 @csrf_exempt
 @require_http_methods(["GET"])
@@ -26,37 +32,56 @@ def health_check(request):
 @require_http_methods(["GET"])
 def health_check_detailed(request):
     """
-    Detailed health check with database and cache checks
-    """
-    status = 'healthy'
-    checks = {
-        'database': False,
-        'cache': False
-    }
-    
-    # Database check
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('SELECT 1')
-        checks['database'] = True
-    except Exception:
-        status = 'unhealthy'
-        checks['database'] = False
-    
-    # Cache check
-    try:
-        cache.set('health_check', 'test', 30)
-        if cache.get('health_check') == 'test':
-            checks['cache'] = True
-        else:
-            checks['cache'] = False
-            status = 'unhealthy'
-    except Exception:
-        status = 'unhealthy'
-        checks['cache'] = False
-    
+    Detailed health check with database, cache and migration checks
+    Serves the latest background readiness results (no database or cache access per request)
+    """
+    readiness = monitor.evaluate()
+    details = readiness['details']
+
     return JsonResponse({
-        'status': status,
-        'checks': checks,
+        'status': DETAILED_STATUS[readiness['status']],
+        'checks': {
+            name: details.get(name, {}).get('ok', False)
+            for name in ('database', 'cache', 'migrations')
+        },
+        'reasons': readiness['reasons'],
+        'details': details,
+        'checked_at': readiness['checked_at'],
         'timestamp': time.time()
-    })
\ No newline at end of file
+    })
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def health_ready(request):
+    """
+    Readiness probe: 503 while the database is unavailable, migrations are pending
+    or the background checks have stopped; 200 when ready or degraded
+    """
+    readiness = monitor.evaluate()
+    return JsonResponse(
+        {**readiness, 'timestamp': time.time()},
+        status=503 if readiness['status'] == 'unhealthy' else 200
+    )
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def health_metrics(request):
+    """
+    Request metrics for all workers in Prometheus text format
+    Requires "Authorization: Bearer <METRICS_AUTH_TOKEN>" when the token is set.
+    Refused when METRICS_REQUIRE_AUTH_TOKEN is set and no token is configured (production)
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if not token and getattr(settings, 'METRICS_REQUIRE_AUTH_TOKEN', False):
+        return JsonResponse({'error': 'Metrics are disabled (METRICS_AUTH_TOKEN is not set)'}, status=403)
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not constant_time_compare(header, f'Bearer {token}'):
+            return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    return HttpResponse(
+        render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,313 @@
+"""
+リクエスト単位のパフォーマンス計測（Prometheus 形式で出力）
+
+RequestMetricsMiddleware がビューごと（URL名 + HTTPメソッド）に以下を集計する。
+- リクエスト数（ステータスコード別）とレイテンシのヒストグラム
+- DBクエリ数のヒストグラムとDB時間（execute_wrapper で計測）
+- キャッシュのヒット/ミス数（elearning.cache_backends のキャッシュを使用している場合）
+- レスポンスサイズ（ストリーミングレスポンスは除く）
+
+集計はワーカープロセス内のメモリで行い、METRICS_FLUSH_INTERVAL 秒ごとに
+累積値をキャッシュ（本番は Redis）に書き出す。/api/health/metrics/ では
+全ワーカーの累積値を合算して返すため、どのワーカーが応答しても同じ値になる。
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# ワーカー一覧 {ワーカーID: 最後に登録した時刻}。有効期限付きで、期限を過ぎたワーカーは登録時に取り除く
+WORKERS_KEY = 'metrics:workers'
+WORKER_KEY_PREFIX = 'metrics:worker:'
+# 停止したワーカーの累積値を残す期間（これを過ぎると合算から外れる）
+WORKER_SNAPSHOT_TIMEOUT = 24 * 60 * 60
+# 稼働中のワーカーがワーカー一覧の登録時刻を更新する間隔
+WORKER_REGISTER_INTERVAL = 60 * 60
+
+# 処理中のリクエストの計測値（gevent / asyncio でもリクエストごとに分離される）
+_current_request = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """1リクエスト分の計測値"""
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def record_cache_access(hits, misses):
+    """キャッシュの参照結果を処理中のリクエストに記録する（elearning.cache_backends から呼ばれる）"""
+    metrics = _current_request.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    # 接続ごとに1回だけ登録する（リクエストごとの execute_wrapper() は不要）
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_wrapper, dispatch_uid='elearning.metrics.install_query_wrapper')
+
+
+def _new_view_stats():
+    return {
+        'status': {},
+        'duration_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'duration_sum': 0.0,
+        'query_buckets': [0] * (len(QUERY_COUNT_BUCKETS) + 1),
+        'query_sum': 0,
+        'db_time': 0.0,
+        'cache_hits': 0,
+        'cache_misses': 0,
+        'response_bytes': 0,
+    }
+
+
+class MetricsRegistry:
+    """ワーカープロセス内の累積値"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.last_flush = time.monotonic()
+        self.registered_at = None
+
+    def observe(self, view, method, status, duration, metrics, response_bytes):
+        with self.lock:
+            stats = self.views.get((view, method))
+            if stats is None:
+                stats = self.views[(view, method)] = _new_view_stats()
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+            stats['duration_buckets'][bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            stats['duration_sum'] += duration
+            stats['query_buckets'][bisect.bisect_left(QUERY_COUNT_BUCKETS, metrics.queries)] += 1
+            stats['query_sum'] += metrics.queries
+            stats['db_time'] += metrics.db_time
+            stats['cache_hits'] += metrics.cache_hits
+            stats['cache_misses'] += metrics.cache_misses
+            if response_bytes is not None:
+                stats['response_bytes'] += response_bytes
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                key: {**stats, 'status': dict(stats['status']),
+                      'duration_buckets': list(stats['duration_buckets']),
+                      'query_buckets': list(stats['query_buckets'])}
+                for key, stats in self.views.items()
+            }
+
+    def flush_if_due(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 15)
+        if time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        """累積値をキャッシュに書き出し、ワーカー一覧に登録する"""
+        self.last_flush = time.monotonic()
+        try:
+            cache.set(WORKER_KEY_PREFIX + self.worker_id, self.snapshot(), WORKER_SNAPSHOT_TIMEOUT)
+            self.register()
+        except Exception:
+            logger.warning('Failed to flush request metrics', exc_info=True)
+
+    def register(self):
+        """
+        ワーカー一覧に登録する（WORKER_REGISTER_INTERVAL ごと）
+        累積値の有効期限を過ぎたワーカーは取り除くため、再起動を繰り返しても一覧は増え続けない
+        """
+        now = time.time()
+        workers = cache.get(WORKERS_KEY)
+        if not isinstance(workers, dict):
+            # 未登録、または以前の形式（有効期限のないワーカーIDの集合）は作り直す
+            workers = {}
+        if (self.registered_at is not None and self.worker_id in workers
+                and now - self.registered_at < WORKER_REGISTER_INTERVAL):
+            return
+        # 一覧の更新は競合で消えることがあるが、次回の書き出しで再登録される
+        workers = {
+            worker: registered_at for worker, registered_at in workers.items()
+            if now - registered_at < WORKER_SNAPSHOT_TIMEOUT
+        }
+        workers[self.worker_id] = now
+        cache.set(WORKERS_KEY, workers, WORKER_SNAPSHOT_TIMEOUT)
+        self.registered_at = now
+
+    def collect(self):
+        """全ワーカーの累積値を合算する（キャッシュに接続できない場合は自ワーカーのみ）"""
+        self.flush()
+        try:
+            workers = cache.get(WORKERS_KEY) or {}
+            snapshots = cache.get_many([WORKER_KEY_PREFIX + worker for worker in workers])
+        except Exception:
+            logger.warning('Failed to read request metrics from cache', exc_info=True)
+            snapshots = {}
+
+        if WORKER_KEY_PREFIX + self.worker_id not in snapshots:
+            snapshots[WORKER_KEY_PREFIX + self.worker_id] = self.snapshot()
+
+        merged = {}
+        for snapshot in snapshots.values():
+            for key, stats in snapshot.items():
+                total = merged.get(key)
+                if total is None:
+                    total = merged[key] = _new_view_stats()
+                for status, count in stats['status'].items():
+                    total['status'][status] = total['status'].get(status, 0) + count
+                for field in ('duration_buckets', 'query_buckets'):
+                    total[field] = [a + b for a, b in zip(total[field], stats[field])]
+                for field in ('duration_sum', 'query_sum', 'db_time', 'cache_hits', 'cache_misses', 'response_bytes'):
+                    total[field] += stats[field]
+        return merged, len(snapshots)
+
+
+registry = MetricsRegistry()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(name, labels, buckets, counts, total):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{_format_value(bound)}"}} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {_format_value(total)}')
+    lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return lines
+
+
+def render_prometheus():
+    """全ワーカーの累積値を Prometheus テキスト形式で返す"""
+    merged, worker_count = registry.collect()
+    sections = {
+        'requests': ['# HELP elearning_http_requests_total Requests by view, method and status code',
+                     '# TYPE elearning_http_requests_total counter'],
+        'duration': ['# HELP elearning_http_request_duration_seconds Request latency by view',
+                     '# TYPE elearning_http_request_duration_seconds histogram'],
+        'queries': ['# HELP elearning_http_request_db_queries Database queries per request by view',
+                    '# TYPE elearning_http_request_db_queries histogram'],
+        'db_time': ['# HELP elearning_http_request_db_seconds_total Time spent in database queries by view',
+                    '# TYPE elearning_http_request_db_seconds_total counter'],
+        'cache_hits': ['# HELP elearning_http_request_cache_hits_total Cache hits by view',
+                       '# TYPE elearning_http_request_cache_hits_total counter'],
+        'cache_misses': ['# HELP elearning_http_request_cache_misses_total Cache misses by view',
+                         '# TYPE elearning_http_request_cache_misses_total counter'],
+        'response_bytes': ['# HELP elearning_http_response_bytes_total Response body bytes by view',
+                           '# TYPE elearning_http_response_bytes_total counter'],
+    }
+
+    for (view, method), stats in sorted(merged.items()):
+        labels = f'view="{_escape_label(view)}",method="{_escape_label(method)}"'
+        for status, count in sorted(stats['status'].items()):
+            sections['requests'].append(f'elearning_http_requests_total{{{labels},status="{status}"}} {count}')
+        sections['duration'].extend(_histogram_lines(
+            'elearning_http_request_duration_seconds', labels, LATENCY_BUCKETS,
+            stats['duration_buckets'], stats['duration_sum']))
+        sections['queries'].extend(_histogram_lines(
+            'elearning_http_request_db_queries', labels, QUERY_COUNT_BUCKETS,
+            stats['query_buckets'], stats['query_sum']))
+        sections['db_time'].append(f'elearning_http_request_db_seconds_total{{{labels}}} {_format_value(stats["db_time"])}')
+        sections['cache_hits'].append(f'elearning_http_request_cache_hits_total{{{labels}}} {stats["cache_hits"]}')
+        sections['cache_misses'].append(f'elearning_http_request_cache_misses_total{{{labels}}} {stats["cache_misses"]}')
+        sections['response_bytes'].append(f'elearning_http_response_bytes_total{{{labels}}} {stats["response_bytes"]}')
+
+    lines = [
+        '# HELP elearning_metrics_workers Worker processes included in these metrics',
+        '# TYPE elearning_metrics_workers gauge',
+        f'elearning_metrics_workers {worker_count}',
+    ]
+    for section in sections.values():
+        lines.extend(section)
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """
+    ビューごとのレイテンシ・DBクエリ・キャッシュ・レスポンスサイズを記録するミドルウェア
+    MIDDLEWARE の先頭に置き、他のミドルウェアの処理時間も含めて計測する
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    def observe(self, request, response, duration, metrics):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            view = 'unresolved'
+        else:
+            view = match.view_name or match.route
+        response_bytes = None if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration, metrics, response_bytes)
+        registry.flush_if_due()
@@ -1,7 +1,7 @@
 import re
 from django.middleware.csrf import CsrfViewMiddleware
 from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,4 +21,35 @@ class CustomCsrfViewMiddleware(CsrfViewMiddleware):
                     return None
         
         logger.info(f"CSRF check will be performed for URL: {request.path_info}")
-        return super().process_view(request, callback, callback_args, callback_kwargs)
\ No newline at end of file
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthCacheReportMiddleware:
+    """
+    認証時にユーザーキャッシュで省略したクエリ数をレスポンスヘッダーで返す
+    (accounts.authentication.CachedJWTAuthentication が記録した値)
+    ASGI で sync_to_async を経由しないよう、同期・非同期の両方に対応する
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.add_header(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_header(request, await self.get_response(request))
+
+    @staticmethod
+    def add_header(request, response):
+        queries_saved = getattr(request, 'auth_queries_saved', None)
+        if queries_saved is not None:
+            response['X-Auth-Queries-Saved'] = str(queries_saved)
+        return response
@@ -0,0 +1,436 @@
+"""
+APIエンドポイントごとのクエリ数の上限（クエリバジェット）
+
+QUERY_BUDGETS に elearning/urls.py から辿れる全URLのリクエストを宣言する。
+check_query_budgets コマンドがテスト用データベースに規模の異なるデータセットを作成して
+各リクエストを実行し、以下を確認する。
+- クエリ数が宣言した上限（budget）以下であること
+- データ量を増やしてもクエリ数が増えないこと（N+1 の検出）
+- QUERY_BUDGETS に宣言のないURLがないこと
+
+新しいURLを追加した場合は QUERY_BUDGETS にも追加する。
+"""
+
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from django.views.static import serve
+from rest_framework_simplejwt.tokens import RefreshToken
+
+SEED_PASSWORD = 'Budget-Seed-Pass-1'
+
+# 計測中のキャッシュ（measure_request はリクエストごとに cache.clear() するため、設定のキャッシュは使わない）
+QUERY_BUDGET_CACHES = {
+    'default': {
+        'BACKEND': 'elearning.cache_backends.LocMemCache',
+        'LOCATION': 'query-budgets',
+    }
+}
+
+# 1倍のデータセットの件数（scale 倍して作成する）
+SEED_SIZES = {
+    'genres': 3,
+    'questions_per_genre': 5,
+    'students': 5,
+    'sessions': 6,
+    'attempts': 12,
+    'other_attempts_per_student': 3,
+    'assignments': 2,
+}
+
+CSV_IMPORT_HEADER = (
+    'Question ID,Genre ID,Genre Name,Difficulty,Difficulty Display,Title,Body,Clarification,'
+    'Choice 1 Content,Choice 1 Correct,Choice 2 Content,Choice 2 Correct,Choice 3 Content,Choice 3 Correct,'
+    'Choice 4 Content,Choice 4 Correct,Choice 5 Content,Choice 5 Correct,Author,Created At,Updated At,Reviewed At,Is Active\n'
+)
+
+
+def _csv_import_file(context):
+    return SimpleUploadedFile('questions.csv', (
+        CSV_IMPORT_HEADER
+        # 既存の問題は選択肢2つがそのまま、1つを追加・残りを削除
+        + f'{context["question_id"]},{context["genre_id"]},,2,,更新した問題,本文,解説,選択肢0,true,選択肢1,false,C,false,,,,,,,,,true\n'
+        + f',{context["genre_id"]},,1,,新しい問題,本文,解説,A,true,B,false,,,,,,,,,,,true\n'
+    ).encode('utf-8'), content_type='text/csv')
+
+
+def _csv_delete_file(context):
+    return SimpleUploadedFile('delete.csv', (
+        'Question ID\n' + f'{context["question_id"]}\nQFB99999\n'
+    ).encode('utf-8'), content_type='text/csv')
+
+
+# name: URL名, auth: None / 'student' / 'manager' / 'admin', status: 期待するステータスコード
+# kwargs / data / query は context（seed_dataset の戻り値）を受け取る関数も指定できる
+QUERY_BUDGETS = [
+    # 認証
+    {'name': 'register', 'method': 'post', 'auth': None, 'status': 201, 'budget': 4,
+     'data': {'username': 'budget_new', 'email': 'budget-new@example.com',
+              'password': SEED_PASSWORD, 'password_confirm': SEED_PASSWORD}},
+    {'name': 'login', 'method': 'post', 'auth': None, 'budget': 9,
+     'data': lambda c: {'email': c['student_email'], 'password': SEED_PASSWORD}},
+    # ログアウト・リフレッシュはトークンブラックリストをDBに保存する場合（TOKEN_BLACKLIST_REDIS_URL が未設定）の件数。
+    # Redis に保存する本番ではブラックリストのクエリはない
+    {'name': 'logout', 'method': 'post', 'auth': 'student', 'status': 205, 'budget': 5,
+     'data': lambda c: {'refresh': c['student_refresh']}},
+    {'name': 'user_profile', 'method': 'get', 'auth': 'student', 'budget': 1},
+    {'name': 'profile', 'method': 'patch', 'auth': 'student', 'budget': 2,
+     'data': {'display_name': 'Budget Student'}},
+    {'name': 'change_password', 'method': 'post', 'auth': 'student', 'budget': 2,
+     'data': {'old_password': SEED_PASSWORD, 'new_password': 'Budget-Changed-Pass-2'}},
+    {'name': 'token_refresh', 'method': 'post', 'auth': None, 'budget': 5,
+     'data': lambda c: {'refresh': c['student_refresh']}},
+
+    # 問題
+    {'name': 'questions:genre-list', 'method': 'get', 'auth': None, 'budget': 2},
+    {'name': 'questions:question-list', 'method': 'get', 'auth': 'student', 'budget': 4},
+    {'name': 'questions:random-questions', 'method': 'get', 'auth': None, 'budget': 3,
+     'query': {'count': 5}},
+    {'name': 'questions:check-answer', 'method': 'post', 'auth': 'student', 'budget': 4,
+     'data': lambda c: {'question_id': c['question_id'], 'choice_id': c['choice_id']}},
+    {'name': 'questions:question-detail', 'method': 'get', 'auth': 'student', 'budget': 3,
+     'kwargs': lambda c: {'id': c['question_id']}},
+    {'name': 'questions:question-pack-list', 'method': 'get', 'auth': 'student', 'budget': 2},
+    # 作成済みのパックはユーザーの取得とファイルだけ（ファイルがない名前は一覧を1回確認して 404）
+    {'name': 'questions:question-pack-file', 'method': 'get', 'auth': 'student', 'status': 404, 'budget': 2,
+     'kwargs': lambda c: {'name': f'{c["genre_id"]}.000000000000.json'}},
+
+    # 学習進捗
+    {'name': 'quiz_sessions', 'method': 'get', 'auth': 'student', 'budget': 6},
+    {'name': 'quiz_sessions', 'method': 'post', 'auth': 'student', 'status': 201, 'budget': 8,
+     'data': lambda c: {'session_type': 'genre', 'genre': c['genre_id'], 'total_questions': 2, 'answers': [
+         {'question_id': c['question_id'], 'selected_choice_id': c['choice_id'], 'is_correct': True},
+         {'question_id': c['question_id'], 'selected_choice_id': c['wrong_choice_id'], 'is_correct': False},
+     ]}},
+    {'name': 'quiz_session_start', 'method': 'post', 'auth': 'student', 'status': 201, 'budget': 6,
+     'data': lambda c: {'session_type': 'genre', 'genre': c['genre_id'], 'count': 3}},
+    {'name': 'quiz_session_submit', 'method': 'post', 'auth': 'student', 'budget': 9,
+     'kwargs': lambda c: {'pk': c['drawn_session_id']},
+     'data': lambda c: {'answers': c['drawn_answers']}},
+    {'name': 'quiz_session_detail', 'method': 'get', 'auth': 'student', 'budget': 5,
+     'kwargs': lambda c: {'pk': c['session_id']}},
+    {'name': 'user_progress', 'method': 'get', 'auth': 'student', 'budget': 4},
+    {'name': 'study_statistics', 'method': 'get', 'auth': 'student', 'budget': 12},
+    {'name': 'genre_performance', 'method': 'get', 'auth': 'student', 'budget': 5},
+    {'name': 'weekly_progress', 'method': 'get', 'auth': 'student', 'budget': 2},
+    {'name': 'daily_activity', 'method': 'get', 'auth': 'student', 'budget': 2},
+    {'name': 'user_attempts', 'method': 'get', 'auth': 'student', 'budget': 4},
+    {'name': 'assignments', 'method': 'get', 'auth': 'student', 'budget': 4},
+    {'name': 'user_assignments', 'method': 'get', 'auth': 'student', 'budget': 4},
+    {'name': 'incorrect_questions', 'method': 'get', 'auth': 'student', 'budget': 3},
+    # ランキングは Redis から読む（計測ではランキングを無効にするため 503）
+    {'name': 'leaderboards', 'method': 'get', 'auth': 'student', 'status': 503, 'budget': 1,
+     'query': {'metric': 'accuracy', 'window': 'week'}},
+
+    # 成績管理者用（集計キューブから求める）
+    {'name': 'department_stats', 'method': 'get', 'auth': 'manager', 'budget': 2,
+     'query': {'group_by': 'genre,period', 'granularity': 'week'}},
+    {'name': 'department_summary', 'method': 'get', 'auth': 'manager', 'budget': 2},
+
+    # 管理者用
+    {'name': 'admin_genres', 'method': 'get', 'auth': 'admin', 'budget': 3},
+    {'name': 'admin_genres', 'method': 'post', 'auth': 'admin', 'status': 201, 'budget': 8,
+     'data': {'name': '新しいジャンル'}},
+    {'name': 'admin_genre_detail', 'method': 'get', 'auth': 'admin', 'budget': 3,
+     'kwargs': lambda c: {'pk': c['genre_id']}},
+    {'name': 'admin_questions', 'method': 'get', 'auth': 'admin', 'budget': 4},
+    {'name': 'admin_questions', 'method': 'post', 'auth': 'admin', 'status': 201, 'budget': 14,
+     'data': lambda c: {'genre': c['genre_id'], 'difficulty': 1, 'title': '新しい問題', 'body': '本文',
+                        'choices': [{'content': 'A', 'is_correct': True, 'order_index': 0},
+                                    {'content': 'B', 'is_correct': False, 'order_index': 1}]}},
+    {'name': 'admin_question_bulk', 'method': 'post', 'auth': 'admin', 'budget': 4,
+     'data': lambda c: {'action': 'deactivate', 'question_ids': c['question_ids']}},
+    {'name': 'admin_question_bulk_update', 'method': 'post', 'auth': 'admin', 'budget': 3,
+     'data': lambda c: {'question_ids': c['question_ids'], 'updates': {'difficulty': 2}}},
+    {'name': 'admin_question_detail', 'method': 'get', 'auth': 'admin', 'budget': 3,
+     'kwargs': lambda c: {'pk': c['question_id']}},
+    {'name': 'admin_question_detail', 'method': 'patch', 'auth': 'admin', 'budget': 13,
+     'kwargs': lambda c: {'pk': c['question_id']},
+     # 選択肢2つを編集し、残り（回答履歴のあるものは無効化）を取り除く
+     'data': lambda c: {'title': '更新した問題', 'choices': [
+         {'id': c['choice_id'], 'content': 'A', 'is_correct': True, 'order_index': 0},
+         {'id': c['wrong_choice_id'], 'content': 'B', 'is_correct': False, 'order_index': 1}]}},
+    {'name': 'admin_users', 'method': 'get', 'auth': 'admin', 'budget': 3},
+    {'name': 'admin_user_bulk_provision', 'method': 'post', 'auth': 'admin', 'budget': 7,
+     'data': {'rows': [{'username': 'budget_p1', 'email': 'budget-p1@example.com', 'role': 'student'},
+                       {'username': 'budget_p2', 'email': 'budget-p2@example.com', 'role': 'student'}]}},
+    {'name': 'admin_user_progress', 'method': 'get', 'auth': 'admin', 'budget': 5},
+    {'name': 'admin_user_progress_detail', 'method': 'get', 'auth': 'admin', 'budget': 8,
+     'kwargs': lambda c: {'user_id': c['student_id']}},
+    {'name': 'admin_user_detail', 'method': 'get', 'auth': 'admin', 'budget': 2,
+     'kwargs': lambda c: {'pk': c['student_id']}},
+    {'name': 'admin_stats', 'method': 'get', 'auth': 'admin', 'budget': 2},
+    {'name': 'admin_user_stats', 'method': 'get', 'auth': 'admin', 'budget': 8,
+     'query': {'days': 30}},
+    {'name': 'admin_csv_export', 'method': 'get', 'auth': 'admin', 'budget': 3},
+    # 内容の変わった選択肢は書き換えずに作成し、元の選択肢を取り除く（回答履歴があれば無効化）
+    {'name': 'admin_csv_import', 'method': 'post', 'auth': 'admin', 'budget': 34, 'multipart': True,
+     'data': lambda c: {'file': _csv_import_file(c)}},
+    # 問題の削除で項目分析（QuestionStats）も削除する
+    {'name': 'admin_csv_delete', 'method': 'post', 'auth': 'admin', 'budget': 11, 'multipart': True,
+     'data': lambda c: {'file': _csv_delete_file(c)}},
+    {'name': 'admin_analytics_export', 'method': 'get', 'auth': 'admin', 'budget': 2,
+     'query': {'dataset': 'attempts'}},
+    {'name': 'admin_debug_data', 'method': 'get', 'auth': 'admin', 'budget': 3},
+
+    # ヘルスチェック
+    {'name': 'health_check', 'method': 'get', 'auth': None, 'budget': 0},
+    # レディネスチェックはバックグラウンドの結果を返すだけ（ここではスレッドが起動しないため 503）
+    {'name': 'health_check_detailed', 'method': 'get', 'auth': None, 'budget': 0},
+    {'name': 'health_metrics', 'method': 'get', 'auth': None, 'budget': 0},
+    {'name': 'health_ready', 'method': 'get', 'auth': None, 'status': 503, 'budget': 0},
+]
+
+
+def iter_url_names(patterns=None, namespace=None):
+    """URLconf から辿れる全URLの名前（名前空間付き）"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            child_namespace = namespace
+            if pattern.namespace:
+                child_namespace = f'{namespace}:{pattern.namespace}' if namespace else pattern.namespace
+            yield from iter_url_names(pattern.url_patterns, child_namespace)
+        elif isinstance(pattern, URLPattern):
+            # DEBUG 時のメディアファイル配信は対象外
+            if pattern.callback is serve:
+                continue
+            if pattern.name is None:
+                yield None
+            else:
+                yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+def undeclared_url_names():
+    """QUERY_BUDGETS に宣言がないURL（名前のないURLは None）"""
+    declared = {spec['name'] for spec in QUERY_BUDGETS}
+    return sorted(
+        {name for name in iter_url_names() if name not in declared},
+        key=lambda name: name or '',
+    )
+
+
+def seed_dataset(scale):
+    """scale 倍のデータセットを作成し、リクエストに使う値（context）を返す"""
+    from accounts.models import User
+    from progress.models import Assignment, QuizSession, UserAssignment, UserAttempt, UserProgress
+    from progress.department_rollups import rebuild_rollups
+    from questions.models import Choice, Genre, Question, StatCounter
+
+    sizes = {name: size * scale for name, size in SEED_SIZES.items()}
+    now = timezone.now()
+
+    admin = User.objects.create_user(
+        username='budget_admin', email='budget-admin@example.com', password=SEED_PASSWORD,
+        role='admin', is_staff=True,
+    )
+    student = User.objects.create_user(
+        username='budget_student', email='budget-student@example.com', password=SEED_PASSWORD,
+        department='budget-dept',
+    )
+    manager = User.objects.create_user(
+        username='budget_manager', email='budget-manager@example.com', password=SEED_PASSWORD,
+        role='manager', department='budget-dept',
+    )
+    # パスワードのハッシュ化は1回だけ行い、他の受講者には同じハッシュを使う
+    others = User.objects.bulk_create([
+        User(username=f'budget_student_{i}', email=f'budget-student-{i}@example.com', password=student.password,
+             department='budget-dept')
+        for i in range(sizes['students'])
+    ])
+
+    genres = Genre.objects.bulk_create([
+        Genre(id=Genre.format_id(i + 1), name=f'ジャンル{i + 1}') for i in range(sizes['genres'])
+    ])
+    questions = Question.objects.bulk_create([
+        Question(
+            id=Question.format_id(g * sizes['questions_per_genre'] + i + 1),
+            genre=genre, difficulty=i % 3 + 1, title=f'問題{g}-{i}', body='本文', clarification='解説',
+            author_user=admin,
+        )
+        for g, genre in enumerate(genres)
+        for i in range(sizes['questions_per_genre'])
+    ])
+    choices = Choice.objects.bulk_create([
+        Choice(
+            id=Choice.format_id(q * 4 + i + 1),
+            question=question, content=f'選択肢{i}', is_correct=i == 0, order_index=i,
+        )
+        for q, question in enumerate(questions)
+        for i in range(4)
+    ])
+    choices_by_question = {}
+    for choice in choices:
+        choices_by_question.setdefault(choice.question_id, []).append(choice)
+    Question.sync_id_sequence([question.id for question in questions])
+    Choice.sync_id_sequence([choice.id for choice in choices])
+    Genre.sync_id_sequence([genre.id for genre in genres])
+
+    sessions = QuizSession.objects.bulk_create([
+        QuizSession(
+            user=student, session_type='genre', genre=genres[i % len(genres)],
+            total_questions=4, correct_answers=i % 5, is_completed=True,
+            end_time=now - timedelta(days=i % 30) + timedelta(minutes=10),
+        )
+        for i in range(sizes['sessions'])
+    ])
+    for i, session in enumerate(sessions):
+        session.start_time = now - timedelta(days=i % 30)
+    QuizSession.objects.bulk_update(sessions, ['start_time'])
+    # サーバーで出題した未送信のセッション
+    drawn_session = QuizSession.objects.create(
+        user=student, session_type='genre', genre=genres[0], total_questions=2,
+        question_ids=[questions[0].id, questions[1].id], expires_at=now + timedelta(hours=1),
+    )
+
+    def attempt(user, i):
+        question = questions[i % len(questions)]
+        choice = choices_by_question[question.id][i % 2]
+        return UserAttempt(user=user, question=question, selected_choice=choice, is_correct=choice.is_correct)
+
+    attempts = UserAttempt.objects.bulk_create(
+        [attempt(student, i) for i in range(sizes['attempts'])]
+        + [attempt(user, i) for user in others for i in range(sizes['other_attempts_per_student'])]
+    )
+    for i, user_attempt in enumerate(attempts):
+        user_attempt.attempt_time = now - timedelta(days=i % 30, minutes=i)
+    UserAttempt.objects.bulk_update(attempts, ['attempt_time'])
+
+    UserProgress.objects.bulk_create([
+        UserProgress(user=student, genre=genre, total_attempts=10, correct_attempts=i + 1)
+        for i, genre in enumerate(genres)
+    ])
+
+    assignments = Assignment.objects.bulk_create([
+        Assignment(title=f'課題{i}', created_by=admin, due_date=now + timedelta(days=7))
+        for i in range(sizes['assignments'])
+    ])
+    Assignment.genres.through.objects.bulk_create([
+        Assignment.genres.through(assignment=assignment, genre=genre)
+        for assignment in assignments
+        for genre in genres[:2]
+    ])
+    UserAssignment.objects.bulk_create([
+        UserAssignment(assignment=assignment, user=student) for assignment in assignments
+    ])
+
+    StatCounter.rebuild()
+    rebuild_rollups()
+
+    question = questions[0]
+    return {
+        'admin': admin,
+        'manager': manager,
+        'student': student,
+        'student_id': student.id,
+        'student_email': student.email,
+        'student_refresh': str(RefreshToken.for_user(student)),
+        'genre_id': genres[0].id,
+        'question_id': question.id,
+        'question_ids': [q.id for q in questions[:3]],
+        'choice_id': choices_by_question[question.id][0].id,
+        'wrong_choice_id': choices_by_question[question.id][1].id,
+        'session_id': sessions[0].id,
+        'drawn_session_id': drawn_session.id,
+        'drawn_answers': [
+            {'question_id': questions[0].id, 'selected_choice_id': choices_by_question[questions[0].id][0].id},
+            {'question_id': questions[1].id, 'selected_choice_id': choices_by_question[questions[1].id][1].id,
+             'response_time_seconds': 12},
+        ],
+    }
+
+
+def _resolve(value, context):
+    return value(context) if callable(value) else value
+
+
+def measure_request(spec, context):
+    """1リクエストを実行し、(クエリ数, ステータスコード) を返す。変更はロールバックする"""
+    # セッションCookieなどが前のリクエストから引き継がれないよう、毎回新しいクライアントを使う
+    client = Client()
+    kwargs = _resolve(spec.get('kwargs'), context) or {}
+    data = _resolve(spec.get('data'), context)
+    query = _resolve(spec.get('query'), context)
+    path = reverse(spec['name'], kwargs=kwargs)
+
+    headers = {}
+    if spec.get('auth'):
+        token = RefreshToken.for_user(context[spec['auth']]).access_token
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    method = getattr(client, spec['method'])
+    if spec['method'] == 'get':
+        request_kwargs = {'data': query}
+    elif spec.get('multipart'):
+        request_kwargs = {'data': data}
+    else:
+        request_kwargs = {'data': data or {}, 'content_type': 'application/json'}
+        if query:
+            path = f'{path}?' + '&'.join(f'{key}={value}' for key, value in query.items())
+
+    # 認証ユーザーのキャッシュなどに左右されないよう、毎回空の状態から計測する
+    cache.clear()
+
+    with transaction.atomic():
+        with ExitStack() as stack:
+            captures = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            response = method(path, **request_kwargs, **headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        transaction.set_rollback(True)
+
+    return sum(len(capture) for capture in captures), response.status_code
+
+
+def run_query_budgets(scales=(1, 3)):
+    """
+    各規模のデータセットで全リクエストのクエリ数を計測する
+    戻り値: [{name, method, budget, counts: {scale: count}, statuses: {scale: status}, errors: [...]}]
+    """
+    results = [
+        {'name': spec['name'], 'method': spec['method'].upper(), 'budget': spec['budget'],
+         'counts': {}, 'statuses': {}, 'errors': []}
+        for spec in QUERY_BUDGETS
+    ]
+    # 問題パックの作り直しはレスポンスの送信後の処理のため計測しない（ロールバックする変更でファイルも書き出さない）
+    # ランキングは Redis のみを使うため、計測環境の Redis に依存しないよう無効にする
+    # トークンブラックリストはDBに保存する（ロールバックされないRedisに失効を書き込まない）
+    # キャッシュはリクエストごとに空にするため、設定のキャッシュ（本番は Redis）ではなくプロセス内のキャッシュを使う
+    with override_settings(
+        QUESTION_PACKS_AUTO_BUILD=False, LEADERBOARD_REDIS_URL='', TOKEN_BLACKLIST_REDIS_URL='',
+        CACHES=QUERY_BUDGET_CACHES,
+    ):
+        for scale in scales:
+            with transaction.atomic():
+                context = seed_dataset(scale)
+                for spec, result in zip(QUERY_BUDGETS, results):
+                    count, status_code = measure_request(spec, context)
+                    result['counts'][scale] = count
+                    result['statuses'][scale] = status_code
+                transaction.set_rollback(True)
+
+    for spec, result in zip(QUERY_BUDGETS, results):
+        expected_status = spec.get('status', 200)
+        for scale, status_code in result['statuses'].items():
+            if status_code != expected_status:
+                result['errors'].append(f'status {status_code} != {expected_status} (scale {scale})')
+        counts = list(result['counts'].values())
+        if max(counts) > spec['budget']:
+            result['errors'].append(f'{max(counts)} queries > budget {spec["budget"]}')
+        if len(set(counts)) > 1:
+            result['errors'].append('query count grows with data size: ' + ', '.join(
+                f'scale {scale}: {count}' for scale, count in result['counts'].items()
+            ))
+
+    return results
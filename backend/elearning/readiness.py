@@ -0,0 +1,305 @@
+"""
+レディネスチェック（依存サービスの状態をバックグラウンドで確認し、結果を保持する）
+
+ワーカープロセスごとにスレッドを1つ起動し、READINESS_CHECK_INTERVAL 秒ごとに以下を確認する。
+- データベース: SELECT 1 の往復時間、接続数（PostgreSQL は pg_stat_activity と max_connections）、
+  接続プールの状態（elearning.db.backends.pooled_postgresql 使用時）
+- レプリカ: レプリケーションの遅延（DATABASES['replica'] がある場合）
+- キャッシュ: set/get の往復時間、Redis の接続数とコネクションプールの状態（django-redis 使用時）
+- マイグレーション: 未適用のマイグレーション（READINESS_MIGRATION_CHECK_INTERVAL 秒ごと）
+
+/api/health/ready/ と /api/health/detailed/ は保持している結果を返すだけで、
+リクエストごとのDB・キャッシュへのアクセスは発生しない。
+スレッドは elearning.wsgi / elearning.asgi で起動する（管理コマンドやテストでは起動しない）。
+"""
+
+import logging
+import os
+import socket
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+DB_PING_SAMPLES = 3
+# 結果がこの回数分のチェック間隔より古い場合はスレッドが止まっているとみなす
+STALE_AFTER_INTERVALS = 3
+# 接続数がこの割合を超えたら degraded
+CONNECTION_USAGE_WARNING = 0.9
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    """SELECT 1 の往復時間（中央値）と接続数"""
+    connection = connections[alias]
+    result = {'vendor': connection.vendor}
+    try:
+        if connection.connection is None:
+            start = time.perf_counter()
+            connection.ensure_connection()
+            result['connect_ms'] = _elapsed_ms(start)
+
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(DB_PING_SAMPLES):
+                start = time.perf_counter()
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+                timings.append(_elapsed_ms(start))
+
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT state, count(*) FROM pg_stat_activity '
+                    'WHERE datname = current_database() GROUP BY state'
+                )
+                result['connections'] = {state or 'unknown': count for state, count in cursor.fetchall()}
+                cursor.execute('SHOW max_connections')
+                result['max_connections'] = int(cursor.fetchone()[0])
+    except Exception as e:
+        # 次回のチェックで再接続する
+        connection.close()
+        return {**result, 'ok': False, 'error': str(e)[:200]}
+    finally:
+        # 接続プール使用時は、チェックの間だけ接続を借りて返却する
+        if hasattr(connection, 'pool_stats'):
+            connection.close()
+
+    if hasattr(connection, 'pool_stats'):
+        result['pool'] = connection.pool_stats()
+    return {**result, 'ok': True, 'latency_ms': statistics.median(timings)}
+
+
+def check_replica():
+    """レプリカの遅延（elearning.db.routers と同じ基準で、プライマリに切り替わるかを判定する）"""
+    from elearning.db.routers import REPLICA_ALIAS, measure_replica_lag
+
+    connection = connections[REPLICA_ALIAS]
+    result = {'vendor': connection.vendor}
+    try:
+        lag = measure_replica_lag()
+    except Exception as e:
+        connection.close()
+        return {**result, 'ok': False, 'error': str(e)[:200]}
+    finally:
+        if hasattr(connection, 'pool_stats'):
+            connection.close()
+
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+    return {
+        **result,
+        'ok': lag is not None and lag <= max_lag,
+        'lag_seconds': lag,
+        'max_lag_seconds': max_lag,
+    }
+
+
+def check_cache():
+    """set/get の往復時間と Redis の接続状態"""
+    cache = caches['default']
+    key = f'readiness:{socket.gethostname()}:{os.getpid()}'
+    token = str(time.time())
+    result = {'backend': type(cache).__name__}
+    try:
+        start = time.perf_counter()
+        cache.set(key, token, 60)
+        value = cache.get(key)
+        result['latency_ms'] = _elapsed_ms(start)
+    except Exception as e:
+        return {**result, 'ok': False, 'error': str(e)[:200]}
+
+    if value != token:
+        return {**result, 'ok': False, 'error': 'cache returned a different value'}
+
+    try:
+        from django_redis import get_redis_connection
+        client = get_redis_connection('default')
+        result['connected_clients'] = client.info('clients').get('connected_clients')
+        pool = client.connection_pool
+        result['pool'] = {
+            'created': pool._created_connections,
+            'available': len(pool._available_connections),
+            'in_use': len(pool._in_use_connections),
+            'max': pool.max_connections,
+        }
+    except (ImportError, NotImplementedError):
+        # django-redis を使わないキャッシュ
+        pass
+    except Exception:
+        logger.debug('Failed to read Redis connection info', exc_info=True)
+
+    return {**result, 'ok': True}
+
+
+def check_migrations(alias=DEFAULT_DB_ALIAS):
+    """未適用のマイグレーション"""
+    try:
+        executor = MigrationExecutor(connections[alias])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    except Exception as e:
+        return {'ok': False, 'error': str(e)[:200]}
+    pending = [f'{migration.app_label}.{migration.name}' for migration, backwards in plan if not backwards]
+    return {'ok': not pending, 'pending': pending}
+
+
+class ReadinessMonitor:
+    """ワーカープロセス内でチェックを定期実行し、最新の結果を保持する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.pid = None
+        self.thread = None
+        self.results = None
+        self.checked_at = None
+        self.migrations = None
+        self.migrations_checked_at = 0.0
+        self.pool_timeouts = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'READINESS_CHECK_INTERVAL', 10)
+
+    def start(self):
+        """このプロセスでチェックを開始する（fork 後は ensure_running() で起動し直す）"""
+        self.enabled = True
+        self.ensure_running()
+
+    def ensure_running(self):
+        if not self.enabled:
+            return
+        pid = os.getpid()
+        if self.pid == pid and self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.pid == pid and self.thread is not None and self.thread.is_alive():
+                return
+            if self.pid != pid:
+                # fork 前のプロセスの結果は使わない
+                self.results = self.checked_at = self.migrations = self.pool_timeouts = None
+                self.migrations_checked_at = 0.0
+            self.pid = pid
+            self.thread = threading.Thread(target=self._run, name='readiness-monitor', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            try:
+                self.run_checks()
+            except Exception:
+                logger.exception('Readiness checks failed')
+            time.sleep(self.interval)
+
+    def run_checks(self):
+        database = check_database()
+        if 'pool' in database:
+            # 前回のチェック以降に発生した接続取得のタイムアウト
+            timeouts = database['pool']['timeouts']
+            database['pool']['recent_timeouts'] = timeouts - (self.pool_timeouts or 0)
+            self.pool_timeouts = timeouts
+        if database['ok'] and (
+            self.migrations is None
+            or not self.migrations['ok']
+            or time.monotonic() - self.migrations_checked_at >= getattr(settings, 'READINESS_MIGRATION_CHECK_INTERVAL', 300)
+        ):
+            self.migrations = check_migrations()
+            self.migrations_checked_at = time.monotonic()
+
+        self.results = {
+            'database': database,
+            'cache': check_cache(),
+            'migrations': self.migrations or {'ok': False, 'error': 'not checked (database unavailable)'},
+        }
+        if 'replica' in settings.DATABASES:
+            self.results['replica'] = check_replica()
+        self.checked_at = time.time()
+
+    def evaluate(self):
+        """
+        保持している結果から状態を判定する
+        - unhealthy: DB接続不可・未適用のマイグレーションあり・結果が古い（チェックが止まっている）
+        - degraded: キャッシュ接続不可・応答が遅い・DB接続数が上限に近い・
+          接続プールの取得待ちでタイムアウトが発生した・
+          レプリカの遅延が大きい（プライマリから読む）（処理は継続できる）
+        - ready: 問題なし
+        """
+        self.ensure_running()
+        results, checked_at = self.results, self.checked_at
+
+        if results is None:
+            reason = 'readiness checks have not completed yet' if self.enabled else 'readiness monitor is not running'
+            return {'status': 'unhealthy', 'reasons': [reason], 'checked_at': None, 'age_seconds': None, 'details': {}}
+
+        age = time.time() - checked_at
+        unhealthy = []
+        degraded = []
+
+        if age > self.interval * STALE_AFTER_INTERVALS:
+            unhealthy.append(f'results are stale ({age:.0f}s old)')
+
+        database = results['database']
+        if not database['ok']:
+            unhealthy.append(f'database unavailable: {database["error"]}')
+        else:
+            if database['latency_ms'] > getattr(settings, 'READINESS_DB_LATENCY_WARNING_MS', 50):
+                degraded.append(f'database latency {database["latency_ms"]}ms')
+            if database.get('max_connections'):
+                used = sum(database['connections'].values())
+                if used >= database['max_connections'] * CONNECTION_USAGE_WARNING:
+                    degraded.append(f'database connections {used}/{database["max_connections"]}')
+            pool = database.get('pool')
+            if pool and pool['recent_timeouts']:
+                degraded.append(f'database pool timeouts {pool["recent_timeouts"]} (pool size {pool["max_size"]})')
+
+        migrations = results['migrations']
+        if migrations.get('pending'):
+            unhealthy.append(f'{len(migrations["pending"])} unapplied migrations')
+        elif not migrations['ok'] and database['ok']:
+            unhealthy.append(f'migration check failed: {migrations["error"]}')
+
+        replica = results.get('replica')
+        if replica and not replica['ok']:
+            if 'error' in replica:
+                degraded.append(f'replica unavailable: {replica["error"]}')
+            elif replica['lag_seconds'] is None:
+                degraded.append('replica lag unknown (reads use the primary)')
+            else:
+                degraded.append(f'replica lag {replica["lag_seconds"]}s (reads use the primary)')
+
+        cache_result = results['cache']
+        if not cache_result['ok']:
+            degraded.append(f'cache unavailable: {cache_result["error"]}')
+        elif cache_result['latency_ms'] > getattr(settings, 'READINESS_CACHE_LATENCY_WARNING_MS', 20):
+            degraded.append(f'cache latency {cache_result["latency_ms"]}ms')
+
+        if unhealthy:
+            status = 'unhealthy'
+        elif degraded:
+            status = 'degraded'
+        else:
+            status = 'ready'
+
+        return {
+            'status': status,
+            'reasons': unhealthy + degraded,
+            'checked_at': checked_at,
+            'age_seconds': round(age, 1),
+            'details': results,
+        }
+
+
+monitor = ReadinessMonitor()
+
+
+def start_readiness_monitor():
+    """サーバープロセス（wsgi / asgi）の起動時に呼ぶ"""
+    monitor.start()
@@ -36,6 +36,10 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    # First so that latency includes the other middleware (exported at /api/health/metrics/)
+    'elearning.metrics.RequestMetricsMiddleware',
+    # Before any middleware that reads or writes the response body
+    'elearning.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -46,10 +50,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'elearning.middleware.AuthCacheReportMiddleware',
 ]
 
 ROOT_URLCONF = 'elearning.urls'
 
+# Cache backends from elearning.cache_backends record hits/misses in the request metrics
+CACHES = {
+    'default': {
+        'BACKEND': 'elearning.cache_backends.LocMemCache',
+    }
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -71,6 +83,12 @@ WSGI_APPLICATION = 'elearning.wsgi.application'
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Email login first (single indexed lookup), username login as fallback
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -88,9 +106,13 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 # REST Framework settings
+# Encode/decode API JSON with orjson (elearning.fast_json); same output as DRF's JSONRenderer
+FAST_JSON_API = os.environ.get('FAST_JSON_API', 'True').lower() == 'true'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication with a short-lived cache for the user lookup
+        'accounts.authentication.CachedJWTAuthentication',
         # Removed SessionAuthentication to avoid CSRF issues
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -99,7 +121,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'elearning.fast_json.ORJSONRenderer' if FAST_JSON_API else 'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'elearning.fast_json.ORJSONParser' if FAST_JSON_API else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -110,8 +137,109 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Blacklist checks/writes go through accounts.token_blacklist
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
 }
 
+# Where blacklisted refresh token JTIs are stored. RedisTokenBlacklist keeps them with a TTL in
+# TOKEN_BLACKLIST_REDIS_URL: a Redis database not shared with the cache, on an instance that never evicts
+# keys (maxmemory-policy noeviction). Empty TOKEN_BLACKLIST_REDIS_URL stores them in the database instead
+TOKEN_BLACKLIST_BACKEND = 'accounts.token_blacklist.RedisTokenBlacklist'
+TOKEN_BLACKLIST_REDIS_URL = os.environ.get('TOKEN_BLACKLIST_REDIS_URL', '')
+TOKEN_BLACKLIST_REDIS_OPTIONS = {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5}
+
+# Seconds to cache the authenticated user resolved from a JWT (0 disables)
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+
+# Serve the read-heavy quiz endpoints with async views (enable only under ASGI/uvicorn)
+ASYNC_QUIZ_VIEWS = os.environ.get('ASYNC_QUIZ_VIEWS', 'False').lower() == 'true'
+# WhiteNoiseMiddleware is sync-only, so under ASGI it would run every request through sync_to_async.
+# With async views it is left out of MIDDLEWARE and elearning.asgi serves STATIC_URL outside Django
+if ASYNC_QUIZ_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Server-drawn quiz sessions (/api/progress/sessions/start/): seconds a started session accepts a submit,
+# and the maximum number of questions drawn per session
+QUIZ_SESSION_TTL_SECONDS = int(os.environ.get('QUIZ_SESSION_TTL_SECONDS', 2 * 60 * 60))
+QUIZ_SESSION_MAX_QUESTIONS = int(os.environ.get('QUIZ_SESSION_MAX_QUESTIONS', 50))
+
+# Offline question packs (questions.question_packs): storage class path (empty: local files under
+# QUESTION_PACK_ROOT served by questions.views.QuestionPackFileView) and whether bank changes queue pack rebuilds.
+# An empty QUESTION_PACK_ROOT means MEDIA_ROOT/question_packs (generated files stay out of the source tree)
+QUESTION_PACK_STORAGE = os.environ.get('QUESTION_PACK_STORAGE', '')
+QUESTION_PACK_ROOT = os.environ.get('QUESTION_PACK_ROOT', '')
+QUESTION_PACKS_AUTO_BUILD = os.environ.get('QUESTION_PACKS_AUTO_BUILD', 'True').lower() == 'true'
+# Brotli quality for automatic rebuilds (`build_question_packs --pending`, packs missing on a local disk);
+# full builds use 11. Run `build_question_packs --pending` every minute from cron
+QUESTION_PACK_AUTO_BROTLI_QUALITY = int(os.environ.get('QUESTION_PACK_AUTO_BROTLI_QUALITY', 5))
+# Packs in S3 (questions.pack_storage) are private: the pack list returns presigned URLs valid for
+# QUESTION_PACK_URL_EXPIRE seconds. QUESTION_PACK_CDN_DOMAIN serves them from CloudFront with signed URLs
+# (requires AWS_CLOUDFRONT_KEY and AWS_CLOUDFRONT_KEY_ID)
+QUESTION_PACK_URL_EXPIRE = int(os.environ.get('QUESTION_PACK_URL_EXPIRE', 600))
+QUESTION_PACK_CDN_DOMAIN = os.environ.get('QUESTION_PACK_CDN_DOMAIN', '')
+
+# Where archive_attempts stores the Parquet files of archived months. The month is deleted from the database
+# once its file is confirmed there, so use storage that outlives the container: ATTEMPT_ARCHIVE_STORAGE
+# (storage class path, e.g. S3) or ATTEMPT_ARCHIVE_ROOT (absolute path on a persistent volume). No default
+ATTEMPT_ARCHIVE_STORAGE = os.environ.get('ATTEMPT_ARCHIVE_STORAGE', '')
+ATTEMPT_ARCHIVE_ROOT = os.environ.get('ATTEMPT_ARCHIVE_ROOT', '')
+
+# Analytics exports stop ANALYTICS_EXPORT_SAFETY_LAG_SECONDS before now: watermark timestamps are taken
+# when a row is written, so a transaction still open at export time could commit rows older than `until`
+# after the export and the next --since would skip them. Keep it above the longest write transaction
+ANALYTICS_EXPORT_SAFETY_LAG_SECONDS = int(os.environ.get('ANALYTICS_EXPORT_SAFETY_LAG_SECONDS', 300))
+
+# Media files (the environment settings may override these)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Leaderboards (progress.leaderboards) in Redis sorted sets: empty LEADERBOARD_REDIS_URL disables them.
+# Use a Redis database not shared with the cache (clearing the cache must not drop the boards).
+# Accuracy boards list users with at least LEADERBOARD_MIN_ANSWERS answers; weekly/monthly boards are
+# kept LEADERBOARD_WEEKS_KEPT weeks / LEADERBOARD_MONTHS_KEPT months after they end
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL', '')
+LEADERBOARD_REDIS_OPTIONS = {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5}
+LEADERBOARD_MIN_ANSWERS = int(os.environ.get('LEADERBOARD_MIN_ANSWERS', 20))
+LEADERBOARD_WEEKS_KEPT = int(os.environ.get('LEADERBOARD_WEEKS_KEPT', 8))
+LEADERBOARD_MONTHS_KEPT = int(os.environ.get('LEADERBOARD_MONTHS_KEPT', 12))
+LEADERBOARD_MAX_LIMIT = 100
+
+# Response compression (elearning.compression): bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as is;
+# compressed bodies of at least COMPRESSION_CACHE_MIN_SIZE bytes are cached by ETag for COMPRESSION_CACHE_TIMEOUT seconds
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CACHE_MIN_SIZE = int(os.environ.get('COMPRESSION_CACHE_MIN_SIZE', 16 * 1024))
+COMPRESSION_CACHE_TIMEOUT = int(os.environ.get('COMPRESSION_CACHE_TIMEOUT', 10 * 60))
+COMPRESSION_CACHE_ALIAS = 'default'
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+
+# Request metrics: seconds between flushes of per-worker totals to the cache,
+# and the bearer token required by /api/health/metrics/ (optional unless METRICS_REQUIRE_AUTH_TOKEN)
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 15))
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+METRICS_REQUIRE_AUTH_TOKEN = False
+
+# Readiness checks run in a background thread per worker (/api/health/ready/):
+# seconds between checks, between migration checks, and latency thresholds for "degraded"
+READINESS_CHECK_INTERVAL = int(os.environ.get('READINESS_CHECK_INTERVAL', 10))
+READINESS_MIGRATION_CHECK_INTERVAL = int(os.environ.get('READINESS_MIGRATION_CHECK_INTERVAL', 300))
+READINESS_DB_LATENCY_WARNING_MS = float(os.environ.get('READINESS_DB_LATENCY_WARNING_MS', 50))
+READINESS_CACHE_LATENCY_WARNING_MS = float(os.environ.get('READINESS_CACHE_LATENCY_WARNING_MS', 20))
+
+# Read replica: views using elearning.db.routers.ReplicaReadMixin read from DATABASES['replica'] when configured.
+# Reads fall back to the primary when the replica lags more than REPLICA_MAX_LAG_SECONDS (checked every
+# REPLICA_LAG_CHECK_INTERVAL seconds per worker) and for REPLICA_PIN_SECONDS after the user's own quiz submit
+# (keep it >= REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_INTERVAL)
+DATABASE_ROUTERS = ['elearning.db.routers.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 15))
+
+# Processes used to hash passwords in the provision_users command (default: CPU count).
+# The bulk-provision API hashes in the request worker and accepts at most USER_PROVISIONING_MAX_ROWS rows
+USER_PROVISIONING_HASH_WORKERS = int(os.environ.get('USER_PROVISIONING_HASH_WORKERS', 0)) or None
+USER_PROVISIONING_MAX_ROWS = int(os.environ.get('USER_PROVISIONING_MAX_ROWS', 100))
+
 # Internationalization
 LANGUAGE_CODE = 'ja-jp'
 TIME_ZONE = 'Asia/Tokyo'
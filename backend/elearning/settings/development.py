@@ -22,6 +22,17 @@ DATABASES = {
     }
 }
 
+# Optional read replica (e.g. a second local database) for the replica router
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # Tests use the default test database for replica reads
+        'TEST': {'MIRROR': 'default'},
+    }
+
 # CORS settings for development
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -30,14 +30,40 @@ else:
 DATABASES = {
     'default': dj_database_url.config(
         default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600
+        # Set DB_CONN_MAX_AGE=0 under ASGI: async requests run ORM calls in per-request threads
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 600))
     )
 }
 
+# Read replica for dashboards and admin reports (see REPLICA_* in base.py)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(
+        os.environ['DATABASE_REPLICA_URL'],
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    )
+
+# Connection pool for gevent workers: caps connections per worker process and database at DB_POOL_MAX_SIZE
+# (set DB_POOL_MAX_SIZE=0 to use Django's per-greenlet persistent connections instead)
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+for _database in DATABASES.values():
+    if DB_POOL_MAX_SIZE > 0 and _database.get('ENGINE', '').endswith('postgresql'):
+        _database.update({
+            'ENGINE': 'elearning.db.backends.pooled_postgresql',
+            # Connections go back to the pool at the end of each request
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'MAX_SIZE': DB_POOL_MAX_SIZE,
+                'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+                'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            },
+        })
+
 # Redis Cache
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        # django_redis RedisCache with cache hit/miss metrics
+        'BACKEND': 'elearning.cache_backends.RedisCache',
         'LOCATION': os.environ.get('REDIS_URL', 'redis://redis:6379/0'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -46,6 +72,23 @@ CACHES = {
     }
 }
 
+# Leaderboards: Redis database 1 of the same server (the cache uses database 0)
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL', 'redis://redis:6379/1')
+LEADERBOARD_REDIS_OPTIONS = {
+    **LEADERBOARD_REDIS_OPTIONS,
+    'password': os.environ.get('REDIS_PASSWORD'),
+}
+
+# /api/health/metrics/ is refused unless METRICS_AUTH_TOKEN is set
+METRICS_REQUIRE_AUTH_TOKEN = True
+
+# Token blacklist: Redis database 2 of the same server (must not be evicted, see base.py)
+TOKEN_BLACKLIST_REDIS_URL = os.environ.get('TOKEN_BLACKLIST_REDIS_URL', 'redis://redis:6379/2')
+TOKEN_BLACKLIST_REDIS_OPTIONS = {
+    **TOKEN_BLACKLIST_REDIS_OPTIONS,
+    'password': os.environ.get('REDIS_PASSWORD'),
+}
+
 # Session configuration - Using database instead of Redis temporarily
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 # SESSION_CACHE_ALIAS = 'default'
@@ -94,6 +137,10 @@ if AWS_STORAGE_BUCKET_NAME:
     AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
     STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/static/'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
+    # Offline question packs are shared by all containers and served from the private bucket by presigned URLs
+    QUESTION_PACK_STORAGE = os.environ.get('QUESTION_PACK_STORAGE', 'questions.pack_storage.QuestionPackS3Storage')
+    # Archived attempt months (archive_attempts) are kept under archive/attempts/ in the private, versioned bucket
+    ATTEMPT_ARCHIVE_STORAGE = os.environ.get('ATTEMPT_ARCHIVE_STORAGE', 'progress.archive_storage.AttemptArchiveS3Storage')
 
 # Logging
 LOGGING = {
@@ -134,7 +181,7 @@ SECURE_HSTS_PRELOAD = True
 X_FRAME_OPTIONS = 'DENY'
 
 # Performance settings
-CONN_MAX_AGE = 600
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600))
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from .health_check import health_check, health_check_detailed
+from .health_check import health_check, health_check_detailed, health_metrics, health_ready
 
 urlpatterns = [
     # Django admin disabled for API-only application
@@ -13,6 +13,8 @@ urlpatterns = [
     # Health check endpoints
     path('api/health/', health_check, name='health_check'),
     path('api/health/detailed/', health_check_detailed, name='health_check_detailed'),
+    path('api/health/metrics/', health_metrics, name='health_metrics'),
+    path('api/health/ready/', health_ready, name='health_ready'),
 ]
 
 if settings.DEBUG:
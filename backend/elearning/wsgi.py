@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elearning.settings')
 
 application = get_wsgi_application()
+
+# 依存サービスのチェックをバックグラウンドで開始する（/api/health/ready/）
+from elearning.readiness import start_readiness_monitor  # noqa: E402
+
+start_readiness_monitor()
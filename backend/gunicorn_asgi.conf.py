@@ -0,0 +1,20 @@
+"""
+gunicorn + uvicorn ワーカーで ASGI（elearning.asgi）を動かす設定
+
+    ASYNC_QUIZ_VIEWS=true DB_CONN_MAX_AGE=0 \
+        gunicorn -c gunicorn_asgi.conf.py elearning.asgi:application
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# 1ワーカーあたりの同時接続はイベントループで処理する（gevent の worker_connections 相当の上限はない）
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+
+accesslog = '-'
+errorlog = '-'
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 class ProgressConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'progress'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .partitions import ensure_partitions_after_migrate
+
+        # 先の月の回答履歴パーティションを用意する（PostgreSQL のみ）
+        post_migrate.connect(ensure_partitions_after_migrate, sender=self)
@@ -0,0 +1,14 @@
+"""
+回答履歴のアーカイブ（Parquet）の S3 ストレージ（ATTEMPT_ARCHIVE_STORAGE）
+
+archive/attempts/ 以下に保存する。アーカイブした月はDBから削除するため、
+コンテナの外（バケットは公開せず、バージョニングを有効にする）に置く。
+"""
+
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class AttemptArchiveS3Storage(S3Boto3Storage):
+    location = 'archive/attempts'
+    querystring_auth = True
+    custom_domain = None  # AWS_S3_CUSTOM_DOMAIN（公開のURL）は使わない
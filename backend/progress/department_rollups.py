@@ -0,0 +1,220 @@
+"""
+成績管理者向けの部署別集計キューブ（DepartmentRollup）
+
+回答履歴を 部署 × ジャンル × 難易度 × 日（TIME_ZONE の日付）で集計して保存し、
+成績管理者のAPI（DepartmentStatsView・DepartmentSummaryView）は回答履歴を読まずにこの表を集計する。
+- refresh_rollups() は前回集計した最後の日の REFRESH_OVERLAP_DAYS 日前から今日までを日ごとに置き換える
+  （前回の集計の後にコミットされた回答も次の更新で反映される）。refresh_department_rollups コマンドで定期実行する
+- rebuild_rollups() は全期間を集計し直す（ユーザーの部署・問題の難易度を変更したときなど）。
+  アーカイブ済みの月（AttemptRollup）は日ごとの内訳がないため、月の初日にまとめる
+- アーカイブ済みの月の行は refresh_rollups() では変更しない
+
+回答数・正解数・回答時間の合計は足し合わせられる値のみを保存する（期間をまたぐ受講者数などは求められない）。
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+
+from .models import AttemptArchive, AttemptRollup, DepartmentRollup, UserAttempt
+from .partitions import add_months
+
+# 前回集計した最後の日から何日さかのぼって集計し直すか（日付をまたいでコミットされた回答のため）
+REFRESH_OVERLAP_DAYS = 1
+BATCH_SIZE = 5000
+
+DIMENSIONS = ('genre', 'difficulty', 'period')
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _attempt_totals(attempts):
+    """回答履歴の 部署 × ジャンル × 難易度 × 日 の集計"""
+    return (
+        attempts.annotate(day=TruncDate('attempt_time'))
+        .values('user__department', 'question__genre_id', 'question__difficulty', 'day')
+        .annotate(
+            attempts=Count('id'),
+            correct_attempts=Count('id', filter=Q(is_correct=True)),
+            response_time_total=Coalesce(Sum('response_time_seconds'), 0),
+            response_time_count=Count('response_time_seconds'),
+        )
+        .order_by()
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def _archived_totals():
+    """アーカイブ済みの月の集計（日付は月の初日）"""
+    return (
+        AttemptRollup.objects.annotate(day=F('month'))
+        .values('user__department', 'question__genre_id', 'question__difficulty', 'day')
+        .annotate(
+            attempts=Sum('attempts'),
+            correct_attempts=Sum('correct_attempts'),
+            response_time_total=Sum('response_time_total'),
+            response_time_count=Sum('response_time_count'),
+        )
+        .order_by()
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def _merge(rows_iterables):
+    """集計結果を (部署, ジャンル, 難易度, 日) ごとに足し合わせた DepartmentRollup のリスト"""
+    merged = {}
+    for rows in rows_iterables:
+        for row in rows:
+            key = (row['user__department'], row['question__genre_id'], row['question__difficulty'], row['day'])
+            rollup = merged.get(key)
+            if rollup is None:
+                merged[key] = DepartmentRollup(
+                    department=key[0], genre_id=key[1], difficulty=key[2], day=key[3],
+                    attempts=row['attempts'], correct_attempts=row['correct_attempts'],
+                    response_time_total=row['response_time_total'], response_time_count=row['response_time_count'],
+                )
+            else:
+                rollup.attempts += row['attempts']
+                rollup.correct_attempts += row['correct_attempts']
+                rollup.response_time_total += row['response_time_total']
+                rollup.response_time_count += row['response_time_count']
+    return list(merged.values())
+
+
+def first_live_day():
+    """回答履歴が残っている最初の日（アーカイブ済みの月の翌月の初日。アーカイブがなければ None）"""
+    last_archived = AttemptArchive.objects.aggregate(month=Max('month'))['month']
+    return add_months(last_archived, 1) if last_archived is not None else None
+
+
+def refresh_rollups(days=None):
+    """
+    最近の日の集計を置き換え、(集計し直した最初の日, 作成した行数) を返す
+    days を指定した場合は今日を含む days 日分。集計がまだない場合は rebuild_rollups() と同じ
+    """
+    today = timezone.localdate()
+    if days is not None:
+        start = today - timedelta(days=days - 1)
+    else:
+        last_day = DepartmentRollup.objects.aggregate(day=Max('day'))['day']
+        if last_day is None:
+            return None, rebuild_rollups()
+        start = min(last_day, today) - timedelta(days=REFRESH_OVERLAP_DAYS)
+
+    live_start = first_live_day()
+    if live_start is not None and start < live_start:
+        start = live_start
+
+    rollups = _merge([_attempt_totals(UserAttempt.objects.filter(attempt_time__gte=_day_start(start)))])
+    with transaction.atomic():
+        DepartmentRollup.objects.filter(day__gte=start).delete()
+        DepartmentRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+    return start, len(rollups)
+
+
+def rebuild_rollups():
+    """全期間を集計し直し、作成した行数を返す"""
+    rollups = _merge([_attempt_totals(UserAttempt.objects.all()), _archived_totals()])
+    with transaction.atomic():
+        DepartmentRollup.objects.all().delete()
+        DepartmentRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+    return len(rollups)
+
+
+SUM_FIELDS = ('attempts', 'correct_attempts', 'response_time_total', 'response_time_count')
+
+
+def _measures(row):
+    attempts = row['attempts'] or 0
+    correct = row['correct_attempts'] or 0
+    timed = row['response_time_count'] or 0
+    return {
+        'attempts': attempts,
+        'correct_attempts': correct,
+        'accuracy_rate': round(correct / attempts * 100, 1) if attempts else 0,
+        'avg_response_time': round(row['response_time_total'] / timed, 1) if timed else None,
+    }
+
+
+def _add(totals, row):
+    for name in SUM_FIELDS:
+        totals[name] = totals.get(name, 0) + (row[name] or 0)
+    return totals
+
+
+def department_rollups(department, date_from, date_to, genre=None, difficulty=None):
+    """部署・期間（両端を含む）・ジャンル・難易度で絞り込んだ DepartmentRollup"""
+    queryset = DepartmentRollup.objects.filter(department=department, day__gte=date_from, day__lte=date_to)
+    if genre:
+        queryset = queryset.filter(genre_id=genre)
+    if difficulty is not None:
+        queryset = queryset.filter(difficulty=difficulty)
+    return queryset
+
+
+def drill_down(queryset, group_by, granularity='day'):
+    """
+    group_by（genre / difficulty / period の1つ以上）ごとの集計と合計を1回のクエリで返す
+    period は granularity（day / week / month）の期間の初日
+    戻り値: (行のリスト, 合計)
+    """
+    fields = []
+    if 'genre' in group_by:
+        fields += ['genre_id', 'genre__name']
+    if 'difficulty' in group_by:
+        fields.append('difficulty')
+    if 'period' in group_by:
+        queryset = queryset.annotate(period=Trunc('day', granularity, output_field=DateField()))
+        fields.append('period')
+
+    rows = queryset.values(*fields).annotate(**{name: Sum(name) for name in SUM_FIELDS}).order_by(*fields)
+
+    results = []
+    totals = dict.fromkeys(SUM_FIELDS, 0)
+    for row in rows:
+        _add(totals, row)
+        result = {}
+        if 'genre' in group_by:
+            result['genre_id'] = row['genre_id']
+            result['genre_name'] = row['genre__name']
+        if 'difficulty' in group_by:
+            result['difficulty'] = row['difficulty']
+        if 'period' in group_by:
+            result['period'] = row['period']
+        results.append({**result, **_measures(row)})
+    return results, _measures(totals)
+
+
+def summarize(queryset):
+    """期間の合計・ジャンル別・難易度別を1回のクエリ（ジャンル × 難易度の集計）から求める"""
+    by_genre = {}
+    by_difficulty = {}
+    totals = dict.fromkeys(SUM_FIELDS, 0)
+    rows = queryset.values('genre_id', 'genre__name', 'difficulty').annotate(
+        **{name: Sum(name) for name in SUM_FIELDS}
+    ).order_by('genre_id', 'difficulty')
+    for row in rows:
+        _add(totals, row)
+        genre = by_genre.setdefault(row['genre_id'], {'genre_id': row['genre_id'], 'genre_name': row['genre__name']})
+        _add(genre, row)
+        _add(by_difficulty.setdefault(row['difficulty'], {'difficulty': row['difficulty']}), row)
+
+    def format_rows(groups, keys):
+        return [
+            {**{key: group[key] for key in keys}, **_measures(group)}
+            for group in groups
+        ]
+
+    return {
+        'total': _measures(totals),
+        'by_genre': format_rows(by_genre.values(), ['genre_id', 'genre_name']),
+        'by_difficulty': format_rows(
+            (by_difficulty[difficulty] for difficulty in sorted(by_difficulty)), ['difficulty']
+        ),
+    }
@@ -0,0 +1,415 @@
+"""
+Redis のソート済みセットによるランキング
+
+クイズの結果を送信するたびに（コミット後に）ランキングへ加算し、上位の取得（ZREVRANGE）と
+ユーザーの順位（ZREVRANK、O(log n)）は Redis だけで返す。APIのリクエストごとのDBの集計はしない。
+- 対象（scope）: 全体（global）・ジャンル別（genre:<ID>）・部署別（department:<部署名>）
+- 期間（period）: 累計（all）・週（week:2026-W42、ISO週）・月（month:2026-10）。日付は TIME_ZONE の日付
+  週・月のランキングは LEADERBOARD_WEEKS_KEPT 週・LEADERBOARD_MONTHS_KEPT か月が過ぎると Redis の有効期限で消える
+- 指標（metric）:
+  - answered: 回答数（セッションの問題数の合計）
+  - correct: 正解数
+  - accuracy: 正答率（回答数が LEADERBOARD_MIN_ANSWERS 以上のユーザーのみ。同率は回答数の多い順）
+  - streak: 連続学習日数（期間中に到達した最大値。ジャンル別はなし）
+- 1回の送信の更新は Lua スクリプトで原子的に行う（同じユーザーの同時送信でも正答率がずれない）。
+  キーが複数のスロットにまたがるため Redis Cluster には対応しない
+
+LEADERBOARD_REDIS_URL が未設定の場合は無効（更新せず、APIは 503）。
+キャッシュの Redis とは別のDB（または別のインスタンス）を指定する（キャッシュのクリアで消えないように）。
+ランキングは完了したクイズセッションから rebuild_leaderboards コマンドで作り直せる
+（Redis のデータが消えたとき・部署を変更したときなど）。部署は作り直す時点のユーザーの部署で集計する。
+"""
+
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .partitions import add_months
+
+try:
+    import redis
+except ImportError:  # redis がない環境ではランキングは無効
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'lb'
+METRICS = ('accuracy', 'answered', 'correct', 'streak')
+WINDOWS = ('all', 'week', 'month')
+WEEK_PERIOD_RE = re.compile(r'^\d{4}-W\d{2}$')
+MONTH_PERIOD_RE = re.compile(r'^\d{4}-\d{2}$')
+
+# 正答率のスコア: 正答率（0.01% 単位）* ACCURACY_ANSWERED_LIMIT + 回答数（同率は回答数の多い順）
+ACCURACY_SCALE = 10000
+ACCURACY_ANSWERED_LIMIT = 10 ** 7
+
+REBUILD_CHUNK_SIZE = 1000
+
+# KEYS: ボードごとに answered, correct, accuracy の3つ、続けて連続学習日数の状態（ハッシュ）と streak のボード
+# ARGV: ユーザーID, 回答数, 正解数, 正答率の最小回答数, 日付の通し番号, ボード数, 状態の有効期限,
+#       ボードごとの有効期限, streak のボードごとの有効期限（有効期限の 0 は期限なし）
+UPDATE_SCRIPT = """
+local member = ARGV[1]
+local answered_delta = tonumber(ARGV[2])
+local correct_delta = tonumber(ARGV[3])
+local min_answers = tonumber(ARGV[4])
+local today = tonumber(ARGV[5])
+local boards = tonumber(ARGV[6])
+local state = KEYS[boards * 3 + 1]
+local streak_boards = #KEYS - boards * 3 - 1
+
+local function expire(key, at)
+  if at > 0 then
+    redis.call('EXPIREAT', key, at)
+  end
+end
+
+for i = 0, boards - 1 do
+  local answered = tonumber(redis.call('ZINCRBY', KEYS[i * 3 + 1], answered_delta, member))
+  local correct = tonumber(redis.call('ZINCRBY', KEYS[i * 3 + 2], correct_delta, member))
+  if answered > 0 and answered >= min_answers then
+    local rate = math.floor(correct * %(scale)d / answered)
+    redis.call('ZADD', KEYS[i * 3 + 3], rate * %(limit)d + math.min(answered, %(limit)d - 1), member)
+  end
+  for k = 1, 3 do
+    expire(KEYS[i * 3 + k], tonumber(ARGV[8 + i]))
+  end
+end
+
+local last = tonumber(redis.call('HGET', state, 'day')) or 0
+local length = tonumber(redis.call('HGET', state, 'length')) or 0
+if today < last then
+  -- 日付が前後した送信は連続学習日数に数えない
+  return length
+end
+if today > last then
+  if today == last + 1 then
+    length = length + 1
+  else
+    length = 1
+  end
+  redis.call('HSET', state, 'day', today, 'length', length)
+  expire(state, tonumber(ARGV[7]))
+end
+for j = 1, streak_boards do
+  local key = KEYS[boards * 3 + 1 + j]
+  redis.call('ZADD', key, 'GT', length, member)
+  expire(key, tonumber(ARGV[7 + boards + j]))
+end
+return length
+""" % {'scale': ACCURACY_SCALE, 'limit': ACCURACY_ANSWERED_LIMIT}
+
+
+class LeaderboardUnavailable(Exception):
+    """ランキングが無効（LEADERBOARD_REDIS_URL が未設定・redis がない）"""
+
+
+@lru_cache(maxsize=None)
+def _client(url):
+    return redis.Redis.from_url(url, **settings.LEADERBOARD_REDIS_OPTIONS)
+
+
+def is_enabled():
+    return bool(settings.LEADERBOARD_REDIS_URL) and redis is not None
+
+
+def get_client():
+    if not is_enabled():
+        raise LeaderboardUnavailable('Leaderboards are disabled (LEADERBOARD_REDIS_URL is not set)')
+    return _client(settings.LEADERBOARD_REDIS_URL)
+
+
+@lru_cache(maxsize=None)
+def _update_script(client):
+    return client.register_script(UPDATE_SCRIPT)
+
+
+def global_scope():
+    return 'global'
+
+
+def genre_scope(genre_id):
+    return f'genre:{genre_id}'
+
+
+def department_scope(department):
+    return f'department:{department}'
+
+
+def board_key(metric, scope, period='all'):
+    return f'{KEY_PREFIX}:{metric}:{scope}:{period}'
+
+
+def streak_state_key(user_id):
+    return f'{KEY_PREFIX}:streak-state:{user_id}'
+
+
+def session_scopes(genre_id, department):
+    """セッションの結果を加算する対象（ジャンルなしのセッションはジャンル別に含めない）"""
+    scopes = [global_scope()]
+    if genre_id:
+        scopes.append(genre_scope(genre_id))
+    if department:
+        scopes.append(department_scope(department))
+    return scopes
+
+
+def streak_scopes(department):
+    scopes = [global_scope()]
+    if department:
+        scopes.append(department_scope(department))
+    return scopes
+
+
+def _timestamp(day):
+    """日付の開始時刻（TIME_ZONE）の UNIX 時刻"""
+    return int(timezone.make_aware(datetime.combine(day, time.min)).timestamp())
+
+
+def week_period(day):
+    year, week, _ = day.isocalendar()
+    return f'week:{year}-W{week:02d}'
+
+
+def month_period(day):
+    return f'month:{day:%Y-%m}'
+
+
+def day_periods(day):
+    """日付が属する期間と、そのランキングの有効期限（UNIX 時刻。累計は 0）のリスト"""
+    week_start = day - timedelta(days=day.weekday())
+    week_expires = week_start + timedelta(weeks=1 + settings.LEADERBOARD_WEEKS_KEPT)
+    month_expires = add_months(day.replace(day=1), 1 + settings.LEADERBOARD_MONTHS_KEPT)
+    return [
+        ('all', 0),
+        (week_period(day), _timestamp(week_expires)),
+        (month_period(day), _timestamp(month_expires)),
+    ]
+
+
+def resolve_period(window, period=None, day=None):
+    """
+    window（all / week / month）と period（2026-W42 / 2026-10。省略時は今週・今月）から期間の名前を返す
+    period の形式が正しくなければ ValueError
+    """
+    if window == 'all':
+        return 'all'
+    if period:
+        pattern = WEEK_PERIOD_RE if window == 'week' else MONTH_PERIOD_RE
+        if not pattern.match(period):
+            raise ValueError(f'Invalid {window} period: {period}')
+        return f'{window}:{period}'
+    day = day or timezone.localdate()
+    return week_period(day) if window == 'week' else month_period(day)
+
+
+def accuracy_score(correct, answered):
+    return (correct * ACCURACY_SCALE // answered) * ACCURACY_ANSWERED_LIMIT + min(answered, ACCURACY_ANSWERED_LIMIT - 1)
+
+
+def decode_score(metric, score):
+    """スコアを API の値に変換する {'value': ..., 'answered': ...}（answered は正答率のみ）"""
+    score = int(score)
+    if metric == 'accuracy':
+        rate, answered = divmod(score, ACCURACY_ANSWERED_LIMIT)
+        return {'value': round(rate * 100 / ACCURACY_SCALE, 2), 'answered': answered}
+    return {'value': score}
+
+
+def record_session(user_id, department, genre_id, answered, correct, finished_at):
+    """完了したセッションの結果をランキングに加算する（Redis への1回の往復）"""
+    if answered <= 0:
+        return
+    client = get_client()
+    day = timezone.localdate(finished_at)
+    periods = day_periods(day)
+
+    keys = []
+    expires = []
+    for scope in session_scopes(genre_id, department):
+        for period, expires_at in periods:
+            keys += [board_key(metric, scope, period) for metric in ('answered', 'correct', 'accuracy')]
+            expires.append(expires_at)
+    board_count = len(expires)
+
+    keys.append(streak_state_key(user_id))
+    for scope in streak_scopes(department):
+        for period, expires_at in periods:
+            keys.append(board_key('streak', scope, period))
+            expires.append(expires_at)
+
+    # 連続学習日数の状態は翌日の終わりまで（それを過ぎると連続が途切れる）
+    state_expires = _timestamp(day + timedelta(days=2))
+    _update_script(client)(keys=keys, args=[
+        user_id, answered, correct, settings.LEADERBOARD_MIN_ANSWERS, day.toordinal(),
+        board_count, state_expires, *expires,
+    ])
+
+
+def _record_after_commit(user_id, department, genre_id, answered, correct, finished_at):
+    """ランキングの更新に失敗しても送信は失敗させない（rebuild_leaderboards で作り直せる）"""
+    try:
+        record_session(user_id, department, genre_id, answered, correct, finished_at)
+    except Exception:
+        logger.exception('Failed to update leaderboards for user %s', user_id)
+
+
+def schedule_session_update(user, session):
+    """完了したセッションの結果を、コミット後にランキングへ加算する"""
+    if not is_enabled():
+        return
+    args = (user.id, user.department, session.genre_id, session.total_questions,
+            session.correct_answers, session.end_time)
+    transaction.on_commit(lambda: _record_after_commit(*args))
+
+
+def read_board(metric, scope, period, limit, user_id):
+    """
+    上位 limit 件 [(ユーザーID, スコア)] と、ユーザーの (順位（1始まり。いなければ None）, スコア) を
+    Redis への1回の往復で返す。Redis に接続できなければ LeaderboardUnavailable
+    """
+    key = board_key(metric, scope, period)
+    pipe = get_client().pipeline(transaction=False)
+    pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    pipe.zrevrank(key, user_id)
+    pipe.zscore(key, user_id)
+    try:
+        members, rank, score = pipe.execute()
+    except redis.RedisError as e:
+        raise LeaderboardUnavailable(str(e)) from e
+    top = [(int(member), member_score) for member, member_score in members]
+    return top, (rank + 1 if rank is not None else None, score)
+
+
+def _session_totals():
+    """完了したセッションのユーザー・ジャンル・日付ごとの合計（TIME_ZONE の日付）"""
+    from .models import QuizSession
+
+    return (
+        QuizSession.objects.filter(is_completed=True, end_time__isnull=False)
+        .annotate(day=TruncDate('end_time'))
+        .values('user_id', 'user__department', 'genre_id', 'day')
+        .annotate(answered=Sum('total_questions'), correct=Sum('correct_answers'))
+        .order_by()
+        .iterator(chunk_size=5000)
+    )
+
+
+def compute_boards(now=None):
+    """
+    DBの完了したセッションからランキングを集計する
+    戻り値: ({キー: {ユーザーID: スコア}}, {ユーザーID: (最後の学習日, 連続学習日数)}, {キー: 有効期限})
+    有効期限の過ぎた週・月のランキングは含めない
+    """
+    now = now or timezone.now()
+    now_timestamp = now.timestamp()
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    expires = {}
+    study_days = defaultdict(set)
+    departments = {}
+
+    periods_by_day = {}
+    for row in _session_totals():
+        user_id, day = row['user_id'], row['day']
+        departments[user_id] = row['user__department']
+        study_days[user_id].add(day)
+        if not row['answered']:
+            continue
+        if day not in periods_by_day:
+            periods_by_day[day] = [(period, at) for period, at in day_periods(day) if not at or at > now_timestamp]
+        for scope in session_scopes(row['genre_id'], row['user__department']):
+            for period, expires_at in periods_by_day[day]:
+                counts = totals[(scope, period)][user_id]
+                counts[0] += row['answered']
+                counts[1] += row['correct'] or 0
+                expires[(scope, period)] = expires_at
+
+    boards = {}
+    key_expires = {}
+    for (scope, period), users in totals.items():
+        answered_key, correct_key, accuracy_key = (
+            board_key(metric, scope, period) for metric in ('answered', 'correct', 'accuracy')
+        )
+        boards[answered_key] = {user_id: answered for user_id, (answered, _) in users.items()}
+        boards[correct_key] = {user_id: correct for user_id, (_, correct) in users.items()}
+        accuracy = {
+            user_id: accuracy_score(correct, answered)
+            for user_id, (answered, correct) in users.items()
+            if answered >= max(settings.LEADERBOARD_MIN_ANSWERS, 1)
+        }
+        keys = [answered_key, correct_key]
+        if accuracy:
+            boards[accuracy_key] = accuracy
+            keys.append(accuracy_key)
+        for key in keys:
+            key_expires[key] = expires[(scope, period)]
+
+    states = {}
+    today = timezone.localdate(now)
+    for user_id, days in study_days.items():
+        previous, length = None, 0
+        for day in sorted(days):
+            length = length + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+            previous = day
+            if day not in periods_by_day:
+                periods_by_day[day] = [(period, at) for period, at in day_periods(day) if not at or at > now_timestamp]
+            for scope in streak_scopes(departments[user_id]):
+                for period, expires_at in periods_by_day[day]:
+                    key = board_key('streak', scope, period)
+                    board = boards.setdefault(key, {})
+                    board[user_id] = max(board.get(user_id, 0), length)
+                    key_expires[key] = expires_at
+        # 昨日か今日に学習していれば連続が続いている
+        if previous >= today - timedelta(days=1):
+            states[user_id] = (previous, length)
+
+    return boards, states, key_expires
+
+
+def rebuild(now=None):
+    """
+    DBの完了したセッションからランキングを作り直し、(ボード数, メンバー数) を返す
+    一時キーに書き込んでから RENAME で置き換える（作り直し中もランキングを読める）。
+    集計の後、置き換えるまでの間に送信された結果は失われるため、送信の少ない時間帯に実行する
+    """
+    client = get_client()
+    boards, states, key_expires = compute_boards(now)
+    stale = set(key.decode() for key in client.scan_iter(match=f'{KEY_PREFIX}:*', count=1000))
+
+    members = 0
+    pipe = client.pipeline(transaction=False)
+    for key, scores in boards.items():
+        temporary_key = f'{key}:rebuild'
+        pipe.delete(temporary_key)
+        items = list(scores.items())
+        members += len(items)
+        for start in range(0, len(items), REBUILD_CHUNK_SIZE):
+            pipe.zadd(temporary_key, dict(items[start:start + REBUILD_CHUNK_SIZE]))
+            if len(pipe) >= REBUILD_CHUNK_SIZE:
+                pipe.execute()
+    pipe.execute()
+
+    pipe = client.pipeline(transaction=True)
+    for key in boards:
+        pipe.rename(f'{key}:rebuild', key)
+        if key_expires[key]:
+            pipe.expireat(key, key_expires[key])
+        stale.discard(key)
+    for user_id, (day, length) in states.items():
+        key = streak_state_key(user_id)
+        pipe.delete(key)
+        pipe.hset(key, mapping={'day': day.toordinal(), 'length': length})
+        pipe.expireat(key, _timestamp(day + timedelta(days=2)))
+        stale.discard(key)
+    if stale:
+        pipe.delete(*stale)
+    pipe.execute()
+    return len(boards), members
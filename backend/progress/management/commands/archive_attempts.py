@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from progress.partitions import (
+    PartitionError, add_months, archive_month, get_archive_storage, is_partitioned, month_start, months_with_attempts
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move UserAttempt rows older than N months to compressed Parquet files '
+        'and replace them with per user/question/month rollups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=12,
+            help='Archive months that ended more than this many months ago (the current month counts as 0)'
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            help='Absolute path of a persistent directory for attempts_YYYY_MM.parquet files '
+                 '(default: ATTEMPT_ARCHIVE_STORAGE or ATTEMPT_ARCHIVE_ROOT)'
+        )
+        parser.add_argument(
+            '--compression',
+            choices=['zstd', 'snappy', 'gzip'],
+            default='zstd',
+            help='Parquet compression codec'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the months that would be archived'
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than_months'] < 1:
+            raise CommandError('--older-than-months must be at least 1')
+        # アーカイブした月はDBから削除するため、保存先が設定されていなければ何もしない
+        try:
+            storage = get_archive_storage(options['output_dir'])
+        except PartitionError as e:
+            raise CommandError(str(e))
+
+        before = add_months(month_start(timezone.now()), -options['older_than_months'])
+        months = months_with_attempts(before)
+        self.stdout.write(
+            f'{len(months)} months before {before:%Y-%m} to archive '
+            f'({"partitions" if is_partitioned() else "range delete"})'
+        )
+
+        if options['dry_run']:
+            for month in months:
+                self.stdout.write(f'  {month:%Y-%m}')
+            return
+
+        for month in months:
+            try:
+                archive = archive_month(month, storage, compression=options['compression'])
+            except PartitionError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f'{month:%Y-%m}: {archive.row_count} rows -> {archive.path} '
+                f'({archive.size_bytes / 1024:.1f} KB), {archive.rollup_count} rollups'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {len(months)} months'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from progress.partitions import (
+    DEFAULT_MONTHS_AHEAD, default_partition_months, ensure_future_partitions, is_partitioned, list_partitions
+)
+
+
+class Command(BaseCommand):
+    help = 'Create monthly UserAttempt partitions ahead of time and move rows out of the default partition'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=DEFAULT_MONTHS_AHEAD,
+            help='Create partitions from the current month up to this many months ahead'
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write('progress_userattempt is not partitioned on this database (PostgreSQL only); nothing to do')
+            return
+
+        created = ensure_future_partitions(options['months_ahead'])
+        for month, moved in created:
+            self.stdout.write(f'Created partition for {month:%Y-%m} (moved {moved} rows from the default partition)')
+
+        partitions = list_partitions()
+        self.stdout.write(
+            f'{len(partitions)} monthly partitions: {partitions[0]:%Y-%m} .. {partitions[-1]:%Y-%m}'
+            if partitions else 'No monthly partitions'
+        )
+
+        # 既定のパーティションに残っている行（アーカイブ済みの月に遅れて届いた行など）
+        leftovers = default_partition_months()
+        for month, count in leftovers:
+            self.stdout.write(self.style.WARNING(f'{count} rows for {month:%Y-%m} are in the default partition'))
+
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partitions'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from progress.leaderboards import LeaderboardUnavailable, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the Redis leaderboards (all-time, weekly and monthly) from completed quiz sessions '
+        'in the database'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            boards, members = rebuild()
+        except LeaderboardUnavailable as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {boards} leaderboards ({members} entries) in {time.perf_counter() - started:.1f}s'
+        ))
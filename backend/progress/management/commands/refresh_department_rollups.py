@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from progress.department_rollups import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh the department x genre x difficulty x day rollups used by the manager endpoints '
+        '(recent days by default, everything with --full)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Recompute this many days up to today (default: from the day before the last rolled-up day)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every day, including archived months (after department or difficulty changes)'
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        started = time.perf_counter()
+        if options['full']:
+            rows = rebuild_rollups()
+            self.stdout.write(f'Rebuilt all department rollups ({rows} rows)')
+        else:
+            start, rows = refresh_rollups(options['days'])
+            if start is None:
+                self.stdout.write(f'No rollups yet: rebuilt all days ({rows} rows)')
+            else:
+                self.stdout.write(f'Refreshed department rollups from {start} ({rows} rows)')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
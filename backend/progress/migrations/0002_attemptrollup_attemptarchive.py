@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0008_statcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('progress', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('path', models.CharField(max_length=500)),
+                ('row_count', models.BigIntegerField()),
+                ('rollup_count', models.IntegerField()),
+                ('size_bytes', models.BigIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AttemptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('attempts', models.IntegerField()),
+                ('correct_attempts', models.IntegerField()),
+                ('response_time_total', models.BigIntegerField(default=0)),
+                ('response_time_count', models.IntegerField(default=0)),
+                ('first_attempt_time', models.DateTimeField()),
+                ('last_attempt_time', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='questions.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'month'], name='progress_at_user_id_da92eb_idx')],
+                'unique_together': {('month', 'user', 'question')},
+            },
+        ),
+    ]
@@ -0,0 +1,139 @@
+"""
+progress_userattempt を attempt_time の月別パーティションに変換する（PostgreSQL のみ）
+
+既存の行は新しいテーブルにコピーするため、行数に比例した時間テーブルがロックされる。
+大きなテーブルではメンテナンス時間帯に実行する。
+- 主キーはパーティションキーを含む (id, attempt_time) になる（Django からは従来どおり id で参照する）
+- id は新しいシーケンスで採番を続ける
+- インデックスと外部キーは元のテーブルと同じ定義で作り直す
+"""
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'progress_userattempt'
+LEGACY_TABLE = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_id_seq'
+
+
+def _fetchall(cursor, sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from progress.partitions import (
+        DEFAULT_MONTHS_AHEAD, DEFAULT_PARTITION, add_months, iter_months, month_start,
+        partition_bounds_sql, partition_name,
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        if cursor.fetchone():
+            return
+
+        # 元のテーブルのインデックス（主キー以外）と外部キーの定義
+        indexes = _fetchall(
+            cursor,
+            'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x '
+            'JOIN pg_class i ON i.oid = x.indexrelid '
+            'WHERE x.indrelid = %s::regclass AND NOT x.indisprimary',
+            [TABLE]
+        )
+        foreign_keys = _fetchall(
+            cursor,
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        oldest, newest = _fetchall(cursor, f'SELECT min(attempt_time), max(attempt_time) FROM {TABLE}')[0]
+
+        # id の採番を元のテーブルから外す（identity / serial のどちらでも）
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+        sequence = _fetchall(cursor, "SELECT pg_get_serial_sequence(%s, 'id')", [LEGACY_TABLE])[0][0]
+        cursor.execute(f'ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP DEFAULT')
+        if sequence:
+            cursor.execute(f'DROP SEQUENCE IF EXISTS {sequence}')
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE}) PARTITION BY RANGE (attempt_time)')
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+
+        # 既存の行がある月から、当月の先まで
+        current = month_start(timezone.now())
+        first = month_start(oldest) if oldest else current
+        last = max(month_start(newest) if newest else current, add_months(current, DEFAULT_MONTHS_AHEAD))
+        for month in iter_months(first, last):
+            cursor.execute(f'CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} {partition_bounds_sql(month)}')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}')
+        cursor.execute(f'SELECT setval(%s, GREATEST((SELECT max(id) FROM {TABLE}), 1))', [SEQUENCE])
+        cursor.execute(f'DROP TABLE {LEGACY_TABLE}')
+
+        # 行のコピー後にインデックスを作成する（パーティションにも作成される）
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, attempt_time)')
+        for name, definition in indexes:
+            # 定義は名前を変更する前に取得しているため、新しいテーブルに作成される
+            cursor.execute(definition)
+        # 受講者ごとの最近の回答を、パーティション内のインデックスで取得する
+        cursor.execute(f'CREATE INDEX {TABLE}_user_time_idx ON {TABLE} (user_id, attempt_time)')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        if not cursor.fetchone():
+            return
+
+        indexes = _fetchall(
+            cursor,
+            'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x '
+            'JOIN pg_class i ON i.oid = x.indexrelid '
+            'WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND i.relname <> %s',
+            [TABLE, f'{TABLE}_user_time_idx']
+        )
+        foreign_keys = _fetchall(
+            cursor,
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0",
+            [TABLE]
+        )
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+        cursor.execute(f'ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE})')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}')
+        cursor.execute(f'DROP TABLE {LEGACY_TABLE} CASCADE')
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id)')
+        cursor.execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST((SELECT max(id) FROM {TABLE}), 1))",
+            [TABLE]
+        )
+        for name, definition in indexes:
+            # 定義は名前を変更する前に取得しているため、新しいテーブルに作成される
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0002_attemptrollup_attemptarchive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
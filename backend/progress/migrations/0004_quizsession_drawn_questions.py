@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # 既存のセッションは最後に変更された日時（終了日時、未終了なら開始日時）にする
+    QuizSession = apps.get_model('progress', 'QuizSession')
+    QuizSession.objects.update(updated_at=Coalesce('end_time', 'start_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0003_partition_userattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsession',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='question_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0009_questionpack'),
+        ('progress', '0004_quizsession_drawn_questions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(max_length=100)),
+                ('difficulty', models.IntegerField()),
+                ('day', models.DateField()),
+                ('attempts', models.IntegerField()),
+                ('correct_attempts', models.IntegerField()),
+                ('response_time_total', models.BigIntegerField(default=0)),
+                ('response_time_count', models.IntegerField(default=0)),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questions.genre')),
+            ],
+            options={
+                'unique_together': {('department', 'day', 'genre', 'difficulty')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0005_departmentrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userattempt',
+            index=models.Index(fields=['user', 'question', 'attempt_time'], name='progress_ua_user_q_time_idx'),
+        ),
+    ]
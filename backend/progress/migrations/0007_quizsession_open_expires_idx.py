@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0006_userattempt_user_question_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['expires_at'], name='progress_qs_open_expires_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from questions.models import Question, Choice, Genre
 
@@ -14,11 +15,104 @@ class UserAttempt(models.Model):
 
     class Meta:
         ordering = ['-attempt_time']
+        indexes = [
+            # 受講者・問題ごとの最新の回答（間違った問題一覧）をインデックスで取得する
+            models.Index(fields=['user', 'question', 'attempt_time'], name='progress_ua_user_q_time_idx'),
+        ]
 
     def __str__(self):
         result = "正解" if self.is_correct else "不正解"
         return f"{self.user.username} - {self.question.id} - {result}"
 
+class AttemptRollupQuerySet(models.QuerySet):
+
+    def totals_by_user(self):
+        """受講者ごとの回答数・正解数・最終回答日時（{user_id: 集計}）"""
+        return {
+            row['user']: row
+            for row in self.values('user').annotate(
+                total=models.Sum('attempts'),
+                correct=models.Sum('correct_attempts'),
+                last_activity=models.Max('last_attempt_time'),
+            ).order_by()
+        }
+
+
+class AttemptRollup(models.Model):
+    """
+    アーカイブ済みの月の回答履歴を受講者×問題×月で集計したもの
+    （元の行は Parquet ファイルに移し、UserAttempt からは削除されている）
+    """
+    month = models.DateField()  # 月の初日
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attempt_rollups')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    attempts = models.IntegerField()
+    correct_attempts = models.IntegerField()
+    response_time_total = models.BigIntegerField(default=0)  # 回答時間の合計（秒）
+    response_time_count = models.IntegerField(default=0)  # 回答時間が記録された回答数
+    first_attempt_time = models.DateTimeField()
+    last_attempt_time = models.DateTimeField()
+
+    objects = AttemptRollupQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ['month', 'user', 'question']
+        indexes = [
+            models.Index(fields=['user', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.question_id} - {self.month:%Y-%m}"
+
+
+class AttemptArchive(models.Model):
+    """回答履歴をアーカイブした月（Parquet ファイルの場所と行数）"""
+    month = models.DateField(unique=True)
+    path = models.CharField(max_length=500)
+    row_count = models.BigIntegerField()
+    rollup_count = models.IntegerField()
+    size_bytes = models.BigIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.row_count} rows)"
+
+
+class DepartmentRollup(models.Model):
+    """
+    成績管理者向けの集計キューブ（部署 × ジャンル × 難易度 × 日）
+    回答履歴から progress.department_rollups で作成する。部署・難易度は集計した時点のユーザー・問題の値
+    アーカイブ済みの月は日ごとの内訳がないため、月の初日にまとめる
+    """
+    department = models.CharField(max_length=100)  # 部署が未設定のユーザーは ''
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='+')
+    difficulty = models.IntegerField()
+    day = models.DateField()
+    attempts = models.IntegerField()
+    correct_attempts = models.IntegerField()
+    response_time_total = models.BigIntegerField(default=0)  # 回答時間の合計（秒）
+    response_time_count = models.IntegerField(default=0)  # 回答時間が記録された回答数
+
+    class Meta:
+        # 部署と期間で絞り込むため、部署・日を先頭にする
+        unique_together = ['department', 'day', 'genre', 'difficulty']
+
+    def __str__(self):
+        return f"{self.department or '-'} - {self.genre_id} - {self.difficulty} - {self.day}"
+
+class QuizSessionQuerySet(models.QuerySet):
+
+    def abandoned(self, now=None):
+        """期限までに回答が送信されなかったサーバー出題のセッション（送信できず、一覧にも表示しない）"""
+        return self.filter(is_completed=False, expires_at__lte=now or timezone.now())
+
+    def exclude_abandoned(self, now=None):
+        return self.exclude(is_completed=False, expires_at__lte=now or timezone.now())
+
+
 class QuizSession(models.Model):
     SESSION_TYPES = [
         ('random', 'ランダム'),
@@ -36,6 +130,22 @@ class QuizSession(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
+    # サーバーで出題したセッション: 出題順の問題IDと回答の期限（送信時はこの問題で採点する）
+    question_ids = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = QuizSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 期限切れの未送信セッションの削除（purge_quiz_sessions）用
+            models.Index(fields=['expires_at'], condition=models.Q(is_completed=False), name='progress_qs_open_expires_idx'),
+        ]
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
 
     @property
     def score_percentage(self):
@@ -0,0 +1,333 @@
+"""
+回答履歴（UserAttempt）の月別パーティションとアーカイブ
+
+PostgreSQL では progress_userattempt を attempt_time の範囲で月ごとにパーティション分割する
+（マイグレーション 0003_partition_userattempt）。
+- パーティション名は progress_userattempt_pYYYY_MM（月の境界は TIME_ZONE の0時）
+- 対応する月のパーティションがない行は progress_userattempt_default に入り、
+  その月のパーティションを作成するときに移動する
+- 先の月のパーティションは migrate 後（post_migrate）と ensure_attempt_partitions コマンドで作成する
+
+archive_month() は古い月の行を Parquet ファイルに書き出し、受講者×問題×月の集計（AttemptRollup）に置き換える。
+ファイルは永続化された保存先（get_archive_storage()）に置き、保存を確認してからDBの行を削除する。
+パーティション分割していないDB（SQLite など）では、同じ処理を範囲削除で行う。
+"""
+
+import os
+import re
+import tempfile
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AttemptArchive, AttemptRollup, UserAttempt
+
+TABLE = UserAttempt._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+# 当月から何か月先までパーティションを用意しておくか
+DEFAULT_MONTHS_AHEAD = 3
+ROLLUP_BATCH_SIZE = 5000
+
+
+class PartitionError(Exception):
+    """パーティション操作・アーカイブができない場合のエラー"""
+
+
+def month_start(value):
+    """日付・日時を含む月の初日（日時は TIME_ZONE の現地時刻で判定）"""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """月の範囲 [start, end)（aware な datetime）"""
+    start = timezone.make_aware(datetime(month.year, month.month, 1))
+    end_month = add_months(month, 1)
+    return start, timezone.make_aware(datetime(end_month.year, end_month.month, 1))
+
+
+def iter_months(first, last):
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """作成済みの月別パーティション（月の初日のリスト、昇順）"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def partition_bounds_sql(month):
+    # DDL ではパラメータを使えないため、月から組み立てた日時をリテラルにする
+    start, end = month_bounds(month)
+    return f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def create_partition(month, using=DEFAULT_DB_ALIAS):
+    """
+    月のパーティションを作成する（既定のパーティションにその月の行があれば移動する）
+    移動した行数を返す
+    """
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT 1 FROM {DEFAULT_PARTITION} WHERE attempt_time >= %s AND attempt_time < %s LIMIT 1',
+            [start, end]
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} {partition_bounds_sql(month)}')
+            return 0
+
+        # 範囲内の行が既定のパーティションにあると直接は作成できないため、
+        # 単独のテーブルに行を移してからパーティションとして追加する
+        cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS ('
+            f'DELETE FROM {DEFAULT_PARTITION} WHERE attempt_time >= %s AND attempt_time < %s RETURNING *'
+            f') INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} {partition_bounds_sql(month)}')
+        return moved
+
+
+def ensure_partitions(first_month, last_month, using=DEFAULT_DB_ALIAS):
+    """
+    指定した範囲の月のパーティションを作成する（パーティション分割していないDBでは何もしない）
+    作成した月と移動した行数の (月, 行数) のリストを返す
+    """
+    if not is_partitioned(using):
+        return []
+    existing = set(list_partitions(using))
+    archived = set(AttemptArchive.objects.using(using).values_list('month', flat=True))
+    created = []
+    for month in iter_months(first_month, last_month):
+        # アーカイブ済みの月は作り直さない（遅れて届いた行は既定のパーティションに残る）
+        if month not in existing and month not in archived:
+            created.append((month, create_partition(month, using)))
+    return created
+
+
+def ensure_future_partitions(months_ahead=DEFAULT_MONTHS_AHEAD, using=DEFAULT_DB_ALIAS):
+    """当月から months_ahead か月先までのパーティションを作成する"""
+    current = month_start(timezone.now())
+    return ensure_partitions(current, add_months(current, months_ahead), using)
+
+
+def default_partition_months(using=DEFAULT_DB_ALIAS):
+    """既定のパーティションに残っている行の月と行数"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT date_trunc('month', attempt_time AT TIME ZONE %s)::date AS month, count(*) "
+            f'FROM {DEFAULT_PARTITION} GROUP BY 1 ORDER BY 1',
+            [timezone.get_current_timezone_name()]
+        )
+        return cursor.fetchall()
+
+
+def ensure_partitions_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate: デプロイのたびに先の月のパーティションを用意する"""
+    if is_partitioned(using):
+        ensure_future_partitions(using=using)
+
+
+def months_with_attempts(before, using=DEFAULT_DB_ALIAS):
+    """before より前で回答履歴が残っている月（アーカイブの対象候補）"""
+    if is_partitioned(using):
+        return [month for month in list_partitions(using) if month < before]
+
+    oldest = UserAttempt.objects.using(using).aggregate(oldest=Min('attempt_time'))['oldest']
+    if oldest is None:
+        return []
+    months = []
+    for month in iter_months(oldest, add_months(before, -1)):
+        start, end = month_bounds(month)
+        if UserAttempt.objects.using(using).filter(attempt_time__gte=start, attempt_time__lt=end).exists():
+            months.append(month)
+    return months
+
+
+def _iter_rollups(month, start, end, using):
+    """月の回答履歴を受講者×問題で集計した AttemptRollup（未保存）を返す"""
+    rows = (
+        UserAttempt.objects.using(using)
+        .filter(attempt_time__gte=start, attempt_time__lt=end)
+        .values('user_id', 'question_id')
+        .annotate(
+            attempts=Count('id'),
+            correct_attempts=Count('id', filter=Q(is_correct=True)),
+            response_time_total=Sum('response_time_seconds'),
+            response_time_count=Count('response_time_seconds'),
+            first_attempt_time=Min('attempt_time'),
+            last_attempt_time=Max('attempt_time'),
+        )
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+        row['response_time_total'] = row['response_time_total'] or 0
+        yield AttemptRollup(month=month, **row)
+
+
+def get_archive_storage(output_dir=None):
+    """
+    アーカイブの保存先のストレージ
+    output_dir（絶対パス）、ATTEMPT_ARCHIVE_STORAGE（ストレージクラスのパス）、ATTEMPT_ARCHIVE_ROOT（絶対パス）の順に使う。
+    アーカイブした月はDBから削除するため、コンテナの入れ替えで消える場所は使わない（未設定なら PartitionError）
+    """
+    if output_dir:
+        root = output_dir
+    elif settings.ATTEMPT_ARCHIVE_STORAGE:
+        return import_string(settings.ATTEMPT_ARCHIVE_STORAGE)()
+    elif settings.ATTEMPT_ARCHIVE_ROOT:
+        root = settings.ATTEMPT_ARCHIVE_ROOT
+    else:
+        raise PartitionError(
+            'アーカイブの保存先がありません（ATTEMPT_ARCHIVE_STORAGE・ATTEMPT_ARCHIVE_ROOT または --output-dir を指定してください）'
+        )
+    if not os.path.isabs(root):
+        raise PartitionError(f'アーカイブの保存先は永続化されたディレクトリの絶対パスで指定してください: {root}')
+    return FileSystemStorage(location=root)
+
+
+def _archive_location(storage, name):
+    """AttemptArchive.path に記録する場所（ローカルは絶対パス、S3 などはストレージ内の名前）"""
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return name
+
+
+def archive_month(month, storage, compression='zstd', using=DEFAULT_DB_ALIAS):
+    """
+    月の回答履歴を Parquet ファイルに書き出し、集計（AttemptRollup）に置き換える
+    1. ローカルの一時ファイルに書き出し、保存先（storage）に保存する
+    2. 保存先に同じサイズのファイルがあることを確認する（確認できなければDBは変更しない）
+    3. トランザクション内で書き込みを止め、DBの行数とファイルの行数が一致することを確認する
+    4. 集計を作成し、パーティションを切り離して削除する（分割していないDBは範囲削除）
+    失敗した場合は保存したファイルを削除する（再実行で書き直す）
+    """
+    from questions.analytics_export import DEFAULT_CHUNK_SIZE, ExportError, iter_parquet
+
+    if AttemptArchive.objects.using(using).filter(month=month).exists():
+        raise PartitionError(f'{month:%Y-%m} はアーカイブ済みです')
+
+    start, end = month_bounds(month)
+    name = f'attempts_{month:%Y_%m}.parquet'
+    partitioned = is_partitioned(using)
+    if partitioned and month not in list_partitions(using):
+        raise PartitionError(f'{month:%Y-%m} のパーティションがありません')
+
+    with tempfile.NamedTemporaryFile(suffix='.parquet') as temporary:
+        try:
+            for data in iter_parquet('attempts', since=start, until=end,
+                                     chunk_size=DEFAULT_CHUNK_SIZE, compression=compression, using=using):
+                temporary.write(data)
+        except ExportError as e:
+            raise PartitionError(str(e))
+        temporary.flush()
+
+        import pyarrow.parquet as pq
+        file_rows = pq.ParquetFile(temporary.name).metadata.num_rows
+        size_bytes = os.path.getsize(temporary.name)
+
+        # 前回失敗した実行のファイルは書き直す（アーカイブ済みの月は上で除いている）
+        if storage.exists(name):
+            storage.delete(name)
+        temporary.seek(0)
+        name = storage.save(name, File(temporary, name=name))
+
+    try:
+        if not storage.exists(name) or storage.size(name) != size_bytes:
+            raise PartitionError(f'{month:%Y-%m}: 保存先のファイルを確認できませんでした（{name}）')
+
+        with transaction.atomic(using=using):
+            attempts = UserAttempt.objects.using(using).filter(attempt_time__gte=start, attempt_time__lt=end)
+            if partitioned:
+                # 書き出し後に追加・変更された行がないことを確認するまで書き込みを止める
+                with connections[using].cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {partition_name(month)} IN SHARE MODE')
+            row_count = attempts.count()
+            if row_count != file_rows:
+                raise PartitionError(
+                    f'{month:%Y-%m}: 書き出し中に行数が変わりました（DB {row_count} 行、ファイル {file_rows} 行）。再実行してください'
+                )
+
+            rollup_count = 0
+            batch = []
+            for rollup in _iter_rollups(month, start, end, using):
+                batch.append(rollup)
+                if len(batch) >= ROLLUP_BATCH_SIZE:
+                    AttemptRollup.objects.using(using).bulk_create(batch)
+                    rollup_count += len(batch)
+                    batch = []
+            if batch:
+                AttemptRollup.objects.using(using).bulk_create(batch)
+                rollup_count += len(batch)
+
+            if partitioned:
+                with connections[using].cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {partition_name(month)}')
+                    cursor.execute(f'DROP TABLE {partition_name(month)}')
+            else:
+                attempts.delete()
+
+            return AttemptArchive.objects.using(using).create(
+                month=month,
+                path=_archive_location(storage, name),
+                row_count=row_count,
+                rollup_count=rollup_count,
+                size_bytes=size_bytes,
+            )
+    except Exception:
+        # アーカイブしなかった月のファイルは残さない
+        storage.delete(name)
+        raise
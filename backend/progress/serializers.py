@@ -1,10 +1,15 @@
 from rest_framework import serializers
-from django.db.models import Count, Avg, Sum, Q
+from django.conf import settings
+from django.db.models import Count, Avg, Sum, Q, Prefetch
 from django.utils import timezone
 from datetime import timedelta
 from .models import UserAttempt, QuizSession, UserProgress, Assignment, UserAssignment
+from .leaderboards import METRICS, WINDOWS, resolve_period, schedule_session_update
+from .department_rollups import DIMENSIONS, GRANULARITIES
+from questions.models import Choice, Genre, Question
 from questions.serializers import GenreSerializer, QuestionSerializer
 from accounts.serializers import UserSerializer
+from accounts.permissions import can_view_department
 
 
 class UserAttemptSerializer(serializers.ModelSerializer):
@@ -19,8 +24,25 @@ class UserAttemptSerializer(serializers.ModelSerializer):
                  'correct_choice_text', 'is_correct', 'attempt_time', 'response_time_seconds',
                  'genre_name']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """問題・選択した選択肢・正解の選択肢をまとめて取得する"""
+        return queryset.select_related(
+            'question__genre', 'selected_choice'
+        ).prefetch_related(
+            Prefetch(
+                'question__choices',
+                queryset=Choice.objects.filter(is_correct=True),
+                to_attr='correct_choices',
+            )
+        )
+
     def get_correct_choice_text(self, obj):
-        correct_choice = obj.question.choices.filter(is_correct=True).first()
+        correct_choices = getattr(obj.question, 'correct_choices', None)
+        if correct_choices is None:
+            correct_choice = obj.question.choices.filter(is_correct=True).first()
+        else:
+            correct_choice = correct_choices[0] if correct_choices else None
         return correct_choice.content if correct_choice else None
 
 
@@ -36,6 +58,16 @@ class QuizSessionSerializer(serializers.ModelSerializer):
                  'total_questions', 'correct_answers', 'score_percentage',
                  'start_time', 'end_time', 'is_completed', 'duration_minutes', 'attempts']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """attempts（ユーザーの回答履歴）とジャンルをまとめて取得する"""
+        return queryset.select_related('genre').prefetch_related(
+            Prefetch(
+                'user__attempts',
+                queryset=UserAttemptSerializer.setup_eager_loading(UserAttempt.objects.all()),
+            )
+        )
+
     def get_duration_minutes(self, obj):
         if obj.end_time and obj.start_time:
             duration = obj.end_time - obj.start_time
@@ -85,23 +117,234 @@ class QuizSessionCreateSerializer(serializers.ModelSerializer):
         quiz_session.save()
         
         # ユーザー進捗を更新
-        if quiz_session.genre:
-            progress, created = UserProgress.objects.get_or_create(
-                user=user,
-                genre=quiz_session.genre,
-                defaults={
-                    'total_attempts': validated_data['total_questions'],
-                    'correct_attempts': correct_count
-                }
-            )
-            if not created:
-                progress.total_attempts += validated_data['total_questions']
-                progress.correct_attempts += correct_count
-                progress.save()
+        update_user_progress(user, quiz_session.genre_id, validated_data['total_questions'], correct_count)
+        schedule_session_update(user, quiz_session)
         
         return quiz_session
 
 
+def update_user_progress(user, genre_id, total_questions, correct_count):
+    """セッションの結果をジャンル別の学習進捗に加算する（ジャンルなしのセッションは対象外）"""
+    if genre_id is None:
+        return
+    progress, created = UserProgress.objects.get_or_create(
+        user=user,
+        genre_id=genre_id,
+        defaults={
+            'total_attempts': total_questions,
+            'correct_attempts': correct_count
+        }
+    )
+    if not created:
+        progress.total_attempts += total_questions
+        progress.correct_attempts += correct_count
+        progress.save()
+
+
+class QuizSessionStartSerializer(serializers.ModelSerializer):
+    """サーバーで問題を出題してセッションを開始する"""
+    count = serializers.IntegerField(
+        write_only=True, default=10, min_value=1, max_value=settings.QUIZ_SESSION_MAX_QUESTIONS
+    )
+
+    class Meta:
+        model = QuizSession
+        fields = ['id', 'session_type', 'genre', 'difficulty', 'count', 'total_questions',
+                  'start_time', 'expires_at']
+        read_only_fields = ['total_questions', 'expires_at']
+
+    def create(self, validated_data):
+        count = validated_data.pop('count')
+        queryset = Question.objects.filter(is_active=True)
+        if validated_data.get('genre'):
+            queryset = queryset.filter(genre=validated_data['genre'])
+        if validated_data.get('difficulty'):
+            queryset = queryset.filter(difficulty=validated_data['difficulty'])
+
+        question_ids = queryset.draw_ids(count)
+        if not question_ids:
+            raise serializers.ValidationError({'detail': '条件に合う問題がありません'})
+
+        return QuizSession.objects.create(
+            user=self.context['request'].user,
+            total_questions=len(question_ids),
+            question_ids=question_ids,
+            expires_at=timezone.now() + timedelta(seconds=settings.QUIZ_SESSION_TTL_SECONDS),
+            **validated_data
+        )
+
+
+class QuizSessionResultSerializer(serializers.ModelSerializer):
+    """回答送信後の採点結果（results は QuizSessionSubmitSerializer が設定する）"""
+    score_percentage = serializers.ReadOnlyField()
+    results = serializers.ListField(read_only=True)
+
+    class Meta:
+        model = QuizSession
+        fields = ['id', 'total_questions', 'correct_answers', 'score_percentage',
+                  'start_time', 'end_time', 'results']
+
+
+class QuizAnswerSerializer(serializers.Serializer):
+    question_id = serializers.CharField()
+    selected_choice_id = serializers.CharField()
+    response_time_seconds = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+
+
+class QuizSessionSubmitSerializer(serializers.Serializer):
+    """
+    サーバーで出題したセッションの回答を採点する（context['session'] のセッション）
+    正誤はクライアントの値ではなく、出題した問題の選択肢から判定する
+    """
+    answers = QuizAnswerSerializer(many=True)
+
+    def validate_answers(self, answers):
+        session = self.context['session']
+        # 出題した問題の選択肢を1回のクエリで取得する {選択肢ID: (問題ID, 正解か, 解説)}
+        self.choices = {
+            choice_id: (question_id, is_correct, clarification)
+            for choice_id, question_id, is_correct, clarification in Choice.objects.filter(
+                question_id__in=session.question_ids
+            ).values_list('id', 'question_id', 'is_correct', 'question__clarification')
+        }
+
+        drawn = set(session.question_ids)
+        answered = set()
+        for answer in answers:
+            question_id = answer['question_id']
+            if question_id not in drawn:
+                raise serializers.ValidationError(f'出題されていない問題です: {question_id}')
+            if question_id in answered:
+                raise serializers.ValidationError(f'同じ問題に複数の回答があります: {question_id}')
+            answered.add(question_id)
+            choice = self.choices.get(answer['selected_choice_id'])
+            if choice is None or choice[0] != question_id:
+                raise serializers.ValidationError(
+                    f'問題 {question_id} の選択肢ではありません: {answer["selected_choice_id"]}'
+                )
+        return answers
+
+    def create(self, validated_data):
+        session = self.context['session']
+        user = self.context['request'].user
+        answers = {answer['question_id']: answer for answer in validated_data['answers']}
+
+        correct_choice_ids = {}
+        clarifications = {}
+        for choice_id, (question_id, is_correct, clarification) in self.choices.items():
+            clarifications[question_id] = clarification
+            if is_correct:
+                correct_choice_ids.setdefault(question_id, []).append(choice_id)
+
+        # 出題順に採点する（未回答の問題は不正解として数える）
+        attempts = []
+        results = []
+        for question_id in session.question_ids:
+            answer = answers.get(question_id)
+            is_correct = answer is not None and self.choices[answer['selected_choice_id']][1]
+            if answer is not None:
+                attempts.append(UserAttempt(
+                    user=user,
+                    question_id=question_id,
+                    selected_choice_id=answer['selected_choice_id'],
+                    is_correct=is_correct,
+                    response_time_seconds=answer.get('response_time_seconds'),
+                ))
+            results.append({
+                'question_id': question_id,
+                'selected_choice_id': answer['selected_choice_id'] if answer else None,
+                'is_correct': is_correct,
+                'correct_choice_ids': sorted(correct_choice_ids.get(question_id, [])),
+                'clarification': clarifications.get(question_id, ''),
+            })
+        UserAttempt.objects.bulk_create(attempts)
+
+        correct_count = sum(result['is_correct'] for result in results)
+        session.correct_answers = correct_count
+        session.end_time = timezone.now()
+        session.is_completed = True
+        session.expires_at = None
+        session.save(update_fields=['correct_answers', 'end_time', 'is_completed', 'expires_at', 'updated_at'])
+
+        update_user_progress(user, session.genre_id, session.total_questions, correct_count)
+        schedule_session_update(user, session)
+        session.results = results
+        return session
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """
+    ランキングの取得条件（クエリパラメータ）
+    部署別は自分の部署のみ（管理者は department で他の部署も指定できる。部署別集計と同じ条件）
+    """
+    metric = serializers.ChoiceField(choices=METRICS, default='accuracy')
+    scope = serializers.ChoiceField(choices=['global', 'genre', 'department'], default='global')
+    genre = serializers.CharField(required=False)
+    department = serializers.CharField(required=False)
+    window = serializers.ChoiceField(choices=WINDOWS, default='all')
+    period = serializers.CharField(required=False)
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=settings.LEADERBOARD_MAX_LIMIT)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if attrs['scope'] == 'genre':
+            if not attrs.get('genre'):
+                raise serializers.ValidationError({'genre': 'ジャンル別のランキングにはジャンルを指定してください'})
+            if attrs['metric'] == 'streak':
+                raise serializers.ValidationError({'metric': '連続学習日数のランキングはジャンル別にはありません'})
+        if attrs['scope'] == 'department':
+            department = attrs.get('department')
+            if department and not can_view_department(user, department):
+                raise serializers.ValidationError({'department': '他の部署のランキングは表示できません'})
+            attrs['department'] = department or user.department
+            if not attrs['department']:
+                raise serializers.ValidationError({'department': '部署が設定されていません'})
+        try:
+            attrs['period'] = resolve_period(attrs['window'], attrs.get('period'))
+        except ValueError:
+            raise serializers.ValidationError({
+                'period': '週は 2026-W01、月は 2026-01 の形式で指定してください'
+            })
+        return attrs
+
+
+class DepartmentStatsQuerySerializer(serializers.Serializer):
+    """
+    部署別集計の取得条件（クエリパラメータ）
+    成績管理者は自分の部署のみ。管理者は department で部署を指定する
+    期間（date_from〜date_to、両端を含む）の既定は今日までの30日間
+    """
+    department = serializers.CharField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    genre = serializers.CharField(required=False)
+    difficulty = serializers.IntegerField(required=False, min_value=1, max_value=3)
+    group_by = serializers.CharField(default='period')
+    granularity = serializers.ChoiceField(choices=GRANULARITIES, default='day')
+
+    def validate_group_by(self, value):
+        group_by = [name.strip() for name in value.split(',') if name.strip()]
+        invalid = [name for name in group_by if name not in DIMENSIONS]
+        if invalid or not group_by:
+            raise serializers.ValidationError(f'{", ".join(DIMENSIONS)} から1つ以上を指定してください')
+        return group_by
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        department = attrs.get('department')
+        if department and not can_view_department(user, department):
+            raise serializers.ValidationError({'department': '他の部署の集計は表示できません'})
+        attrs['department'] = department or user.department
+        if not attrs['department']:
+            raise serializers.ValidationError({'department': '部署が設定されていません'})
+
+        attrs['date_to'] = attrs.get('date_to') or timezone.localdate()
+        attrs['date_from'] = attrs.get('date_from') or attrs['date_to'] - timedelta(days=29)
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({'date_from': 'date_to 以前の日付を指定してください'})
+        return attrs
+
+
 class UserProgressSerializer(serializers.ModelSerializer):
     genre = GenreSerializer(read_only=True)
     accuracy_rate = serializers.ReadOnlyField()
@@ -111,6 +354,13 @@ class UserProgressSerializer(serializers.ModelSerializer):
         fields = ['id', 'genre', 'total_attempts', 'correct_attempts', 
                  'accuracy_rate', 'last_study_date', 'created_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """ジャンルを問題数の集計付きでまとめて取得する"""
+        return queryset.prefetch_related(
+            Prefetch('genre', queryset=Genre.objects.with_question_count())
+        )
+
 
 class StudyStatisticsSerializer(serializers.Serializer):
     total_sessions = serializers.IntegerField()
@@ -162,6 +412,13 @@ class AssignmentSerializer(serializers.ModelSerializer):
                  'difficulty_max', 'question_count', 'due_date', 'created_by', 
                  'created_at', 'is_active']
 
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """作成者とジャンル（問題数の集計付き）をまとめて取得する（prefix は関連先から読む場合のパス）"""
+        return queryset.select_related(f'{prefix}created_by').prefetch_related(
+            Prefetch(f'{prefix}genres', queryset=Genre.objects.with_question_count())
+        )
+
 
 class UserAssignmentSerializer(serializers.ModelSerializer):
     assignment = AssignmentSerializer(read_only=True)
@@ -169,4 +426,11 @@ class UserAssignmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserAssignment
         fields = ['id', 'assignment', 'status', 'assigned_at', 'started_at', 
-                 'completed_at', 'score']
\ No newline at end of file
+                 'completed_at', 'score']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """課題とその作成者・ジャンルをまとめて取得する"""
+        return AssignmentSerializer.setup_eager_loading(
+            queryset.select_related('assignment'), prefix='assignment__'
+        )
\ No newline at end of file
@@ -1,14 +1,18 @@
 from django.urls import path
 from .views import (
-    QuizSessionListCreateView, QuizSessionDetailView, UserProgressListView,
+    QuizSessionListCreateView, QuizSessionStartView, QuizSessionSubmitView,
+    QuizSessionDetailView, UserProgressListView,
     StudyStatisticsView, GenrePerformanceView, WeeklyProgressView,
     DailyActivityView, UserAttemptListView, AssignmentListView,
-    UserAssignmentListView, IncorrectQuestionsView
+    UserAssignmentListView, IncorrectQuestionsView, LeaderboardView,
+    DepartmentStatsView, DepartmentSummaryView
 )
 
 urlpatterns = [
     path('sessions/', QuizSessionListCreateView.as_view(), name='quiz_sessions'),
+    path('sessions/start/', QuizSessionStartView.as_view(), name='quiz_session_start'),
     path('sessions/<int:pk>/', QuizSessionDetailView.as_view(), name='quiz_session_detail'),
+    path('sessions/<int:pk>/submit/', QuizSessionSubmitView.as_view(), name='quiz_session_submit'),
     path('progress/', UserProgressListView.as_view(), name='user_progress'),
     path('statistics/', StudyStatisticsView.as_view(), name='study_statistics'),
     path('genre-performance/', GenrePerformanceView.as_view(), name='genre_performance'),
@@ -18,4 +22,7 @@ urlpatterns = [
     path('assignments/', AssignmentListView.as_view(), name='assignments'),
     path('user-assignments/', UserAssignmentListView.as_view(), name='user_assignments'),
     path('incorrect-questions/', IncorrectQuestionsView.as_view(), name='incorrect_questions'),
+    path('leaderboards/', LeaderboardView.as_view(), name='leaderboards'),
+    path('department/stats/', DepartmentStatsView.as_view(), name='department_stats'),
+    path('department/summary/', DepartmentSummaryView.as_view(), name='department_summary'),
 ]
\ No newline at end of file
@@ -2,23 +2,31 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count, Avg, Sum, Q, Max
+from django.db import transaction
+from django.db.models import Count, Avg, Sum, Q, Max, F, BooleanField, ExpressionWrapper, OuterRef, Subquery
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from datetime import timedelta, datetime
-from .models import UserAttempt, QuizSession, UserProgress, Assignment, UserAssignment
+from .models import UserAttempt, QuizSession, UserProgress, Assignment, UserAssignment, AttemptRollup
 from .serializers import (
     UserAttemptSerializer, QuizSessionSerializer, QuizSessionCreateSerializer,
+    QuizSessionStartSerializer, QuizSessionSubmitSerializer, QuizSessionResultSerializer,
     UserProgressSerializer, StudyStatisticsSerializer, GenrePerformanceSerializer,
     WeeklyProgressSerializer, DailyActivitySerializer, AssignmentSerializer,
-    UserAssignmentSerializer
+    UserAssignmentSerializer, LeaderboardQuerySerializer, DepartmentStatsQuerySerializer
 )
+from . import department_rollups, leaderboards
+from .models import User
 from questions.models import Genre, Question
+from questions.serializers import QuestionWithoutAnswerSerializer
+from elearning.db.routers import ReplicaReadMixin, pin_primary_reads
+from accounts.permissions import IsManager
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class QuizSessionListCreateView(generics.ListCreateAPIView):
+class QuizSessionListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     """
     クイズセッション一覧取得・作成API
     """
@@ -30,10 +38,74 @@ class QuizSessionListCreateView(generics.ListCreateAPIView):
         return QuizSessionSerializer
     
     def get_queryset(self):
-        return QuizSession.objects.filter(user=self.request.user).order_by('-start_time')
+        # 期限切れの未送信セッション（サーバー出題）は表示しない（purge_quiz_sessions で削除する）
+        return QuizSessionSerializer.setup_eager_loading(
+            QuizSession.objects.filter(user=self.request.user).exclude_abandoned().order_by('-start_time')
+        )
+    
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        # 送信直後のダッシュボードはレプリカの遅延に関係なく結果を表示する
+        pin_primary_reads(self.request.user)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QuizSessionStartView(APIView):
+    """
+    クイズセッション開始API
+    サーバーで問題を出題してセッションに保存し、正解情報なしの問題を出題順に返す
+    回答は QUIZ_SESSION_TTL_SECONDS 秒以内に QuizSessionSubmitView に送信する
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = QuizSessionStartSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        session = serializer.save()
+
+        questions = Question.objects.filter(id__in=session.question_ids).select_related('genre').prefetch_related('choices')
+        questions_by_id = {question.id: question for question in questions}
+        ordered = [questions_by_id[question_id] for question_id in session.question_ids]
+
+        return Response({
+            **serializer.data,
+            'questions': QuestionWithoutAnswerSerializer(ordered, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QuizSessionSubmitView(APIView):
+    """
+    クイズセッション回答送信API
+    開始時に出題した問題で採点し、問題ごとの正誤・正解の選択肢・解説を返す
+    送信済みのセッションは 409、期限切れのセッションは 410
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        with transaction.atomic():
+            # 同じセッションの二重送信を防ぐため、行をロックしてから状態を確認する
+            session = get_object_or_404(
+                QuizSession.objects.select_for_update(),
+                pk=pk, user=request.user, question_ids__isnull=False,
+            )
+            if session.is_completed:
+                return Response({'detail': 'このセッションは送信済みです'}, status=status.HTTP_409_CONFLICT)
+            if session.is_expired:
+                return Response({'detail': 'このセッションは期限切れです'}, status=status.HTTP_410_GONE)
+
+            serializer = QuizSessionSubmitSerializer(
+                data=request.data, context={'request': request, 'session': session}
+            )
+            serializer.is_valid(raise_exception=True)
+            session = serializer.save()
+
+        # 送信直後のダッシュボードはレプリカの遅延に関係なく結果を表示する
+        pin_primary_reads(request.user)
+        return Response(QuizSessionResultSerializer(session).data)
 
 
-class QuizSessionDetailView(generics.RetrieveAPIView):
+class QuizSessionDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     クイズセッション詳細取得API
     """
@@ -41,10 +113,12 @@ class QuizSessionDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return QuizSession.objects.filter(user=self.request.user)
+        return QuizSessionSerializer.setup_eager_loading(
+            QuizSession.objects.filter(user=self.request.user)
+        )
 
 
-class UserProgressListView(generics.ListAPIView):
+class UserProgressListView(ReplicaReadMixin, generics.ListAPIView):
     """
     ユーザー進捗一覧取得API
     """
@@ -52,10 +126,12 @@ class UserProgressListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return UserProgress.objects.filter(user=self.request.user).order_by('-last_study_date')
+        return UserProgressSerializer.setup_eager_loading(
+            UserProgress.objects.filter(user=self.request.user).order_by('-last_study_date')
+        )
 
 
-class StudyStatisticsView(APIView):
+class StudyStatisticsView(ReplicaReadMixin, APIView):
     """
     学習統計取得API
     """
@@ -81,10 +157,15 @@ class StudyStatisticsView(APIView):
                 'genre_performance': []
             })
         
-        total_questions = sessions.aggregate(Sum('total_questions'))['total_questions__sum'] or 0
-        correct_answers = sessions.aggregate(Sum('correct_answers'))['correct_answers__sum'] or 0
+        totals = sessions.aggregate(
+            questions_sum=Sum('total_questions'),
+            correct_sum=Sum('correct_answers'),
+            correct_avg=Avg('correct_answers'),
+        )
+        total_questions = totals['questions_sum'] or 0
+        correct_answers = totals['correct_sum'] or 0
         accuracy_rate = round((correct_answers / total_questions) * 100, 1) if total_questions > 0 else 0
-        average_score = sessions.aggregate(Avg('correct_answers'))['correct_answers__avg'] or 0
+        average_score = totals['correct_avg'] or 0
         
         # 学習時間計算（分単位）
         completed_sessions = sessions.filter(end_time__isnull=False)
@@ -102,15 +183,17 @@ class StudyStatisticsView(APIView):
         favorite_genre = None
         if favorite_genre_data and favorite_genre_data['genre__id']:
             try:
-                favorite_genre = Genre.objects.get(id=favorite_genre_data['genre__id'])
+                favorite_genre = Genre.objects.with_question_count().get(id=favorite_genre_data['genre__id'])
             except Genre.DoesNotExist:
                 pass
         
         # 最近のセッション（5件）
-        recent_sessions = sessions.order_by('-start_time')[:5]
+        recent_sessions = QuizSessionSerializer.setup_eager_loading(sessions.order_by('-start_time')[:5])
         
         # ジャンル別パフォーマンス
-        genre_performance = UserProgress.objects.filter(user=user).order_by('-last_study_date')
+        genre_performance = UserProgressSerializer.setup_eager_loading(
+            UserProgress.objects.filter(user=user).order_by('-last_study_date')
+        )
         
         data = {
             'total_sessions': total_sessions,
@@ -128,7 +211,7 @@ class StudyStatisticsView(APIView):
         return Response(serializer.data)
 
 
-class GenrePerformanceView(APIView):
+class GenrePerformanceView(ReplicaReadMixin, APIView):
     """
     ジャンル別パフォーマンス取得API
     """
@@ -137,46 +220,77 @@ class GenrePerformanceView(APIView):
     def get(self, request):
         user = request.user
         
-        # ジャンル別の統計を計算
+        # ジャンル別の統計を計算（完了セッションをジャンルごとに1回のクエリで集計）
+        completed_sessions = QuizSession.objects.filter(user=user, is_completed=True)
+        session_stats = {
+            row['genre']: row
+            for row in completed_sessions.values('genre').annotate(
+                sessions_count=Count('id'),
+                best_score=Max('correct_answers'),
+                avg_score=Avg('correct_answers'),
+                last_attempt=Max('start_time'),
+            ).order_by()
+        }
+        total_time_by_genre = self._study_minutes_by_genre(completed_sessions)
+        
         performance_data = []
+        progress_list = UserProgressSerializer.setup_eager_loading(UserProgress.objects.filter(user=user))
         
-        for progress in UserProgress.objects.filter(user=user):
-            sessions = QuizSession.objects.filter(
-                user=user, 
-                genre=progress.genre, 
-                is_completed=True
-            )
+        for progress in progress_list:
+            stats = session_stats.get(progress.genre_id)
             
-            if sessions.exists():
-                best_score = sessions.aggregate(Max('correct_answers'))['correct_answers__max'] or 0
-                avg_score = sessions.aggregate(Avg('correct_answers'))['correct_answers__avg'] or 0
-                
-                # 学習時間計算
-                total_time = 0
-                for session in sessions.filter(end_time__isnull=False):
-                    if session.end_time and session.start_time:
-                        duration = session.end_time - session.start_time
-                        total_time += duration.total_seconds() / 60
-                
-                last_attempt = sessions.order_by('-start_time').first().start_time
-                
+            if stats:
                 performance_data.append({
                     'genre': progress.genre,
-                    'sessions_count': sessions.count(),
+                    'sessions_count': stats['sessions_count'],
                     'questions_count': progress.total_attempts,
                     'correct_answers': progress.correct_attempts,
                     'accuracy_rate': progress.accuracy_rate,
-                    'average_score': round(avg_score, 1),
-                    'best_score': best_score,
-                    'total_time': round(total_time),
-                    'last_attempt': last_attempt
+                    'average_score': round(stats['avg_score'] or 0, 1),
+                    'best_score': stats['best_score'] or 0,
+                    'total_time': round(total_time_by_genre.get(progress.genre_id, 0)),
+                    'last_attempt': stats['last_attempt']
                 })
         
         serializer = GenrePerformanceSerializer(performance_data, many=True)
         return Response(serializer.data)
 
+    @staticmethod
+    def _study_minutes_by_genre(sessions):
+        """ジャンルごとの学習時間（分）"""
+        minutes = {}
+        for genre_id, start_time, end_time in sessions.filter(end_time__isnull=False).values_list(
+            'genre', 'start_time', 'end_time'
+        ):
+            if end_time and start_time:
+                minutes[genre_id] = minutes.get(genre_id, 0) + (end_time - start_time).total_seconds() / 60
+        return minutes
 
-class WeeklyProgressView(APIView):
+
+def _completed_sessions_by_date(user, start_date, end_date):
+    """
+    期間内（開始日〜終了日、現在のタイムゾーンの日付）の完了セッションを開始日ごとにまとめる
+    週別・日別の集計で日数分のクエリを発行しないよう、1回のクエリで取得する
+    """
+    sessions_by_date = {}
+    sessions = QuizSession.objects.filter(
+        user=user,
+        is_completed=True,
+        start_time__date__range=[start_date, end_date]
+    ).values('start_time', 'end_time', 'total_questions', 'correct_answers')
+    for session in sessions:
+        date = timezone.localtime(session['start_time']).date()
+        sessions_by_date.setdefault(date, []).append(session)
+    return sessions_by_date
+
+
+def _session_minutes(session):
+    if session['end_time'] and session['start_time']:
+        return (session['end_time'] - session['start_time']).total_seconds() / 60
+    return 0
+
+
+class WeeklyProgressView(ReplicaReadMixin, APIView):
     """
     週別進捗取得API
     """
@@ -189,29 +303,28 @@ class WeeklyProgressView(APIView):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(weeks=8)
         
+        # 期間内の完了セッションを1回のクエリで取得し、週ごとに集計する
+        sessions_by_date = _completed_sessions_by_date(user, start_date, end_date + timedelta(days=6))
+        
         weekly_data = []
         current_date = start_date
         
         while current_date <= end_date:
             week_end = current_date + timedelta(days=6)
             
-            sessions = QuizSession.objects.filter(
-                user=user,
-                is_completed=True,
-                start_time__date__range=[current_date, week_end]
-            )
+            sessions = [
+                session
+                for day in range(7)
+                for session in sessions_by_date.get(current_date + timedelta(days=day), [])
+            ]
             
-            sessions_count = sessions.count()
-            questions_count = sessions.aggregate(Sum('total_questions'))['total_questions__sum'] or 0
-            correct_answers = sessions.aggregate(Sum('correct_answers'))['correct_answers__sum'] or 0
+            sessions_count = len(sessions)
+            questions_count = sum(session['total_questions'] for session in sessions)
+            correct_answers = sum(session['correct_answers'] for session in sessions)
             accuracy_rate = round((correct_answers / questions_count) * 100, 1) if questions_count > 0 else 0
             
             # 学習時間計算
-            total_time = 0
-            for session in sessions.filter(end_time__isnull=False):
-                if session.end_time and session.start_time:
-                    duration = session.end_time - session.start_time
-                    total_time += duration.total_seconds() / 60
+            total_time = sum(_session_minutes(session) for session in sessions)
             
             weekly_data.append({
                 'week_start': current_date,
@@ -228,7 +341,7 @@ class WeeklyProgressView(APIView):
         return Response(serializer.data)
 
 
-class DailyActivityView(APIView):
+class DailyActivityView(ReplicaReadMixin, APIView):
     """
     日別活動取得API
     """
@@ -241,25 +354,20 @@ class DailyActivityView(APIView):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=30)
         
+        # 期間内の完了セッションを1回のクエリで取得し、日ごとに集計する
+        sessions_by_date = _completed_sessions_by_date(user, start_date, end_date)
+        
         daily_data = []
         current_date = start_date
         
         while current_date <= end_date:
-            sessions = QuizSession.objects.filter(
-                user=user,
-                is_completed=True,
-                start_time__date=current_date
-            )
+            sessions = sessions_by_date.get(current_date, [])
             
-            sessions_count = sessions.count()
-            questions_count = sessions.aggregate(Sum('total_questions'))['total_questions__sum'] or 0
+            sessions_count = len(sessions)
+            questions_count = sum(session['total_questions'] for session in sessions)
             
             # 学習時間計算
-            study_time = 0
-            for session in sessions.filter(end_time__isnull=False):
-                if session.end_time and session.start_time:
-                    duration = session.end_time - session.start_time
-                    study_time += duration.total_seconds() / 60
+            study_time = sum(_session_minutes(session) for session in sessions)
             
             daily_data.append({
                 'date': current_date,
@@ -274,7 +382,7 @@ class DailyActivityView(APIView):
         return Response(serializer.data)
 
 
-class UserAttemptListView(generics.ListAPIView):
+class UserAttemptListView(ReplicaReadMixin, generics.ListAPIView):
     """
     ユーザー回答履歴一覧取得API
     """
@@ -282,7 +390,9 @@ class UserAttemptListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = UserAttempt.objects.filter(user=self.request.user).order_by('-attempt_time')
+        queryset = UserAttemptSerializer.setup_eager_loading(
+            UserAttempt.objects.filter(user=self.request.user).order_by('-attempt_time')
+        )
         
         # フィルタリング
         genre = self.request.query_params.get('genre')
@@ -302,7 +412,9 @@ class AssignmentListView(generics.ListAPIView):
     """
     serializer_class = AssignmentSerializer
     permission_classes = [IsAuthenticated]
-    queryset = Assignment.objects.filter(is_active=True).order_by('-created_at')
+    queryset = AssignmentSerializer.setup_eager_loading(
+        Assignment.objects.filter(is_active=True).order_by('-created_at')
+    )
 
 
 class UserAssignmentListView(generics.ListAPIView):
@@ -313,10 +425,12 @@ class UserAssignmentListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return UserAssignment.objects.filter(user=self.request.user).order_by('-assigned_at')
+        return UserAssignmentSerializer.setup_eager_loading(
+            UserAssignment.objects.filter(user=self.request.user).order_by('-assigned_at')
+        )
 
 
-class IncorrectQuestionsView(APIView):
+class IncorrectQuestionsView(ReplicaReadMixin, APIView):
     """
     間違った問題のみ取得API
     """
@@ -327,30 +441,30 @@ class IncorrectQuestionsView(APIView):
         limit = int(request.query_params.get('limit', 10))
         genre = request.query_params.get('genre')
         
-        # 間違った問題を取得（最新の回答を基準）
-        incorrect_attempts = UserAttempt.objects.filter(
+        # 最新の回答が間違いの問題（最新の回答はサブクエリで求め、問題ごとのクエリは発行しない）
+        latest_attempts = UserAttempt.objects.filter(
+            user=user,
+            question=OuterRef('pk')
+        ).order_by('-attempt_time', '-id')
+        # 回答履歴がアーカイブ済みの月にしかない問題は、最後の月の集計で判定する（その月に1回でも間違えていれば間違い）
+        latest_rollups = AttemptRollup.objects.filter(
             user=user,
-            is_correct=False
-        ).values('question_id').annotate(
-            latest_attempt=Max('attempt_time')
-        ).values('question_id', 'latest_attempt')
-        
-        # 最新の回答が間違いの問題IDを取得
-        incorrect_question_ids = []
-        for attempt in incorrect_attempts:
-            latest_attempt = UserAttempt.objects.filter(
-                user=user,
-                question_id=attempt['question_id'],
-                attempt_time=attempt['latest_attempt']
-            ).first()
-            if latest_attempt and not latest_attempt.is_correct:
-                incorrect_question_ids.append(attempt['question_id'])
+            question=OuterRef('pk')
+        ).order_by('-month').annotate(
+            all_correct=ExpressionWrapper(Q(correct_attempts=F('attempts')), output_field=BooleanField())
+        )
         
         # 問題を取得
         questions_queryset = Question.objects.filter(
-            id__in=incorrect_question_ids,
+            Q(id__in=UserAttempt.objects.filter(user=user).values('question_id'))
+            | Q(id__in=AttemptRollup.objects.filter(user=user).values('question_id')),
             is_active=True
-        )
+        ).annotate(
+            latest_is_correct=Subquery(latest_attempts.values('is_correct')[:1]),
+            archived_is_correct=Subquery(latest_rollups.values('all_correct')[:1]),
+        ).filter(
+            Q(latest_is_correct=False) | Q(latest_is_correct__isnull=True, archived_is_correct=False)
+        ).select_related('genre', 'author_user').prefetch_related('choices')
         
         # ジャンルフィルター
         if genre:
@@ -363,4 +477,118 @@ class IncorrectQuestionsView(APIView):
         from questions.serializers import QuestionSerializer
         serializer = QuestionSerializer(questions, many=True)
         
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+class LeaderboardView(APIView):
+    """
+    ランキング取得API（Redis のソート済みセットから読み、DBの集計はしない）
+    クエリパラメータ: metric（accuracy / answered / correct / streak）, scope（global / genre / department）,
+    genre, department, window（all / week / month）, period（2026-W42 / 2026-10。省略時は今週・今月）, limit
+    ランキングが無効・Redis に接続できない場合は 503
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = LeaderboardQuerySerializer(data=request.query_params, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        if params['scope'] == 'genre':
+            scope = leaderboards.genre_scope(params['genre'])
+        elif params['scope'] == 'department':
+            scope = leaderboards.department_scope(params['department'])
+        else:
+            scope = leaderboards.global_scope()
+
+        try:
+            top, (rank, score) = leaderboards.read_board(
+                params['metric'], scope, params['period'], params['limit'], request.user.id
+            )
+        except leaderboards.LeaderboardUnavailable:
+            return Response({'detail': 'ランキングは現在利用できません'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        users = User.objects.only('id', 'username', 'display_name', 'department').in_bulk(
+            [user_id for user_id, _ in top]
+        )
+        entries = []
+        for position, (user_id, member_score) in enumerate(top, start=1):
+            user = users.get(user_id)
+            # 削除されたユーザーは表示しない（順位は rebuild_leaderboards で詰める）
+            if user is None:
+                continue
+            entries.append({
+                'rank': position,
+                'user_id': user.id,
+                'username': user.username,
+                'display_name': user.display_name,
+                'department': user.department,
+                **leaderboards.decode_score(params['metric'], member_score),
+            })
+
+        return Response({
+            'metric': params['metric'],
+            'scope': params['scope'],
+            'genre': params.get('genre') if params['scope'] == 'genre' else None,
+            'department': params['department'] if params['scope'] == 'department' else None,
+            'window': params['window'],
+            'period': params['period'].partition(':')[2] or None,
+            'entries': entries,
+            'me': {
+                'rank': rank,
+                **leaderboards.decode_score(params['metric'], score),
+            } if rank is not None else None,
+        })
+
+
+class DepartmentStatsView(ReplicaReadMixin, APIView):
+    """
+    成績管理者用の部署別集計API（集計キューブ DepartmentRollup から求め、回答履歴は読まない）
+    クエリパラメータ: department（管理者のみ）, date_from, date_to, genre, difficulty,
+    group_by（genre / difficulty / period をカンマ区切り。既定 period）, granularity（day / week / month）
+    集計は refresh_department_rollups コマンドの実行時点のもの
+    """
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        serializer = DepartmentStatsQuerySerializer(data=request.query_params, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = department_rollups.department_rollups(
+            params['department'], params['date_from'], params['date_to'],
+            genre=params.get('genre'), difficulty=params.get('difficulty'),
+        )
+        rows, total = department_rollups.drill_down(queryset, params['group_by'], params['granularity'])
+        return Response({
+            'department': params['department'],
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            'group_by': params['group_by'],
+            'granularity': params['granularity'] if 'period' in params['group_by'] else None,
+            'total': total,
+            'rows': rows,
+        })
+
+
+class DepartmentSummaryView(ReplicaReadMixin, APIView):
+    """
+    成績管理者用の部署別サマリーAPI（期間の合計・ジャンル別・難易度別）
+    クエリパラメータは DepartmentStatsView と同じ（group_by・granularity は使わない）
+    """
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        serializer = DepartmentStatsQuerySerializer(data=request.query_params, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = department_rollups.department_rollups(
+            params['department'], params['date_from'], params['date_to'],
+            genre=params.get('genre'), difficulty=params.get('difficulty'),
+        )
+        return Response({
+            'department': params['department'],
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            **department_rollups.summarize(queryset),
+        })
@@ -5,7 +5,8 @@ from .admin_views import (
     AdminUserListView, AdminUserDetailView,
     AdminStatsView, AdminQuestionBulkActionView, AdminQuestionBulkUpdateView,
     AdminUserProgressView, AdminUserStatsView,
-    AdminCSVExportView, AdminCSVImportView, AdminCSVDeleteView, AdminDebugDataView
+    AdminCSVExportView, AdminCSVImportView, AdminCSVDeleteView, AdminDebugDataView,
+    AdminAnalyticsExportView, AdminUserBulkProvisionView
 )
 
 urlpatterns = [
@@ -21,6 +22,7 @@ urlpatterns = [
     
     # ユーザー管理
     path('users/', AdminUserListView.as_view(), name='admin_users'),
+    path('users/bulk-provision/', AdminUserBulkProvisionView.as_view(), name='admin_user_bulk_provision'),
     path('users/progress/', AdminUserProgressView.as_view(), name='admin_user_progress'),
     path('users/<int:user_id>/progress/', AdminUserProgressView.as_view(), name='admin_user_progress_detail'),
     path('users/<str:pk>/', AdminUserDetailView.as_view(), name='admin_user_detail'),
@@ -34,6 +36,9 @@ urlpatterns = [
     path('csv/import/', AdminCSVImportView.as_view(), name='admin_csv_import'),
     path('csv/delete/', AdminCSVDeleteView.as_view(), name='admin_csv_delete'),
     
+    # 分析用エクスポート（NDJSON / Parquet）
+    path('analytics/export/', AdminAnalyticsExportView.as_view(), name='admin_analytics_export'),
+    
     # デバッグ
     path('debug/data/', AdminDebugDataView.as_view(), name='admin_debug_data'),
 ]
\ No newline at end of file
@@ -3,18 +3,24 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Avg, Sum
+from django.db import transaction
+from django.db.models import Q, Count, Avg, Sum, Max
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from datetime import timedelta
 import csv
 import io
-from .models import Genre, Question, Choice
-from .serializers import GenreSerializer, QuestionSerializer, ChoiceSerializer
+from .models import Genre, Question, Choice, StatCounter
+from .serializers import AdminQuestionSerializer, GenreSerializer, QuestionSerializer, ChoiceSerializer
+from .analytics_export import ExportError, export_filename, export_until, iter_export, parse_watermark
+from .question_packs import schedule_pack_rebuild
 from accounts.serializers import UserSerializer
-from progress.models import UserAttempt, QuizSession, UserProgress
+from accounts.provisioning import parse_provisioning_csv, provision_users, validate_row_count
+from progress.models import UserAttempt, QuizSession, UserProgress, AttemptRollup
+from elearning.db.routers import ReplicaReadMixin
 
 User = get_user_model()
 
@@ -33,7 +39,7 @@ class AdminGenreListCreateView(generics.ListCreateAPIView):
     """
     管理者用ジャンル一覧取得・作成API
     """
-    queryset = Genre.objects.all().order_by('name')
+    queryset = Genre.objects.with_question_count().order_by('name')
     serializer_class = GenreSerializer
     permission_classes = [IsAdminUser]
     pagination_class = AdminPagination
@@ -43,7 +49,8 @@ class AdminGenreListCreateView(generics.ListCreateAPIView):
         if 'id' not in serializer.validated_data or not serializer.validated_data.get('id'):
             serializer.save(id=Genre.generate_next_id())
         else:
-            serializer.save()
+            genre = serializer.save()
+            Genre.sync_id_sequence([genre.id])
 
 
 class AdminGenreDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -55,16 +62,32 @@ class AdminGenreDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminUser]
 
 
+# 項目分析（QuestionStats）での並び替え。インデックスのある列で並べるため、集計済みの問題のみを返す
+QUESTION_STATS_ORDERINGS = {
+    'hardest': ['stats__p_value', 'id'],
+    'easiest': ['-stats__p_value', '-id'],
+    'most_misleading': ['-stats__top_distractor_rate', '-id'],
+    'least_discriminating': ['stats__discrimination', 'id'],
+}
+
+
 class AdminQuestionListCreateView(generics.ListCreateAPIView):
     """
     管理者用問題一覧取得・作成API
+    ordering（hardest / easiest / most_misleading / least_discriminating）で項目分析の値で並び替える。
+    stats_min_attempts で回答数の少ない問題を除く
     """
-    serializer_class = QuestionSerializer
     permission_classes = [IsAdminUser]
     pagination_class = AdminPagination
     
+    def get_serializer_class(self):
+        # 作成直後の問題には項目分析がないため、作成は項目分析なしで返す
+        if self.request.method == 'POST':
+            return QuestionSerializer
+        return AdminQuestionSerializer
+    
     def get_queryset(self):
-        queryset = Question.objects.all().order_by('-created_at')
+        queryset = Question.objects.select_related('genre', 'author_user', 'stats').prefetch_related('choices').order_by('-created_at')
         
         # フィルタリング
         genre = self.request.query_params.get('genre')
@@ -91,6 +114,17 @@ class AdminQuestionListCreateView(generics.ListCreateAPIView):
         if reviewed_at__isnull is not None:
             queryset = queryset.filter(reviewed_at__isnull=reviewed_at__isnull.lower() == 'true')
         
+        # 項目分析での並び替え・絞り込み
+        ordering = QUESTION_STATS_ORDERINGS.get(self.request.query_params.get('ordering'))
+        if ordering:
+            queryset = queryset.filter(stats__isnull=False).order_by(*ordering)
+            if ordering[0] == 'stats__discrimination':
+                queryset = queryset.filter(stats__discrimination__isnull=False)
+        
+        stats_min_attempts = self.request.query_params.get('stats_min_attempts')
+        if stats_min_attempts and stats_min_attempts.isdigit():
+            queryset = queryset.filter(stats__attempts__gte=int(stats_min_attempts))
+        
         return queryset
     
     def perform_create(self, serializer):
@@ -100,6 +134,7 @@ class AdminQuestionListCreateView(generics.ListCreateAPIView):
             question_id = Question.generate_next_id()
         else:
             question_id = serializer.validated_data.get('id')
+            Question.sync_id_sequence([question_id])
         
         # 選択肢データを取得
         choices_data = self.request.data.get('choices', [])
@@ -107,45 +142,109 @@ class AdminQuestionListCreateView(generics.ListCreateAPIView):
         # 問題を保存（選択肢は後で保存）
         question = serializer.save(id=question_id, author_user=self.request.user)
         
-        # 選択肢を保存
-        for choice_data in choices_data:
-            Choice.objects.create(
-                id=Choice.generate_next_id(),
+        # 選択肢を保存（IDはまとめて予約）
+        choice_ids = Choice.generate_next_ids(len(choices_data))
+        Choice.objects.bulk_create([
+            Choice(
+                id=choice_id,
                 question=question,
                 content=choice_data.get('content', ''),
                 is_correct=choice_data.get('is_correct', False),
                 order_index=choice_data.get('order_index', 0)
             )
+            for choice_id, choice_data in zip(choice_ids, choices_data)
+        ])
+
+
+def sync_question_choices(question, choices_data):
+    """
+    選択肢を既存行との差分で更新する
+    - IDが一致する選択肢は内容が変わった場合のみ更新
+    - IDのない選択肢（CSVインポートなど）は内容が同じ未使用の既存選択肢に対応付ける
+    - 対応する既存選択肢がなければ新しいIDで作成
+    - 送信されなかった既存選択肢は取り除く（回答履歴から参照されていれば無効化して残す）
+    既存の選択肢を並び順などで別の内容に書き換えないことで、回答履歴（UserAttempt）の選択内容・正誤を保つ
+    """
+    existing_choices = list(question.choices.order_by('order_index', 'id'))
+    existing_by_id = {choice.id: choice for choice in existing_choices}
+    
+    # IDで対応付け
+    used_ids = set()
+    pairs = []
+    for choice_data in choices_data:
+        choice = existing_by_id.get(choice_data.get('id'))
+        if choice is not None and choice.id not in used_ids:
+            used_ids.add(choice.id)
+        else:
+            choice = None
+        pairs.append([choice, choice_data])
+    
+    # IDのない選択肢は内容が同じ既存選択肢に対応付ける（内容の異なる選択肢は書き換えない）
+    for pair in pairs:
+        if pair[0] is None and not pair[1].get('id'):
+            content = pair[1].get('content', '')
+            pair[0] = next(
+                (choice for choice in existing_choices if choice.id not in used_ids and choice.content == content),
+                None,
+            )
+            if pair[0] is not None:
+                used_ids.add(pair[0].id)
+    
+    fields = ['content', 'is_correct', 'order_index']
+    choices_to_update = []
+    choices_to_create = []
+    for choice, choice_data in pairs:
+        values = {
+            'content': choice_data.get('content', ''),
+            'is_correct': choice_data.get('is_correct', False),
+            'order_index': choice_data.get('order_index', 0),
+        }
+        if choice is None:
+            choices_to_create.append(values)
+            continue
+        if any(getattr(choice, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(choice, field, value)
+            choices_to_update.append(choice)
+    
+    removed_ids = [choice.id for choice in existing_choices if choice.id not in used_ids]
+    deactivated, deleted = 0, 0
+    if removed_ids:
+        deactivated, deleted = Choice.objects.filter(id__in=removed_ids).retire()
+    if choices_to_update:
+        Choice.objects.bulk_update(choices_to_update, fields)
+    if choices_to_create:
+        choice_ids = Choice.generate_next_ids(len(choices_to_create))
+        Choice.objects.bulk_create([
+            Choice(id=choice_id, question=question, **values)
+            for choice_id, values in zip(choice_ids, choices_to_create)
+        ])
+    
+    return {
+        'updated': len(choices_to_update),
+        'created': len(choices_to_create),
+        'deactivated': deactivated,
+        'deleted': deleted,
+    }
 
 
 class AdminQuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     管理者用問題詳細・更新・削除API
     """
-    queryset = Question.objects.all()
-    serializer_class = QuestionSerializer
+    queryset = Question.objects.select_related('genre', 'author_user', 'stats').prefetch_related('choices')
+    serializer_class = AdminQuestionSerializer
     permission_classes = [IsAdminUser]
     
     def perform_update(self, serializer):
-        """問題更新時に選択肢も更新"""
-        # 選択肢データを取得
-        choices_data = self.request.data.get('choices', [])
-        
-        # 問題を保存
-        question = serializer.save(modified_user=self.request.user)
-        
-        # 既存の選択肢を削除
-        question.choices.all().delete()
-        
-        # 新しい選択肢を保存
-        for choice_data in choices_data:
-            Choice.objects.create(
-                id=Choice.generate_next_id(),
-                question=question,
-                content=choice_data.get('content', ''),
-                is_correct=choice_data.get('is_correct', False),
-                order_index=choice_data.get('order_index', 0)
-            )
+        """問題更新時に選択肢も差分更新"""
+        with transaction.atomic():
+            # 問題を保存
+            question = serializer.save(modified_user=self.request.user)
+            
+            # 選択肢が送信された場合のみ更新（PATCHで省略された場合は変更しない）
+            if 'choices' in self.request.data:
+                sync_question_choices(question, self.request.data.get('choices') or [])
 
 
 class AdminUserListView(generics.ListAPIView):
@@ -189,25 +288,75 @@ class AdminUserDetailView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAdminUser]
 
 
-class AdminStatsView(APIView):
+class AdminUserBulkProvisionView(APIView):
+    """
+    管理者用ユーザー一括登録API
+    CSVファイル（file）またはJSON（rows: [{username, email, display_name, department, role, password}]）を受け付ける
+    password を省略した行には自動生成したパスワードを返す
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def post(self, request):
+        try:
+            if 'file' in request.FILES:
+                csv_file = request.FILES['file']
+                if not csv_file.name.endswith('.csv'):
+                    return Response(
+                        {'error': 'CSVファイルを選択してください'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                rows = parse_provisioning_csv(csv_file.read().decode('utf-8-sig'))  # BOM対応
+            elif isinstance(request.data.get('rows'), list):
+                rows = list(enumerate(request.data['rows'], start=1))
+                invalid = [row_number for row_number, row in rows if not isinstance(row, dict)]
+                if invalid:
+                    return Response(
+                        {'error': f'rowsの各要素はオブジェクトで指定してください（{", ".join(map(str, invalid[:10]))}行目）'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            else:
+                return Response(
+                    {'error': 'CSVファイルまたはrowsが必要です'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response(
+                {'error': f'CSVファイルの処理中にエラーが発生しました: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            validate_row_count(rows, settings.USER_PROVISIONING_MAX_ROWS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = str(request.data.get('dry_run', 'false')).lower() == 'true'
+        # リクエストのワーカー内ではプロセスプールを使わない（gevent のワーカーで fork しない）
+        summary = provision_users(rows, workers=1, dry_run=dry_run)
+        
+        return Response({
+            'message': 'ユーザー一括登録が完了しました' if not dry_run else 'ユーザー一括登録の検証が完了しました',
+            'summary': summary
+        })
+
+
+class AdminStatsView(ReplicaReadMixin, APIView):
     """
     管理者用統計情報取得API
     """
     permission_classes = [IsAdminUser]
     
     def get(self, request):
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        total_questions = Question.objects.count()
-        active_questions = Question.objects.filter(is_active=True).count()
-        total_genres = Genre.objects.count()
+        # 件数はカウンターテーブルから1回の検索で取得
+        counters = StatCounter.snapshot()
         
         return Response({
-            'total_users': total_users,
-            'active_users': active_users,
-            'total_questions': total_questions,
-            'active_questions': active_questions,
-            'total_genres': total_genres,
+            'total_users': counters['users_total'],
+            'active_users': counters['users_active'],
+            'total_questions': counters['questions_total'],
+            'active_questions': counters['questions_active'],
+            'total_genres': counters['genres_total'],
         })
 
 
@@ -229,11 +378,16 @@ class AdminQuestionBulkActionView(APIView):
         
         questions = Question.objects.filter(id__in=question_ids)
         
+        # update()はシグナルを発行しないため、変化した件数をカウンターに反映し、問題パックの作り直しを予約する
         if action == 'activate':
-            questions.update(is_active=True)
+            changed = questions.filter(is_active=False).update(is_active=True)
+            StatCounter.apply({'questions_active': changed})
+            schedule_pack_rebuild(questions.values_list('genre_id', flat=True).distinct())
             message = f'{questions.count()}件の問題を有効化しました'
         elif action == 'deactivate':
-            questions.update(is_active=False)
+            changed = questions.filter(is_active=True).update(is_active=False)
+            StatCounter.apply({'questions_active': -changed})
+            schedule_pack_rebuild(questions.values_list('genre_id', flat=True).distinct())
             message = f'{questions.count()}件の問題を無効化しました'
         elif action == 'delete':
             count = questions.count()
@@ -301,6 +455,11 @@ class AdminQuestionBulkUpdateView(APIView):
         
         # 一括更新を実行
         if update_data:
+            # update()はシグナルを発行しないため、問題パックの作り直しを予約する（ジャンルの変更時は移動元も）
+            if 'genre' in update_data:
+                schedule_pack_rebuild(set(questions.values_list('genre_id', flat=True)) | {update_data['genre'].id})
+            else:
+                schedule_pack_rebuild(questions.values_list('genre_id', flat=True).distinct())
             updated_count = questions.update(**update_data)
             
             # 更新されたフィールドの説明を作成
@@ -322,7 +481,7 @@ class AdminQuestionBulkUpdateView(APIView):
         return Response({'message': message})
 
 
-class AdminUserProgressView(APIView):
+class AdminUserProgressView(ReplicaReadMixin, APIView):
     """
     管理者用ユーザー学習進捗取得API
     """
@@ -339,9 +498,15 @@ class AdminUserProgressView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # 基本統計
-            total_attempts = UserAttempt.objects.filter(user=user).count()
-            correct_attempts = UserAttempt.objects.filter(user=user, is_correct=True).count()
+            # 基本統計（アーカイブ済みの月は集計テーブルから加算）
+            live = UserAttempt.objects.filter(user=user).aggregate(
+                total=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+            )
+            archived = AttemptRollup.objects.filter(user=user).aggregate(
+                total=Sum('attempts'), correct=Sum('correct_attempts')
+            )
+            total_attempts = live['total'] + (archived['total'] or 0)
+            correct_attempts = live['correct'] + (archived['correct'] or 0)
             accuracy_rate = round((correct_attempts / total_attempts * 100), 1) if total_attempts > 0 else 0
             
             # セッション統計
@@ -397,19 +562,36 @@ class AdminUserProgressView(APIView):
                 'recent_activity': recent_activity,
             })
         else:
-            # 全ユーザーの進捗サマリー
+            # 全ユーザーの進捗サマリー（回答・セッションはユーザー別に1回ずつ集計）
+            attempt_stats = {
+                row['user']: row
+                for row in UserAttempt.objects.values('user').annotate(
+                    total=Count('id'),
+                    correct=Count('id', filter=Q(is_correct=True)),
+                    last_activity=Max('attempt_time'),
+                ).order_by()
+            }
+            # アーカイブ済みの月の回答数を加算する
+            for user_id, archived in AttemptRollup.objects.totals_by_user().items():
+                stats = attempt_stats.setdefault(user_id, {'total': 0, 'correct': 0, 'last_activity': None})
+                stats['total'] += archived['total']
+                stats['correct'] += archived['correct']
+                if stats['last_activity'] is None:
+                    stats['last_activity'] = archived['last_activity']
+            completed_sessions_by_user = dict(
+                QuizSession.objects.filter(is_completed=True)
+                .values('user').annotate(count=Count('id')).order_by()
+                .values_list('user', 'count')
+            )
+            
             users_with_progress = []
             
             for user in User.objects.filter(is_active=True).order_by('username'):
-                total_attempts = UserAttempt.objects.filter(user=user).count()
-                correct_attempts = UserAttempt.objects.filter(user=user, is_correct=True).count()
+                stats = attempt_stats.get(user.id, {})
+                total_attempts = stats.get('total', 0)
+                correct_attempts = stats.get('correct', 0)
                 accuracy_rate = round((correct_attempts / total_attempts * 100), 1) if total_attempts > 0 else 0
                 
-                completed_sessions = QuizSession.objects.filter(user=user, is_completed=True).count()
-                
-                last_activity = UserAttempt.objects.filter(user=user).order_by('-attempt_time').first()
-                last_activity_date = last_activity.attempt_time if last_activity else None
-                
                 users_with_progress.append({
                     'user_id': user.id,
                     'username': user.username,
@@ -420,8 +602,8 @@ class AdminUserProgressView(APIView):
                     'total_attempts': total_attempts,
                     'correct_attempts': correct_attempts,
                     'accuracy_rate': accuracy_rate,
-                    'completed_sessions': completed_sessions,
-                    'last_activity': last_activity_date,
+                    'completed_sessions': completed_sessions_by_user.get(user.id, 0),
+                    'last_activity': stats.get('last_activity'),
                 })
             
             return Response({
@@ -430,7 +612,7 @@ class AdminUserProgressView(APIView):
             })
 
 
-class AdminUserStatsView(APIView):
+class AdminUserStatsView(ReplicaReadMixin, APIView):
     """
     管理者用ユーザー統計情報API
     """
@@ -442,8 +624,9 @@ class AdminUserStatsView(APIView):
         start_date = timezone.now() - timedelta(days=days)
         
         # 基本統計
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
+        counters = StatCounter.snapshot()
+        total_users = counters['users_total']
+        active_users = counters['users_active']
         
         # 学習活動統計
         active_learners = UserAttempt.objects.filter(
@@ -457,15 +640,22 @@ class AdminUserStatsView(APIView):
         
         overall_accuracy = round((correct_attempts / total_attempts * 100), 1) if total_attempts > 0 else 0
         
-        # ジャンル別統計
+        # ジャンル別統計（ジャンルごとに集計した結果を1回のクエリで取得）
+        attempts_by_genre = {
+            row['question__genre']: row
+            for row in UserAttempt.objects.filter(attempt_time__gte=start_date)
+            .values('question__genre').annotate(
+                total=Count('id'),
+                correct=Count('id', filter=Q(is_correct=True)),
+                unique_users=Count('user', distinct=True),
+            ).order_by()
+        }
+        
         genre_stats = []
         for genre in Genre.objects.all():
-            genre_attempts = UserAttempt.objects.filter(
-                question__genre=genre,
-                attempt_time__gte=start_date
-            )
-            total = genre_attempts.count()
-            correct = genre_attempts.filter(is_correct=True).count()
+            stats = attempts_by_genre.get(genre.id, {})
+            total = stats.get('total', 0)
+            correct = stats.get('correct', 0)
             accuracy = round((correct / total * 100), 1) if total > 0 else 0
             
             genre_stats.append({
@@ -474,29 +664,32 @@ class AdminUserStatsView(APIView):
                 'total_attempts': total,
                 'correct_attempts': correct,
                 'accuracy_rate': accuracy,
-                'unique_users': genre_attempts.values('user').distinct().count()
+                'unique_users': stats.get('unique_users', 0)
             })
         
-        # 日次活動データ（グラフ用）
+        # 日次活動データ（グラフ用）: 日ごとの件数を条件付き集計で1回のクエリにまとめる
+        day_ranges = [
+            (start_date + timedelta(days=i), start_date + timedelta(days=i + 1))
+            for i in range(days)
+        ]
+        daily_counts = {}
+        if day_ranges:
+            aggregates = {}
+            for i, (date, next_date) in enumerate(day_ranges):
+                in_day = Q(attempt_time__gte=date, attempt_time__lt=next_date)
+                aggregates[f'attempts_{i}'] = Count('id', filter=in_day)
+                aggregates[f'users_{i}'] = Count('user', distinct=True, filter=in_day)
+            daily_counts = UserAttempt.objects.filter(
+                attempt_time__gte=day_ranges[0][0],
+                attempt_time__lt=day_ranges[-1][1],
+            ).aggregate(**aggregates)
+        
         daily_activity = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            next_date = date + timedelta(days=1)
-            
-            daily_attempts = UserAttempt.objects.filter(
-                attempt_time__gte=date,
-                attempt_time__lt=next_date
-            ).count()
-            
-            daily_users = UserAttempt.objects.filter(
-                attempt_time__gte=date,
-                attempt_time__lt=next_date
-            ).values('user').distinct().count()
-            
+        for i, (date, next_date) in enumerate(day_ranges):
             daily_activity.append({
                 'date': date.strftime('%Y-%m-%d'),
-                'attempts': daily_attempts,
-                'active_users': daily_users,
+                'attempts': daily_counts[f'attempts_{i}'],
+                'active_users': daily_counts[f'users_{i}'],
             })
         
         return Response({
@@ -512,7 +705,7 @@ class AdminUserStatsView(APIView):
         })
 
 
-class AdminCSVExportView(APIView):
+class AdminCSVExportView(ReplicaReadMixin, APIView):
     """
     管理者用CSVエクスポートAPI
     """
@@ -559,8 +752,8 @@ class AdminCSVExportView(APIView):
         questions = Question.objects.select_related('genre', 'author_user').prefetch_related('choices').all()
         
         for question in questions:
-            # 選択肢を順序順で取得
-            choices = list(question.choices.order_by('order_index'))
+            # 選択肢を順序順で取得（Choice の既定の並び順。prefetch 済みのため追加のクエリなし）
+            choices = list(question.choices.all())
             
             # 最大5つの選択肢をサポート
             choice_data = []
@@ -590,6 +783,37 @@ class AdminCSVExportView(APIView):
         return response
 
 
+class AdminAnalyticsExportView(APIView):
+    """
+    管理者用分析データエクスポートAPI（NDJSON / Parquet）
+    クエリパラメータ:
+    - dataset: questions, choices, attempts, sessions
+    - file_format: ndjson（デフォルト）, parquet（format はDRFのレンダラー指定と衝突するため別名）
+    - since: この日時以降のデータのみ（ISO 8601、増分エクスポート用）
+    レスポンスヘッダー X-Export-Until の値を次回の since に指定する
+    （until は現在時刻から ANALYTICS_EXPORT_SAFETY_LAG_SECONDS 秒前。
+    遅延のあるレプリカから読むと until 以前の行が漏れるため、プライマリから読む）
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        dataset = request.query_params.get('dataset', 'attempts')
+        export_format = request.query_params.get('file_format', 'ndjson')
+        
+        try:
+            since = parse_watermark(request.query_params.get('since'))
+            until = export_until()
+            chunks = iter_export(dataset, export_format, since=since, until=until)
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        content_type = 'application/x-ndjson; charset=utf-8' if export_format == 'ndjson' else 'application/vnd.apache.parquet'
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, export_format, until)}"'
+        response['X-Export-Until'] = until.isoformat()
+        return response
+
+
 class AdminDebugDataView(APIView):
     """
     デバッグ用：データベースの実際の値を確認
@@ -611,7 +835,7 @@ class AdminDebugDataView(APIView):
                 'title_type': type(q.title).__name__,
                 'body_type': type(q.body).__name__,
                 'difficulty': q.difficulty,
-                'genre_id': q.genre.id if q.genre else None,
+                'genre_id': q.genre_id,
             })
         
         return Response({
@@ -776,26 +1000,25 @@ class AdminCSVImportView(APIView):
                         }
                     )
                     
-                    # 既存の選択肢を削除
-                    question.choices.all().delete()
+                    if created and not is_new:
+                        Question.sync_id_sequence([question_id])
                     
                     # 選択肢を作成（最大5つ）
-                    choice_index = 0
+                    choices_data = []
                     for i in range(5):
                         choice_content_idx = 8 + (i * 2)
                         choice_correct_idx = 9 + (i * 2)
                         
                         if choice_content_idx < len(row) and row[choice_content_idx].strip():
                             is_correct = row[choice_correct_idx].strip().lower() in ['true', '1', 'yes'] if choice_correct_idx < len(row) else False
-                            
-                            Choice.objects.create(
-                                id=Choice.generate_next_id(),
-                                question=question,
-                                content=row[choice_content_idx].strip(),
-                                is_correct=is_correct,
-                                order_index=choice_index
-                            )
-                            choice_index += 1
+                            choices_data.append({
+                                'content': row[choice_content_idx].strip(),
+                                'is_correct': is_correct,
+                                'order_index': len(choices_data),
+                            })
+                    
+                    # 既存の選択肢とは差分で更新（回答履歴を残す）
+                    sync_question_choices(question, choices_data)
                     
                     import_summary['success_count'] += 1
                     
@@ -0,0 +1,255 @@
+"""
+分析用データエクスポート（NDJSON / Parquet）
+
+各データセットをサーバーサイドカーソルでチャンク単位に読み出し、
+テーブル全体をメモリに載せずに書き出す。
+since/until のウォーターマークで増分エクスポートに対応する
+（until は排他的。次回は今回の until を since に指定する）。
+
+ウォーターマークの日時は行を書き込んだ時点の値で、コミットの順序とは一致しない。
+エクスポート中に未コミットのトランザクションが until より前の日時の行を後からコミットすると、
+次回の since より前になり出力されなくなる。そのため until は現在時刻から
+ANALYTICS_EXPORT_SAFETY_LAG_SECONDS 秒（既定 300）前にする（export_until()）。
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Question, Choice
+from progress.models import UserAttempt, QuizSession
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# データセット定義: (フィールド名, 型) の一覧とウォーターマークに使う日時フィールド
+EXPORT_DATASETS = {
+    'questions': {
+        'model': Question,
+        'watermark': 'updated_at',
+        'fields': [
+            ('id', 'string'),
+            ('genre_id', 'string'),
+            ('difficulty', 'int'),
+            ('title', 'string'),
+            ('body', 'string'),
+            ('clarification', 'string'),
+            ('author_user_id', 'int'),
+            ('modified_user_id', 'int'),
+            ('created_at', 'timestamp'),
+            ('updated_at', 'timestamp'),
+            ('reviewed_at', 'timestamp'),
+            ('is_active', 'bool'),
+        ],
+    },
+    'choices': {
+        'model': Choice,
+        # 選択肢の編集時は問題も保存されるため、問題の更新日時で増分を判定する
+        'watermark': 'question__updated_at',
+        'fields': [
+            ('id', 'string'),
+            ('question_id', 'string'),
+            ('content', 'string'),
+            ('is_correct', 'bool'),
+            ('order_index', 'int'),
+            ('is_active', 'bool'),
+            ('created_at', 'timestamp'),
+        ],
+        # 回答履歴が参照する無効化した選択肢も含める
+        'manager': 'all_objects',
+    },
+    'attempts': {
+        'model': UserAttempt,
+        'watermark': 'attempt_time',
+        'fields': [
+            ('id', 'int'),
+            ('user_id', 'int'),
+            ('question_id', 'string'),
+            ('selected_choice_id', 'string'),
+            ('is_correct', 'bool'),
+            ('attempt_time', 'timestamp'),
+            ('response_time_seconds', 'int'),
+        ],
+    },
+    'sessions': {
+        'model': QuizSession,
+        # サーバーで出題したセッションは開始後に採点結果が書き込まれるため、更新日時で増分を判定する
+        'watermark': 'updated_at',
+        'fields': [
+            ('id', 'int'),
+            ('user_id', 'int'),
+            ('session_type', 'string'),
+            ('genre_id', 'string'),
+            ('difficulty', 'int'),
+            ('total_questions', 'int'),
+            ('correct_answers', 'int'),
+            ('start_time', 'timestamp'),
+            ('end_time', 'timestamp'),
+            ('is_completed', 'bool'),
+            ('updated_at', 'timestamp'),
+        ],
+    },
+}
+
+EXPORT_FORMATS = ['ndjson', 'parquet']
+
+
+class ExportError(Exception):
+    """エクスポート条件が不正な場合のエラー"""
+
+
+def parse_watermark(value):
+    """ISO 8601 形式のウォーターマークを aware な datetime に変換する"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ExportError(f'日時の形式が不正です: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_until():
+    """増分エクスポートの until（現在時刻から ANALYTICS_EXPORT_SAFETY_LAG_SECONDS 秒前）"""
+    return timezone.now() - timedelta(seconds=settings.ANALYTICS_EXPORT_SAFETY_LAG_SECONDS)
+
+
+def get_dataset(name):
+    try:
+        return EXPORT_DATASETS[name]
+    except KeyError:
+        raise ExportError(f'不明なデータセットです: {name}（{", ".join(EXPORT_DATASETS)}）')
+
+
+def iter_rows(name, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE, using=None):
+    """
+    データセットの行をチャンク（タプルのリスト）単位で返す
+    PostgreSQL では iterator() がサーバーサイドカーソルを使用する
+    using を指定した場合はそのDBから読む（省略時はDBルーターに従う）
+    """
+    dataset = get_dataset(name)
+    watermark = dataset['watermark']
+    field_names = [field for field, _ in dataset['fields']]
+
+    queryset = getattr(dataset['model'], dataset.get('manager', 'objects')).all()
+    if using:
+        queryset = queryset.using(using)
+    if since:
+        queryset = queryset.filter(**{f'{watermark}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{watermark}__lt': until})
+
+    # 並び替えは不要（ソートのコストを避ける）
+    rows = queryset.order_by().values_list(*field_names).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_ndjson(name, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """NDJSON をチャンク単位のバイト列で返す（StreamingHttpResponse 用）"""
+    field_names = [field for field, _ in get_dataset(name)['fields']]
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    for chunk in iter_rows(name, since, until, chunk_size):
+        lines = [encoder.encode(dict(zip(field_names, row))) for row in chunk]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _arrow_schema(name):
+    import pyarrow as pa
+
+    arrow_types = {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(field, arrow_types[field_type]) for field, field_type in get_dataset(name)['fields']])
+
+
+class _ChunkSink:
+    """ParquetWriter の書き込み先。書き込まれたバイト列を取り出せるようにする"""
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.buffer.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def iter_parquet(name, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE, compression='snappy', using=None):
+    """
+    Parquet をチャンク（行グループ）単位のバイト列で返す
+    pyarrow が必要
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ExportError('Parquet 形式のエクスポートには pyarrow が必要です')
+
+    return _iter_parquet(name, since, until, chunk_size, compression, using)
+
+
+def _iter_parquet(name, since, until, chunk_size, compression, using=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(name)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for chunk in iter_rows(name, since, until, chunk_size, using=using):
+            columns = list(zip(*chunk))
+            table = pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(name, export_format, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    get_dataset(name)
+    if export_format == 'ndjson':
+        return iter_ndjson(name, since, until, chunk_size)
+    if export_format == 'parquet':
+        return iter_parquet(name, since, until, chunk_size)
+    raise ExportError(f'不明な形式です: {export_format}（{", ".join(EXPORT_FORMATS)}）')
+
+
+def export_filename(name, export_format, until):
+    return f'{name}_{until.strftime("%Y%m%dT%H%M%S")}.{export_format}'
@@ -0,0 +1,239 @@
+"""
+読み取り中心のクイズAPIの非同期版（ASGI用）
+
+DRF 3.14 の APIView は非同期ハンドラーに対応していないため、Django の View を
+ベースに認証・JSON応答・ページネーションを最小限で実装し、非同期ORMと
+非同期キャッシュAPIを使う。レスポンスの形式は同期版（questions.views）と同じ。
+
+ASYNC_QUIZ_VIEWS = True のときに questions.urls で同期版の代わりに使われる。
+WSGI で動かすとリクエストごとにイベントループが作られ遅くなるため、
+uvicorn ワーカー（elearning.asgi）で動かす場合のみ有効にする。
+"""
+
+import json
+import random
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from accounts.authentication import CachedJWTAuthentication
+from .models import Genre, Question, Choice
+from .serializers import GenreSerializer, QuestionSerializer, QuestionWithoutAnswerSerializer
+
+
+# REST_FRAMEWORK の DEFAULT_RENDERER_CLASSES の先頭（同期版の APIView が使うレンダラー）
+_renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+
+def api_response(data, status=200, headers=None):
+    """同期版と同じ既定のレンダラー（ORJSONRenderer / JSONRenderer）の形式で返す"""
+    return HttpResponse(
+        _renderer.render(data),
+        status=status,
+        content_type='application/json',
+        headers=headers,
+    )
+
+
+class AsyncAPIView(View):
+    """
+    非同期ビューの基底クラス
+    - authentication_required: JWT認証を必須にするか（IsAuthenticated 相当）
+    - APIException は DRF と同じ形式のエラーレスポンスに変換する
+    """
+    authentication_required = False
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # DRF の APIView と同様にCSRFチェックを除外する（JWT認証のため）
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return api_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status=405,
+                headers={'Allow': ', '.join(self._allowed_methods())},
+            )
+
+        try:
+            await self.perform_authentication(request)
+            return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    async def perform_authentication(self, request):
+        authenticator = CachedJWTAuthentication()
+        try:
+            result = await authenticator.aauthenticate(request)
+        except APIException:
+            if self.authentication_required:
+                raise
+            # AllowAny のビューでは不正なトークンを未認証として扱う
+            result = None
+
+        if result is not None:
+            request.user, request.auth = result
+        elif self.authentication_required:
+            raise NotAuthenticated()
+
+    def handle_exception(self, exc):
+        headers = {}
+        if exc.status_code == 401:
+            headers['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(self.request)
+        data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+        return api_response(data, status=exc.status_code, headers=headers)
+
+
+class AsyncGenreListView(AsyncAPIView):
+    """
+    ジャンル一覧を取得するAPI（非同期版）
+    問題数は集計クエリで取得し、ジャンルごとのCOUNTクエリを発行しない
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+
+    async def get(self, request):
+        queryset = Genre.objects.with_question_count().order_by('id')
+
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+
+        count = await queryset.acount()
+        page_count = max(1, -(-count // self.page_size))
+        if page < 1 or page > page_count:
+            raise NotFound(PageNumberPagination.invalid_page_message)
+
+        offset = (page - 1) * self.page_size
+        genres = [genre async for genre in queryset[offset:offset + self.page_size]]
+
+        url = request.build_absolute_uri()
+        if page < page_count:
+            next_url = replace_query_param(url, 'page', page + 1)
+        else:
+            next_url = None
+        if page == 1:
+            previous_url = None
+        elif page == 2:
+            previous_url = remove_query_param(url, 'page')
+        else:
+            previous_url = replace_query_param(url, 'page', page - 1)
+
+        return api_response({
+            'count': count,
+            'next': next_url,
+            'previous': previous_url,
+            'results': GenreSerializer(genres, many=True).data,
+        })
+
+
+class AsyncRandomQuestionsView(AsyncAPIView):
+    """
+    ランダムな問題を取得するAPI（非同期版）
+    クエリパラメータは RandomQuestionsView と同じ
+    """
+
+    async def get(self, request):
+        genre_id = request.GET.get('genre', None)
+        count = int(request.GET.get('count', 10))
+        difficulty = request.GET.get('difficulty', None)
+        hide_answers = request.GET.get('hide_answers', 'false').lower() == 'true'
+
+        queryset = Question.objects.filter(is_active=True).select_related('genre', 'author_user').prefetch_related('choices')
+
+        if genre_id:
+            queryset = queryset.filter(genre_id=genre_id)
+
+        if difficulty:
+            queryset = queryset.filter(difficulty=difficulty)
+
+        question_ids = [question_id async for question_id in queryset.values_list('id', flat=True)]
+
+        if len(question_ids) <= count:
+            selected_ids = question_ids
+        else:
+            selected_ids = random.sample(question_ids, count)
+
+        # async for でもクエリセット評価時に prefetch_related が実行される
+        questions = [question async for question in queryset.filter(id__in=selected_ids)]
+
+        if hide_answers:
+            serializer = QuestionWithoutAnswerSerializer(questions, many=True)
+        else:
+            serializer = QuestionSerializer(questions, many=True)
+
+        return api_response({
+            'count': len(serializer.data),
+            'questions': serializer.data
+        })
+
+
+class AsyncQuestionDetailView(AsyncAPIView):
+    """
+    特定の問題の詳細を取得するAPI（非同期版）
+    """
+    authentication_required = True
+
+    async def get(self, request, id):
+        queryset = Question.objects.filter(is_active=True).select_related('genre', 'author_user').prefetch_related('choices')
+        try:
+            question = await queryset.aget(id=id)
+        except Question.DoesNotExist:
+            raise NotFound()
+
+        return api_response(QuestionSerializer(question).data)
+
+
+class AsyncCheckAnswerView(AsyncAPIView):
+    """
+    問題の解答をチェックするAPI（非同期版）
+    選択肢は1回のクエリでまとめて取得し、選択した選択肢と正解をそこから判定する
+    """
+    authentication_required = True
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        except ValueError as e:
+            return api_response({'detail': f'JSON parse error - {e}'}, status=400)
+
+        question_id = data.get('question_id')
+        choice_id = data.get('choice_id')
+
+        if not question_id or not choice_id:
+            return api_response({
+                'error': '問題IDと選択肢IDが必要です'
+            }, status=400)
+
+        try:
+            question = await Question.objects.only('id', 'clarification').aget(id=question_id, is_active=True)
+        except Question.DoesNotExist:
+            return api_response({
+                'error': '問題が見つかりません'
+            }, status=404)
+
+        choices = [
+            choice async for choice in Choice.objects.filter(question_id=question.id).values_list('id', 'is_correct')
+        ]
+        selected = [is_correct for pk, is_correct in choices if pk == choice_id]
+        if not selected:
+            return api_response({
+                'error': '選択肢が見つかりません'
+            }, status=404)
+
+        is_correct = selected[0]
+
+        return api_response({
+            'is_correct': is_correct,
+            'correct_choice_ids': [pk for pk, correct in choices if correct],
+            'clarification': question.clarification if is_correct or data.get('show_clarification', False) else None
+        })
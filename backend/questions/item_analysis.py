@@ -0,0 +1,244 @@
+"""
+問題の項目分析（古典的テスト理論の項目統計）
+
+回答履歴（UserAttempt）をサーバーサイドカーソルでチャンク単位に読み出し、NumPy / pandas で
+問題ごとの集計値（和）を加算して、最後に次の値を求めて QuestionStats に保存する。
+- p_value: 正答率
+- discrimination: 点双列相関。正誤（0/1）と、受講者のその回答以外の正答率（rest score）のピアソン相関。
+  受講者ごとに解いた問題が異なるため、テストの合計点の代わりに受講者の正答率を使う。
+  和（n, Σx, Σy, Σxy, Σy²）だけで求められるため、チャンクごとに加算できる
+- choice_rates / top_distractor: 選択肢ごとの選択率と、最も選ばれた誤答
+- median_response_time: 回答時間の中央値。回答時間は整数（秒）のため、問題 × 秒 の件数を加算して正確に求める
+
+回答履歴の全行をメモリに載せず、メモリ使用量は（問題数 × 選択肢・回答時間の種類）に比例する。
+アーカイブ済みの月（AttemptRollup）は回答ごとのデータがないため対象外（直近の回答履歴の統計になる）。
+"""
+
+import numpy as np
+import pandas as pd
+from django.db import connections, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from progress.models import UserAttempt
+
+from .models import Choice, QuestionStats
+
+DEFAULT_CHUNK_SIZE = 50000
+# 何チャンクごとに部分的な集計をまとめるか（メモリ使用量を抑える）
+CONSOLIDATE_EVERY = 20
+WRITE_BATCH_SIZE = 2000
+
+ATTEMPT_COLUMNS = ['question_id', 'user_id', 'selected_choice_id', 'is_correct', 'response_time_seconds']
+MOMENT_COLUMNS = ['n', 'correct', 'm', 'sx', 'sy', 'sxy', 'syy']
+STATS_FIELDS = [
+    'attempts', 'correct_attempts', 'p_value', 'discrimination', 'choice_rates',
+    'top_distractor', 'top_distractor_rate', 'median_response_time', 'computed_at',
+]
+
+
+class UserTotals:
+    """受講者ごとの回答数・正解数（user_id の昇順の配列。searchsorted で引く）"""
+
+    def __init__(self, max_id):
+        rows = (
+            UserAttempt.objects.filter(id__lte=max_id)
+            .values('user_id')
+            .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+            .order_by('user_id')
+            .values_list('user_id', 'total', 'correct')
+        )
+        data = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+        self.user_ids, self.totals, self.corrects = data[:, 0], data[:, 1], data[:, 2]
+
+    def lookup(self, user_ids):
+        """受講者の (回答数, 正解数)。集計にない受講者は 0"""
+        if len(self.user_ids) == 0:
+            zeros = np.zeros(len(user_ids), dtype=np.int64)
+            return zeros, zeros
+        positions = np.clip(np.searchsorted(self.user_ids, user_ids), 0, len(self.user_ids) - 1)
+        known = self.user_ids[positions] == user_ids
+        return np.where(known, self.totals[positions], 0), np.where(known, self.corrects[positions], 0)
+
+
+def iter_attempt_chunks(max_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    回答履歴を DataFrame のチャンク単位で返す（PostgreSQL ではサーバーサイドカーソル）
+    行ごとの変換を省くため、QuerySet の SQL をカーソルで直接実行して fetchmany の結果から DataFrame を作る
+    """
+    queryset = UserAttempt.objects.filter(id__lte=max_id).order_by().values_list(*ATTEMPT_COLUMNS)
+    sql, params = queryset.query.sql_with_params()
+    connection = connections[queryset.db]
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=ATTEMPT_COLUMNS)
+
+
+def chunk_partials(frame, user_totals):
+    """
+    1チャンクの部分集計 (問題ごとの和, 問題 × 選択肢の件数, 問題 × 回答時間の件数)
+    rest score は回答数が2以上の受講者のみ（m は rest score のある回答数）
+    """
+    x = frame['is_correct'].to_numpy(dtype=np.float64)
+    totals, corrects = user_totals.lookup(frame['user_id'].to_numpy(dtype=np.int64))
+    valid = totals > 1
+    m = valid.astype(np.float64)
+    y = np.where(valid, (corrects - x) / np.maximum(totals - 1, 1), 0.0)
+
+    moments = pd.DataFrame({
+        'question_id': frame['question_id'].to_numpy(),
+        'n': 1.0,
+        'correct': x,
+        'm': m,
+        'sx': x * m,
+        'sy': y,
+        'sxy': x * y,
+        'syy': y * y,
+    }).groupby('question_id', sort=False).sum()
+
+    choices = frame.groupby(['question_id', 'selected_choice_id'], sort=False).size()
+
+    response_times = pd.to_numeric(frame['response_time_seconds'], errors='coerce')
+    timed = response_times.notna()
+    response_time_counts = pd.DataFrame({
+        'question_id': frame['question_id'][timed].to_numpy(),
+        'seconds': response_times[timed].to_numpy(dtype=np.int64),
+    }).groupby(['question_id', 'seconds'], sort=False).size()
+    return moments, choices, response_time_counts
+
+
+def _consolidate(partials):
+    """部分集計のリストを1つにまとめる（インデックスごとの和）"""
+    if not partials:
+        return None
+    combined = pd.concat(partials)
+    return combined.groupby(level=list(range(combined.index.nlevels)), sort=False).sum()
+
+
+class ItemAccumulator:
+    """チャンクごとの部分集計を加算する"""
+
+    def __init__(self):
+        self.partials = ([], [], [])
+
+    def add(self, frame, user_totals):
+        for partial_list, partial in zip(self.partials, chunk_partials(frame, user_totals)):
+            partial_list.append(partial)
+            if len(partial_list) >= CONSOLIDATE_EVERY:
+                partial_list[:] = [_consolidate(partial_list)]
+
+    def result(self):
+        return tuple(_consolidate(partial_list) for partial_list in self.partials)
+
+
+def point_biserial(moments):
+    """
+    問題ごとの点双列相関（分母が0の問題は NaN）
+    x は 0/1 のため Σx² = Σx
+    """
+    m, sx, sy, sxy, syy = (moments[column].to_numpy() for column in ['m', 'sx', 'sy', 'sxy', 'syy'])
+    numerator = m * sxy - sx * sy
+    denominator_squared = (m * sx - sx * sx) * (m * syy - sy * sy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = numerator / np.sqrt(denominator_squared)
+    r[~(denominator_squared > 1e-12)] = np.nan
+    return pd.Series(np.clip(r, -1.0, 1.0), index=moments.index)
+
+
+def median_response_times(response_time_counts):
+    """問題 × 秒 の件数から問題ごとの回答時間の中央値を求める（件数が偶数なら中央の2つの平均）"""
+    if response_time_counts is None or response_time_counts.empty:
+        return pd.Series(dtype=np.float64)
+    counts = response_time_counts.rename('count').reset_index().sort_values(['question_id', 'seconds'])
+    grouped = counts.groupby('question_id', sort=False)['count']
+    cumulative = grouped.cumsum()
+    total = grouped.transform('sum')
+
+    def value_at(position):
+        # 累積件数が position 以上になる最初の秒
+        return counts[cumulative >= position].groupby('question_id', sort=False)['seconds'].first()
+
+    lower = value_at((total + 1) // 2)
+    upper = value_at(total // 2 + 1)
+    return (lower + upper) / 2
+
+
+def compute_item_stats(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    回答履歴から問題ごとの項目統計を求め、保存前の QuestionStats のリストを返す
+    集計中に追加された回答は対象外（開始時点の最大IDまで）
+    """
+    max_id = UserAttempt.objects.aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        return []
+
+    user_totals = UserTotals(max_id)
+    accumulator = ItemAccumulator()
+    for frame in iter_attempt_chunks(max_id, chunk_size):
+        accumulator.add(frame, user_totals)
+    moments, choice_counts, response_time_counts = accumulator.result()
+    if moments is None:
+        return []
+
+    discrimination = point_biserial(moments)
+    medians = median_response_times(response_time_counts)
+
+    question_ids = list(moments.index)
+    choices_by_question = {}
+    for choice_id, question_id, is_correct in Choice.objects.filter(
+        question_id__in=question_ids
+    ).values_list('id', 'question_id', 'is_correct').order_by('question_id', 'order_index', 'id'):
+        choices_by_question.setdefault(question_id, []).append((choice_id, is_correct))
+    counts_by_question = {}
+    for (question_id, choice_id), count in choice_counts.items():
+        counts_by_question.setdefault(question_id, {})[choice_id] = int(count)
+
+    computed_at = timezone.now()
+    stats = []
+    for row in moments.itertuples():
+        question_id = row.Index
+        attempts = int(row.n)
+        counts = counts_by_question.get(question_id, {})
+        choice_rates = {}
+        top_distractor, top_count = '', 0
+        for choice_id, is_correct in choices_by_question.get(question_id, []):
+            count = counts.get(choice_id, 0)
+            choice_rates[choice_id] = round(count / attempts, 4)
+            if not is_correct and count > top_count:
+                top_distractor, top_count = choice_id, count
+
+        r = discrimination.get(question_id)
+        median = medians.get(question_id)
+        stats.append(QuestionStats(
+            question_id=question_id,
+            attempts=attempts,
+            correct_attempts=int(row.correct),
+            p_value=row.correct / attempts,
+            discrimination=None if r is None or np.isnan(r) else float(r),
+            choice_rates=choice_rates,
+            top_distractor=top_distractor,
+            top_distractor_rate=top_count / attempts,
+            median_response_time=None if median is None or np.isnan(median) else float(median),
+            computed_at=computed_at,
+        ))
+    return stats
+
+
+def refresh_question_stats(chunk_size=DEFAULT_CHUNK_SIZE):
+    """項目統計を集計し直して保存し、保存した問題数を返す（回答のなくなった問題の統計は削除する）"""
+    stats = compute_item_stats(chunk_size)
+    with transaction.atomic():
+        QuestionStats.objects.bulk_create(
+            stats, batch_size=WRITE_BATCH_SIZE,
+            update_conflicts=True, unique_fields=['question'],
+            update_fields=STATS_FIELDS,
+        )
+        stale = QuestionStats.objects.all()
+        if stats:
+            stale = stale.filter(computed_at__lt=stats[0].computed_at)
+        stale.delete()
+    return len(stats)
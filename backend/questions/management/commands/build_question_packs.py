@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from questions.question_packs import build_packs, build_pending_packs, get_pack_storage, prune_pack_files
+
+
+class Command(BaseCommand):
+    help = 'Build content-hashed offline question packs (JSON + gzip/brotli) per genre'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--genre',
+            action='append',
+            dest='genres',
+            help='Genre ID to build (repeatable, default: all genres)'
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Build only genres changed since the last run (run every minute from cron)'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete pack files that are neither the current nor the previous pack of a genre'
+        )
+
+    def handle(self, *args, **options):
+        storage = get_pack_storage()
+        started = time.perf_counter()
+        if options['pending']:
+            if options['genres']:
+                raise CommandError('--pending cannot be combined with --genre')
+            results = build_pending_packs(storage)
+        else:
+            results = build_packs(options['genres'], storage)
+
+        for genre_id, pack in results:
+            if pack is None:
+                self.stdout.write(f'{genre_id}: no active questions (pack removed)')
+                continue
+            sizes = f'json={pack.size} gzip={pack.gzip_size}'
+            if pack.brotli_size is not None:
+                sizes += f' br={pack.brotli_size}'
+            self.stdout.write(f'{genre_id}: {pack.name} ({pack.question_count} questions, {sizes} bytes)')
+
+        if options['prune']:
+            removed = prune_pack_files(storage)
+            self.stdout.write(f'Pruned {len(removed)} stale pack files')
+
+        built = sum(1 for _, pack in results if pack is not None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {built} question packs in {time.perf_counter() - started:.1f}s'
+        ))
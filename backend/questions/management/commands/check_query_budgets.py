@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from elearning.query_budgets import run_query_budgets, undeclared_url_names
+
+
+class Command(BaseCommand):
+    help = 'Check that every API endpoint stays within its declared query budget (elearning.query_budgets)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs='+',
+            default=[1, 3],
+            help='Dataset sizes to compare (multiples of the base seed, default: 1 3)'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the test database between runs'
+        )
+
+    def handle(self, *args, **options):
+        undeclared = undeclared_url_names()
+        if undeclared:
+            raise CommandError(
+                'URLs without a query budget in elearning.query_budgets.QUERY_BUDGETS: '
+                + ', '.join(name or '(unnamed)' for name in undeclared)
+            )
+
+        # 実データを変更しないよう、テスト用データベースで計測する
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            results = run_query_budgets(options['scales'])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        failures = 0
+        for result in results:
+            counts = ' '.join(f'{count:>3}' for count in result['counts'].values())
+            line = f'{result["method"]:<6} {result["name"]:<32} budget={result["budget"]:<3} queries={counts}'
+            if result['errors']:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{line}  ' + '; '.join(result['errors'])))
+            else:
+                self.stdout.write(line)
+
+        if failures:
+            raise CommandError(f'{failures} endpoints exceeded their query budget')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} endpoints are within their query budgets'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from questions.item_analysis import DEFAULT_CHUNK_SIZE, refresh_question_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute per-question item statistics (p-value, point-biserial discrimination, '
+        'choice rates, median response time) from UserAttempt and store them in QuestionStats'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Attempts read per chunk'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        started = time.perf_counter()
+        count = refresh_question_stats(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed item statistics for {count} questions in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,90 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from questions.analytics_export import (
+    DEFAULT_CHUNK_SIZE, EXPORT_DATASETS, EXPORT_FORMATS,
+    ExportError, export_filename, export_until, iter_export, parse_watermark
+)
+
+
+class Command(BaseCommand):
+    help = 'Export questions, choices, attempts and sessions as NDJSON or Parquet for analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            choices=list(EXPORT_DATASETS),
+            help='Dataset to export (repeatable, default: all)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=EXPORT_FORMATS,
+            default='parquet',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default='exports',
+            help='Directory to write export files to'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only export rows at or after this ISO 8601 timestamp'
+        )
+        parser.add_argument(
+            '--state-file',
+            type=str,
+            help='JSON file storing the last watermark per dataset for incremental exports'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows fetched per database round trip'
+        )
+
+    def handle(self, *args, **options):
+        datasets = options['dataset'] or list(EXPORT_DATASETS)
+        export_format = options['format']
+        output_dir = options['output_dir']
+        state_file = options['state_file']
+
+        state = {}
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as f:
+                state = json.load(f)
+
+        os.makedirs(output_dir, exist_ok=True)
+        until = export_until()
+
+        for dataset in datasets:
+            try:
+                since = parse_watermark(options['since'] or state.get(dataset))
+                chunks = iter_export(dataset, export_format, since=since, until=until, chunk_size=options['chunk_size'])
+            except ExportError as e:
+                raise CommandError(str(e))
+
+            path = os.path.join(output_dir, export_filename(dataset, export_format, until))
+            start = timezone.now()
+            size = 0
+            with open(path, 'wb') as f:
+                for data in chunks:
+                    f.write(data)
+                    size += len(data)
+            elapsed = (timezone.now() - start).total_seconds()
+
+            state[dataset] = until.isoformat()
+            self.stdout.write(
+                f'{dataset}: {path} ({size / 1024:.1f} KB, {elapsed:.2f}s, since={since.isoformat() if since else "-"})'
+            )
+
+        if state_file:
+            with open(state_file, 'w') as f:
+                json.dump(state, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f'Export completed (next --since: {until.isoformat()})'))
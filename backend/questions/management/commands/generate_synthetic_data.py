@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from questions.synthetic_data import DEFAULT_BATCH_SIZE, SyntheticDataError, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate production-sized synthetic users, questions, quiz sessions and attempts for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Number of students to create')
+        parser.add_argument('--genres', type=int, default=20, help='Number of genres to create')
+        parser.add_argument('--questions', type=int, default=20000, help='Number of questions to create')
+        parser.add_argument('--attempts', type=int, default=1000000, help='Number of attempts to generate')
+        parser.add_argument('--days', type=int, default=365, help='Length of the activity period in days')
+        parser.add_argument(
+            '--end-date',
+            type=str,
+            help='Last day of the activity period (YYYY-MM-DD, default: today). Fix it for reproducible data'
+        )
+        parser.add_argument('--departments', type=int, default=10, help='Number of departments users belong to')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument(
+            '--profile',
+            type=str,
+            help='JSON file overriding the distributions in questions.synthetic_data.DEFAULT_PROFILE'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Attempts generated and written per chunk'
+        )
+        parser.add_argument(
+            '--prefix',
+            type=str,
+            default='synthetic',
+            help='Prefix for generated usernames, emails and genre names'
+        )
+
+    def handle(self, *args, **options):
+        profile = None
+        if options['profile']:
+            try:
+                with open(options['profile'], encoding='utf-8') as f:
+                    profile = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Failed to read profile: {e}')
+
+        end_date = None
+        if options['end_date']:
+            end_date = parse_date(options['end_date'])
+            if end_date is None:
+                raise CommandError(f'Invalid --end-date: {options["end_date"]}')
+
+        try:
+            generator = SyntheticDataGenerator(
+                users=options['users'],
+                genres=options['genres'],
+                questions=options['questions'],
+                attempts=options['attempts'],
+                days=options['days'],
+                departments=options['departments'],
+                seed=options['seed'],
+                profile=profile,
+                end_date=end_date,
+                batch_size=options['batch_size'],
+                prefix=options['prefix'],
+                log=self.stdout.write,
+            )
+            result = generator.generate()
+        except SyntheticDataError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated {result["users"]} users, {result["genres"]} genres, {result["questions"]} questions, '
+                f'{result["sessions"]} sessions and {result["attempts"]} attempts '
+                f'in {result["elapsed_seconds"]}s ({result["attempts_per_minute"]} attempts/min via {result["writer"]})'
+            )
+        )
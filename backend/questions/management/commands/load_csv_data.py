@@ -1,12 +1,38 @@
 # backend/management/commands/load_csv_data.py
 import os
+import time
+
 import pandas as pd
-from django.core.management.base import BaseCommand
-from django.conf import settings
-from questions.models import Genre, Question, Choice
-from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from questions.models import Genre, Question, Choice, StatCounter
+from questions.question_packs import schedule_pack_rebuild
+
+DEFAULT_CHUNK_SIZE = 20000
+BULK_CREATE_BATCH_SIZE = 2000
+
+# 読み込む列（問題テーブル _x と選択肢テーブル _y を結合したCSV）
+CSV_COLUMNS = [
+    'question_id', 'genre_id', 'difficulty', 'body', 'object', 'clarification', 'deleted_x',
+    'id_y', 'content', 'is_answer', 'deleted_y',
+]
+CSV_DTYPES = {
+    'question_id': str, 'genre_id': str, 'id_y': str,
+    'body': str, 'object': str, 'clarification': str, 'content': str,
+}
+
+GENRE_NAMES = {
+    'g02': '基礎知識',
+    'g03': 'ビジネス知識',
+    'g04': 'セールス知識',
+    'g05': 'マーケティング知識',
+    'g06': 'テクニカル知識',
+}
+
+QUESTION_UPDATE_FIELDS = ['genre', 'difficulty', 'title', 'body', 'clarification', 'updated_at']
+# 無効化した選択肢がCSVにあれば有効に戻す
+CHOICE_UPDATE_FIELDS = ['question', 'content', 'is_correct', 'order_index', 'is_active']
 
-User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Load questions and answers from CSV file'
@@ -18,114 +44,184 @@ class Command(BaseCommand):
             default='data/Cleaned_Questions_table___Answers_table______.csv',
             help='Path to CSV file'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='CSV rows read and upserted per transaction'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        
         if not os.path.exists(csv_file):
-            self.stdout.write(
-                self.style.ERROR(f'CSV file not found: {csv_file}')
-            )
-            return
+            raise CommandError(f'CSV file not found: {csv_file}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        # 問題ごとに読み込んだ選択肢の数（チャンクをまたぐ問題の並び順を続きから振る）
+        self.choice_counts = {}
+        self.known_genres = set()
+        self.changed_genres = set()
+        totals = {'rows': 0, 'questions_created': 0, 'questions_updated': 0, 'choices': 0, 'choices_deactivated': 0, 'choices_deleted': 0}
 
+        started = time.perf_counter()
         try:
-            # CSVファイルを読み込み
-            df = pd.read_csv(csv_file)
-            self.stdout.write(f'CSV file loaded: {len(df)} rows')
-            
-            # データの前処理
-            df = df.dropna(subset=['question_id', 'content'])
-            df = df[df['deleted_x'] == 0]  # 削除されていないデータのみ
-            df = df[df['deleted_y'] == 0]
-            
-            # ジャンルの作成
-            self.create_genres(df)
-            
-            # 問題と選択肢の作成
-            self.create_questions_and_choices(df)
-            
-            self.stdout.write(
-                self.style.SUCCESS('Successfully loaded CSV data')
-            )
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error loading CSV: {str(e)}')
+            reader = pd.read_csv(
+                csv_file, usecols=CSV_COLUMNS, dtype=CSV_DTYPES, chunksize=options['chunk_size']
             )
+            for number, chunk in enumerate(reader, start=1):
+                chunk_started = time.perf_counter()
+                with transaction.atomic():
+                    result = self.load_chunk(chunk)
+                elapsed = time.perf_counter() - chunk_started
 
-    def create_genres(self, df):
-        """ジャンルの作成"""
-        genre_mapping = {
-            'g02': '基礎知識',
-            'g03': 'ビジネス知識',
-            'g04': 'セールス知識',
-            'g05': 'マーケティング知識',
-            'g06': 'テクニカル知識',
-        }
-        
-        unique_genres = df['genre_id'].unique()
-        
-        for genre_id in unique_genres:
-            if pd.notna(genre_id):
-                genre_name = genre_mapping.get(genre_id, f'ジャンル {genre_id}')
-                genre, created = Genre.objects.get_or_create(
-                    id=genre_id,
-                    defaults={'name': genre_name}
+                totals['rows'] += len(chunk)
+                for key, value in result.items():
+                    totals[key] += value
+                self.stdout.write(
+                    f'Chunk {number}: {len(chunk)} rows, {result["questions_created"]} questions created, '
+                    f'{result["questions_updated"]} updated, {result["choices"]} choices '
+                    f'({len(chunk) / elapsed:.0f} rows/s)'
                 )
-                if created:
-                    self.stdout.write(f'Created genre: {genre_id} - {genre_name}')
-
-    def create_questions_and_choices(self, df):
-        """問題と選択肢の作成"""
-        # 問題IDでグループ化
-        question_groups = df.groupby('question_id')
-        
-        questions_created = 0
-        choices_created = 0
-        
-        for question_id, group in question_groups:
-            if pd.isna(question_id):
-                continue
-                
-            # 問題の基本情報（最初の行から取得）
-            first_row = group.iloc[0]
-            
-            # 問題の作成
-            question, created = Question.objects.get_or_create(
-                id=question_id,
-                defaults={
-                    'genre_id': first_row['genre_id'],
-                    'difficulty': int(first_row['difficulty']) if pd.notna(first_row['difficulty']) else 1,
-                    'point_weight': int(first_row['point_weight']) if pd.notna(first_row['point_weight']) else 1,
-                    'time_weight': int(first_row['time_weight']) if pd.notna(first_row['time_weight']) else 1,
-                    'title': first_row['body'] if pd.notna(first_row['body']) else '',  # CSVのbodyフィールドをtitleに
-                    'body': first_row['object'] if pd.notna(first_row['object']) else '',  # CSVのobjectフィールドをbodyに
-                    'clarification': first_row['clarification'] if pd.notna(first_row['clarification']) else '',
-                }
-            )
-            
-            if created:
-                questions_created += 1
-                self.stdout.write(f'Created question: {question_id}')
-            
-            # 既存の選択肢を削除（重複を避けるため）
-            if not created:
-                question.choices.all().delete()
-            
-            # 選択肢の作成
-            for index, row in group.iterrows():
-                if pd.notna(row['content']) and pd.notna(row['id_y']):
-                    choice = Choice.objects.create(
-                        id=row['id_y'],
-                        question=question,
-                        content=row['content'],
-                        is_correct=bool(row['is_answer']),
-                        order_index=index % len(group)  # 順序を設定
-                    )
-                    choices_created += 1
-        
+        except ValueError as e:
+            # 列の不足・CSVの形式エラー（それまでのチャンクは登録済み）
+            raise CommandError(f'Error loading CSV: {e}')
+        finally:
+            # bulk_create はシグナルを発行しないため、登録済みのチャンクのジャンルのパックを作り直す
+            schedule_pack_rebuild(self.changed_genres)
+
+        elapsed = time.perf_counter() - started
         self.stdout.write(
             self.style.SUCCESS(
-                f'Created {questions_created} questions and {choices_created} choices'
+                f'Loaded {totals["rows"]} rows in {elapsed:.1f}s ({totals["rows"] / elapsed if elapsed else 0:.0f} rows/s): '
+                f'{totals["questions_created"]} questions created, {totals["questions_updated"]} updated, '
+                f'{totals["choices"]} choices upserted, {totals["choices_deleted"]} deleted choices removed, '
+                f'{totals["choices_deactivated"]} deactivated'
+            )
+        )
+
+    def load_chunk(self, chunk):
+        """1チャンク分の問題・選択肢を登録・更新する（トランザクション内で呼ぶ）"""
+        # 削除されていない問題の行だけを対象にする
+        chunk = chunk[chunk['question_id'].notna() & chunk['genre_id'].notna() & (chunk['deleted_x'] == 0)]
+        live = chunk[chunk['content'].notna() & (chunk['deleted_y'] == 0)]
+        self.changed_genres.update(chunk['genre_id'].unique())
+
+        self.create_genres(live['genre_id'].unique())
+        created, updated = self.upsert_questions(self.question_frame(live))
+        choices = self.upsert_choices(self.choice_frame(live))
+
+        # 削除済みの選択肢が登録されていれば取り除く（deleted_y が空の行は削除扱いにしない。
+        # 回答履歴のある選択肢は履歴を残すため無効化する）
+        deleted_ids = chunk.loc[chunk['deleted_y'].fillna(0) != 0, 'id_y'].dropna().unique().tolist()
+        deactivated = deleted = 0
+        if deleted_ids:
+            deactivated, deleted = Choice.objects.filter(id__in=deleted_ids).retire()
+
+        return {
+            'questions_created': created,
+            'questions_updated': updated,
+            'choices': choices,
+            'choices_deactivated': deactivated,
+            'choices_deleted': deleted,
+        }
+
+    def create_genres(self, genre_ids):
+        """未登録のジャンルを作成する（既存のジャンル名は変更しない）"""
+        new_ids = [genre_id for genre_id in genre_ids if genre_id not in self.known_genres]
+        if not new_ids:
+            return
+        existing = set(Genre.objects.filter(id__in=new_ids).values_list('id', flat=True))
+        genres = [
+            Genre(id=genre_id, name=GENRE_NAMES.get(genre_id, f'ジャンル {genre_id}'))
+            for genre_id in new_ids if genre_id not in existing
+        ]
+        Genre.objects.bulk_create(genres, ignore_conflicts=True)
+        self.known_genres.update(new_ids)
+        for genre in genres:
+            self.stdout.write(f'Created genre: {genre.id} - {genre.name}')
+
+        # bulk_create はシグナルを発行しないため、統計カウンターをまとめて反映する
+        StatCounter.apply({'genres_total': len(genres)})
+        Genre.sync_id_sequence(new_ids)
+
+    @staticmethod
+    def question_frame(live):
+        """問題ごとに1行（問題の列は最初の行から取得）"""
+        questions = live.drop_duplicates('question_id')
+        return pd.DataFrame({
+            'id': questions['question_id'],
+            'genre_id': questions['genre_id'],
+            'difficulty': pd.to_numeric(questions['difficulty'], errors='coerce').fillna(1).astype(int),
+            'title': questions['body'].fillna(''),  # CSVのbodyフィールドをtitleに
+            'body': questions['object'].fillna(''),  # CSVのobjectフィールドをbodyに
+            'clarification': questions['clarification'].fillna(''),
+        })
+
+    def choice_frame(self, live):
+        """選択肢ごとに1行（order_index は問題内の出現順）"""
+        # 同じ選択肢IDが重複している場合は後の行を使う（1回の upsert で同じ行は更新できない）
+        choices = live[live['id_y'].notna()].drop_duplicates('id_y', keep='last')
+        offsets = choices['question_id'].map(self.choice_counts).fillna(0).astype(int)
+        frame = pd.DataFrame({
+            'id': choices['id_y'],
+            'question_id': choices['question_id'],
+            'content': choices['content'],
+            'is_correct': pd.to_numeric(choices['is_answer'], errors='coerce').fillna(0).astype(bool),
+            'order_index': offsets + choices.groupby('question_id').cumcount(),
+        })
+        for question_id, count in choices['question_id'].value_counts().items():
+            self.choice_counts[question_id] = self.choice_counts.get(question_id, 0) + count
+        return frame
+
+    @staticmethod
+    def upsert_questions(frame):
+        """問題を登録・更新し、(作成数, 更新数) を返す"""
+        if frame.empty:
+            return 0, 0
+        ids = frame['id'].tolist()
+        existing = Question.objects.filter(id__in=ids).count()
+        questions = [
+            Question(id=question_id, genre_id=genre_id, difficulty=difficulty, title=title, body=body,
+                     clarification=clarification)
+            for question_id, genre_id, difficulty, title, body, clarification in zip(
+                ids, frame['genre_id'].tolist(), frame['difficulty'].tolist(), frame['title'].tolist(),
+                frame['body'].tolist(), frame['clarification'].tolist(),
+            )
+        ]
+        Question.objects.bulk_create(
+            questions,
+            batch_size=BULK_CREATE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=QUESTION_UPDATE_FIELDS,
+        )
+
+        # 明示的なIDで登録したため、採番カウンターを進める
+        Question.sync_id_sequence(ids)
+        created = len(ids) - existing
+        StatCounter.apply({'questions_total': created, 'questions_active': created})
+        return created, existing
+
+    @staticmethod
+    def upsert_choices(frame):
+        if frame.empty:
+            return 0
+        ids = frame['id'].tolist()
+        choices = [
+            Choice(id=choice_id, question_id=question_id, content=content, is_correct=is_correct,
+                   order_index=order_index)
+            for choice_id, question_id, content, is_correct, order_index in zip(
+                ids, frame['question_id'].tolist(), frame['content'].tolist(),
+                frame['is_correct'].tolist(), frame['order_index'].tolist(),
             )
+        ]
+        Choice.objects.bulk_create(
+            choices,
+            batch_size=BULK_CREATE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=CHOICE_UPDATE_FIELDS,
         )
+        Choice.sync_id_sequence(ids)
+        return len(ids)
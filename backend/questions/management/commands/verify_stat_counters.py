@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from questions.models import StatCounter
+
+
+class Command(BaseCommand):
+    help = 'Recount dashboard stat counters and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift without repairing it'
+        )
+
+    def handle(self, *args, **options):
+        stored = dict(StatCounter.objects.values_list('name', 'value'))
+        actual = StatCounter.recount()
+
+        drift_count = 0
+        for name, value in actual.items():
+            stored_value = stored.get(name)
+            if stored_value == value:
+                self.stdout.write(f'{name}: {value}')
+            else:
+                drift_count += 1
+                self.stdout.write(
+                    self.style.WARNING(f'{name}: stored={stored_value} actual={value}')
+                )
+
+        if drift_count == 0:
+            self.stdout.write(self.style.SUCCESS('All counters are in sync'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{drift_count} counters drifted (not repaired)'))
+            return
+
+        StatCounter.rebuild(actual)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {drift_count} counters'))
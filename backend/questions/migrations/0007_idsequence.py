@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0006_remove_weight_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='difficulty',
+            field=models.IntegerField(choices=[(1, '初級'), (2, '中級'), (3, '上級')]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0008_statcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionPack',
+            fields=[
+                ('genre', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='question_pack', serialize=False, to='questions.genre')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=100)),
+                ('previous_name', models.CharField(blank=True, max_length=100)),
+                ('question_count', models.IntegerField()),
+                ('size', models.IntegerField()),
+                ('gzip_size', models.IntegerField()),
+                ('brotli_size', models.IntegerField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['genre_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0009_questionpack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='questions.question')),
+                ('attempts', models.IntegerField()),
+                ('correct_attempts', models.IntegerField()),
+                ('p_value', models.FloatField(db_index=True)),
+                ('discrimination', models.FloatField(blank=True, db_index=True, null=True)),
+                ('choice_rates', models.JSONField(default=dict)),
+                ('top_distractor', models.CharField(blank=True, max_length=50)),
+                ('top_distractor_rate', models.FloatField(db_index=True, default=0)),
+                ('median_response_time', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0010_questionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
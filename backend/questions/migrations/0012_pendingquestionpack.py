@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_choice_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingQuestionPack',
+            fields=[
+                ('genre_id', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('requested_at', models.DateTimeField()),
+            ],
+        ),
+    ]
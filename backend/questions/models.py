@@ -1,36 +1,133 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+import random
 import re
 
 User = get_user_model()
 
-class Genre(models.Model):
+
+class IdSequence(models.Model):
+    """
+    文字列IDの採番カウンター
+    SELECT ... FOR UPDATE で行ロックを取り、同時作成時のID衝突を防ぐ
+    """
+    name = models.CharField(max_length=20, primary_key=True)  # question, choice, genre
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} - {self.last_value}"
+
+    @classmethod
+    def allocate(cls, name, count=1, seed=None):
+        """
+        連番をcount個まとめて予約し、rangeで返す
+        カウンター行が未作成の場合はseed()の戻り値（既存IDの最大番号）から開始する
+        """
+        if count < 1:
+            return range(0)
+
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(name=name).first()
+            if sequence is None:
+                cls.objects.get_or_create(name=name, defaults={'last_value': seed() if seed else 0})
+                sequence = cls.objects.select_for_update().get(name=name)
+
+            first = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=['last_value'])
+
+        return range(first, first + count)
+
+    @classmethod
+    def advance_to(cls, name, value, seed=None):
+        """明示的なIDで登録した後、カウンターが既存IDより小さくならないよう進める"""
+        updated = cls.objects.filter(name=name, last_value__lt=value).update(last_value=value)
+        if not updated and not cls.objects.filter(name=name).exists():
+            cls.objects.get_or_create(name=name, defaults={'last_value': max(value, seed() if seed else 0)})
+            cls.objects.filter(name=name, last_value__lt=value).update(last_value=value)
+
+
+class SequentialIdMixin:
+    """
+    IdSequenceで採番する文字列主キーの共通処理
+    ID_PREFIX + ゼロパディングした連番（ID_DIGITS桁）の形式
+    """
+    SEQUENCE_NAME = None
+    ID_PREFIX = None
+    ID_DIGITS = None
+
+    @classmethod
+    def format_id(cls, number):
+        return f'{cls.ID_PREFIX}{number:0{cls.ID_DIGITS}d}'
+
+    @classmethod
+    def parse_id_number(cls, object_id):
+        """IDから数値部分を抽出する（形式が異なる場合はNone）"""
+        match = re.match(rf'^{cls.ID_PREFIX}(\d+)$', object_id or '')
+        return int(match.group(1)) if match else None
+
+    @classmethod
+    def _max_existing_id_number(cls):
+        """既存IDの数値部分の最大値（カウンター初期化時のみ使用）"""
+        max_number = 0
+        # 無効化した選択肢などマネージャーで除外される行も含める
+        for object_id in cls._base_manager.filter(id__startswith=cls.ID_PREFIX).values_list('id', flat=True).iterator():
+            number = cls.parse_id_number(object_id)
+            if number is not None:
+                max_number = max(max_number, number)
+        return max_number
+
+    @classmethod
+    def generate_next_ids(cls, count):
+        """IDをcount個まとめて予約する（1回のロック取得で済む）"""
+        numbers = IdSequence.allocate(cls.SEQUENCE_NAME, count, seed=cls._max_existing_id_number)
+        return [cls.format_id(number) for number in numbers]
+
+    @classmethod
+    def generate_next_id(cls):
+        return cls.generate_next_ids(1)[0]
+
+    @classmethod
+    def sync_id_sequence(cls, object_ids):
+        """明示的なIDで作成した場合に、採番カウンターをそのID以上に進める"""
+        numbers = [cls.parse_id_number(object_id) for object_id in object_ids]
+        numbers = [number for number in numbers if number is not None]
+        if numbers:
+            IdSequence.advance_to(cls.SEQUENCE_NAME, max(numbers), seed=cls._max_existing_id_number)
+
+
+class GenreQuerySet(models.QuerySet):
+
+    def with_question_count(self):
+        """問題数（question_count）を集計して取得する（GenreSerializer 用）"""
+        return self.annotate(question_count=models.Count('questions'))
+
+
+class Genre(SequentialIdMixin, models.Model):
     id = models.CharField(max_length=10, primary_key=True)  # g02, g03, etc.
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = GenreQuerySet.as_manager()
+
+    # 次のジャンルIDを生成する (g01, g02, g03...)
+    SEQUENCE_NAME = 'genre'
+    ID_PREFIX = 'g'
+    ID_DIGITS = 2  # 2桁でゼロパディング（g01, g02... g99, g100...）
+
     def __str__(self):
         return f"{self.id} - {self.name}"
-    
-    @classmethod
-    def generate_next_id(cls):
-        """次のジャンルIDを生成する (g01, g02, g03...)"""
-        # 現在の最大IDを取得
-        last_genre = cls.objects.filter(id__regex=r'^g\d+$').order_by('-id').first()
-        
-        if not last_genre:
-            return 'g01'
-        
-        # IDから数値部分を抽出
-        match = re.match(r'^g(\d+)$', last_genre.id)
-        if match:
-            next_number = int(match.group(1)) + 1
-            return f'g{next_number:02d}'  # 2桁でゼロパディング（g01, g02... g99, g100...）
-        
-        return 'g01'  # フォールバック
-
-class Question(models.Model):
+
+class QuestionQuerySet(models.QuerySet):
+
+    def draw_ids(self, count):
+        """対象の問題からランダムに count 問のIDを選ぶ（出題順。count 問以下なら全問を並べ替える）"""
+        question_ids = list(self.values_list('id', flat=True))
+        return random.sample(question_ids, min(count, len(question_ids)))
+
+
+class Question(SequentialIdMixin, models.Model):
     DIFFICULTY_CHOICES = [
         (1, '初級'),
         (2, '中級'),
@@ -50,45 +147,56 @@ class Question(models.Model):
     reviewed_at = models.DateTimeField(null=True, blank=True)  # レビュー完了日
     is_active = models.BooleanField(default=True)
 
+    objects = QuestionQuerySet.as_manager()
+
+    # 次の問題IDを生成する (QFB00001, QFB00002...)
+    SEQUENCE_NAME = 'question'
+    ID_PREFIX = 'QFB'
+    ID_DIGITS = 5  # 5桁でゼロパディング
+
     class Meta:
         ordering = ['id']
 
     def __str__(self):
         return f"{self.id} - {self.title[:50]}..."
-    
-    @classmethod
-    def generate_next_id(cls):
-        """次の問題IDを生成する (QFB00001, QFB00002...)"""
-        # QFBで始まるIDの中で最大のものを取得
-        last_question = cls.objects.filter(id__startswith='QFB').order_by('-id').first()
-        
-        if not last_question:
-            return 'QFB00001'
-        
-        # IDから数値部分を抽出
-        match = re.match(r'^QFB(\d+)$', last_question.id)
-        if match:
-            next_number = int(match.group(1)) + 1
-            return f'QFB{next_number:05d}'  # 5桁でゼロパディング
-        
-        # 既存のIDがパターンに合わない場合は、全てのIDから最大値を探す
-        all_questions = cls.objects.all().order_by('-id')
-        for q in all_questions:
-            match = re.match(r'^QFB(\d+)$', q.id)
-            if match:
-                next_number = int(match.group(1)) + 1
-                return f'QFB{next_number:05d}'
-        
-        return 'QFB00001'  # フォールバック
-
-class Choice(models.Model):
+
+class ChoiceQuerySet(models.QuerySet):
+
+    def retire(self):
+        """
+        選択肢を取り除き、(無効化した数, 削除した数) を返す
+        回答履歴（UserAttempt）から参照されている選択肢は削除せずに無効化し（is_active=False）、回答履歴を残す
+        """
+        deactivated = self.filter(userattempt__isnull=False).update(is_active=False)
+        deleted_by_model = self.filter(userattempt__isnull=True).delete()[1]
+        return deactivated, deleted_by_model.get(Choice._meta.label, 0)
+
+
+class ActiveChoiceManager(models.Manager.from_queryset(ChoiceQuerySet)):
+    """無効化した選択肢を除く（question.choices・prefetch_related('choices') もこのマネージャーを使う）"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
+class Choice(SequentialIdMixin, models.Model):
     id = models.CharField(max_length=50, primary_key=True)  # a000000077, etc. (サイズ拡張)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
     content = models.TextField()  # 選択肢の内容
     is_correct = models.BooleanField(default=False)
     order_index = models.IntegerField(default=0)
+    # 取り除いた選択肢のうち回答履歴から参照されているもの（出題・採点には使わない）
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ActiveChoiceManager()
+    all_objects = ChoiceQuerySet.as_manager()  # 無効化した選択肢を含む
+
+    # 次の選択肢IDを生成する (a000000001, a000000002...)
+    SEQUENCE_NAME = 'choice'
+    ID_PREFIX = 'a'
+    ID_DIGITS = 9  # 9桁でゼロパディング
+
     class Meta:
         ordering = ['order_index']
 
@@ -96,19 +204,123 @@ class Choice(models.Model):
         marker = "◯" if self.is_correct else "×"
         return f"{self.question.id} - {self.content[:30]}... {marker}"
     
+
+class StatCounter(models.Model):
+    """
+    管理画面ダッシュボード用の件数カウンター
+    シグナルと一括操作で増減を反映し、COUNT(*) の全件スキャンを避ける
+    ずれが生じた場合は verify_stat_counters コマンドで再集計する
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
     @classmethod
-    def generate_next_id(cls):
-        """次の選択肢IDを生成する (a000000001, a000000002...)"""
-        # 'a'で始まるIDの中で最大のものを取得
-        last_choice = cls.objects.filter(id__startswith='a').order_by('-id').first()
-        
-        if not last_choice:
-            return 'a000000001'
-        
-        # IDから数値部分を抽出
-        match = re.match(r'^a(\d+)$', last_choice.id)
-        if match:
-            next_number = int(match.group(1)) + 1
-            return f'a{next_number:09d}'  # 9桁でゼロパディング
-        
-        return 'a000000001'  # フォールバック
+    def counter_querysets(cls):
+        """カウンター名と再集計用のクエリセット"""
+        return {
+            'users_total': User.objects.all(),
+            'users_active': User.objects.filter(is_active=True),
+            'questions_total': Question.objects.all(),
+            'questions_active': Question.objects.filter(is_active=True),
+            'genres_total': Genre.objects.all(),
+        }
+
+    @classmethod
+    def recount(cls):
+        """全カウンターを実際の件数で再集計する"""
+        return {name: queryset.count() for name, queryset in cls.counter_querysets().items()}
+
+    @classmethod
+    def rebuild(cls, values=None):
+        """カウンターを再集計した値で上書きする"""
+        values = values if values is not None else cls.recount()
+        with transaction.atomic():
+            for name, value in values.items():
+                cls.objects.update_or_create(name=name, defaults={'value': value})
+        return values
+
+    @classmethod
+    def snapshot(cls):
+        """全カウンターを1回の主キー検索で取得する（未作成の場合は再集計）"""
+        names = list(cls.counter_querysets().keys())
+        values = dict(cls.objects.filter(name__in=names).values_list('name', 'value'))
+        if len(values) < len(names):
+            values = cls.rebuild()
+        return values
+
+    @classmethod
+    def apply(cls, deltas):
+        """
+        カウンターを増減する {name: delta}
+        行が未作成の場合は何もしない（次回のsnapshotで再集計される）
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        cls.objects.filter(name__in=deltas.keys()).update(
+            value=models.F('value') + models.Case(
+                *[models.When(name=name, then=models.Value(delta)) for name, delta in deltas.items()],
+                default=models.Value(0),
+                output_field=models.BigIntegerField(),
+            )
+        )
+
+
+class QuestionPack(models.Model):
+    """
+    ジャンルごとのオフライン用問題パック（正解情報なし）の一覧
+    ファイルは内容のハッシュを含む名前で保存し（questions.question_packs）、この表で最新の名前を共有する
+    """
+    genre = models.OneToOneField(Genre, on_delete=models.CASCADE, primary_key=True, related_name='question_pack')
+    content_hash = models.CharField(max_length=64)
+    name = models.CharField(max_length=100)  # g02.<ハッシュ12桁>.json
+    previous_name = models.CharField(max_length=100, blank=True)  # 1つ前のパック（更新直後の取得用に残す）
+    question_count = models.IntegerField()
+    size = models.IntegerField()
+    gzip_size = models.IntegerField()
+    brotli_size = models.IntegerField(null=True, blank=True)  # brotli が使えない環境では null
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['genre_id']
+
+    def __str__(self):
+        return f"{self.genre_id} - {self.name}"
+
+
+class PendingQuestionPack(models.Model):
+    """
+    作り直しを待つジャンルのパック（問題・ジャンルの変更で記録し、build_question_packs --pending がまとめて作り直す）
+    削除されたジャンルのファイルも削除するため、ジャンルへの外部キーにしない
+    """
+    genre_id = models.CharField(max_length=10, primary_key=True)
+    requested_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.genre_id} - {self.requested_at}"
+
+
+class QuestionStats(models.Model):
+    """
+    問題ごとの項目分析（questions.item_analysis で回答履歴から集計する）
+    管理画面の問題一覧で「難しい順」「誤答に誘導しやすい順」などをインデックスで並び替える
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.IntegerField()
+    correct_attempts = models.IntegerField()
+    p_value = models.FloatField(db_index=True)  # 正答率（0〜1。低いほど難しい）
+    # 点双列相関（正誤と、受講者のその問題以外の正答率の相関。低い・負の値は識別力の低い問題）
+    discrimination = models.FloatField(null=True, blank=True, db_index=True)
+    choice_rates = models.JSONField(default=dict)  # {選択肢ID: 選択率}（選ばれていない選択肢は 0）
+    # 最も選ばれた誤答の選択肢ID（選択肢の編集・削除のたびに参照を確認しないよう外部キーにしない）
+    top_distractor = models.CharField(max_length=50, blank=True)
+    top_distractor_rate = models.FloatField(default=0, db_index=True)  # 最も選ばれた誤答の選択率
+    median_response_time = models.FloatField(null=True, blank=True)  # 回答時間の中央値（秒）
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.question_id} - p={self.p_value:.2f}"
@@ -0,0 +1,39 @@
+"""
+オフライン用問題パックの S3 ストレージ（QUESTION_PACK_STORAGE）
+
+パックは packs/ 以下に保存し、クライアントは一覧（認証が必要）で返す有効期限付きの署名付きURLから直接取得する。
+バケットは公開しない。QUESTION_PACK_CDN_DOMAIN を設定した場合は CloudFront の署名付きURLを返す
+（AWS_CLOUDFRONT_KEY / AWS_CLOUDFRONT_KEY_ID が必要）。
+- 名前に内容のハッシュを含むため、Cache-Control: immutable を付ける
+- 圧縮版（.gz / .br）には Content-Encoding を付け、ブラウザが展開した JSON として扱えるようにする
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .question_packs import IMMUTABLE_CACHE_CONTROL, PACK_ENCODINGS
+
+
+class QuestionPackS3Storage(S3Boto3Storage):
+    location = 'packs'
+    querystring_auth = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.querystring_expire = settings.QUESTION_PACK_URL_EXPIRE
+        # AWS_S3_CUSTOM_DOMAIN（公開のURL）は使わない。CDN の場合は署名できるときだけ使う
+        self.custom_domain = settings.QUESTION_PACK_CDN_DOMAIN or None
+        if self.custom_domain and self.cloudfront_signer is None:
+            raise ImproperlyConfigured(
+                'QUESTION_PACK_CDN_DOMAIN requires AWS_CLOUDFRONT_KEY and AWS_CLOUDFRONT_KEY_ID to sign pack URLs'
+            )
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        params['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        params['ContentType'] = 'application/json; charset=utf-8'
+        for encoding, suffix in PACK_ENCODINGS:
+            if name.endswith(suffix):
+                params['ContentEncoding'] = encoding
+        return params
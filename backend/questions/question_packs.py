@@ -0,0 +1,338 @@
+"""
+ジャンル別のオフライン用問題パック
+
+ジャンルごとに有効な問題（正解情報なし）を1つの JSON にまとめ、gzip・brotli で圧縮したファイルと合わせて保存する。
+- ファイル名は内容のハッシュを含む（g02.<sha256の先頭12桁>.json、圧縮版は .gz / .br を付ける）
+- 内容が変わらなければ同じ名前になるため、作り直しても書き込まない
+- ファイルは変更されないので、長期間キャッシュさせる（Cache-Control: immutable）
+- 一覧・ファイルの取得には認証が必要（S3 などは有効期限付きの署名付きURLを一覧で返す）
+- クライアントは一覧（/api/questions/questions/packs/）のハッシュが変わったときだけ取得し直す
+
+保存先は QUESTION_PACK_STORAGE（ストレージクラスのパス。未設定ならローカルの QUESTION_PACK_ROOT（既定は MEDIA_ROOT/question_packs）で、
+QuestionPackFileView が Accept-Encoding に応じて圧縮済みのファイルを返す）。
+
+問題・ジャンルの変更はシグナルと一括操作から schedule_pack_rebuild() で記録し、
+リクエストの終了後（管理コマンドなどではコミット後）に対象のジャンルを作り直し待ち（PendingQuestionPack）にする。
+作り直しはリクエストのワーカーでは行わず、cron などで定期的に実行する build_question_packs --pending が
+まとめて行う（短時間の連続した変更は1回の作り直しになる）。
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, close_old_connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from elearning.compression import accepted_encodings
+from elearning.fast_json import dumps
+
+from .models import Genre, PendingQuestionPack, Question, QuestionPack
+
+try:
+    import brotli
+except ImportError:  # brotli がない環境では gzip のみ
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 12
+PACK_NAME_RE = re.compile(rf'^(?P<genre_id>[\w-]+)\.(?P<hash>[0-9a-f]{{{HASH_LENGTH}}})\.json$')
+PACK_FILE_RE = re.compile(rf'^(?P<name>[\w-]+\.[0-9a-f]{{{HASH_LENGTH}}}\.json)(?P<suffix>\.gz|\.br)?$')
+
+# Content-Encoding と圧縮版の拡張子（クライアントに優先して返す順）
+PACK_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# このアプリで配信するファイル（認証が必要なため共有キャッシュには保存させない）
+PRIVATE_IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+# 全ジャンルを作り直すときの brotli の圧縮レベル（自動の作り直しは QUESTION_PACK_AUTO_BROTLI_QUALITY）
+BROTLI_QUALITY = 11
+
+# リクエスト中に変更されたジャンル（リクエストの終了後にまとめて作り直し待ちにする）
+_pending = threading.local()
+
+
+@lru_cache(maxsize=None)
+def get_pack_storage():
+    if settings.QUESTION_PACK_STORAGE:
+        return import_string(settings.QUESTION_PACK_STORAGE)()
+    # 未設定なら MEDIA_ROOT の下（MEDIA_ROOT は環境ごとの設定で決まるため、ここで組み立てる）
+    return FileSystemStorage(location=settings.QUESTION_PACK_ROOT or os.path.join(settings.MEDIA_ROOT, 'question_packs'))
+
+
+def is_local_storage(storage=None):
+    """ファイルをこのアプリで配信するか（S3 などはストレージのURLから直接取得させる）"""
+    return isinstance(storage or get_pack_storage(), FileSystemStorage)
+
+
+def pack_name(genre_id, content_hash):
+    return f'{genre_id}.{content_hash[:HASH_LENGTH]}.json'
+
+
+def pack_file_names(name):
+    """パックと圧縮版のファイル名"""
+    return [name] + [name + suffix for _, suffix in PACK_ENCODINGS]
+
+
+def render_pack(genre):
+    """ジャンルのパック（JSON のバイト列）と問題数を返す"""
+    from .serializers import QuestionWithoutAnswerSerializer
+
+    questions = (
+        Question.objects.filter(genre=genre, is_active=True)
+        .select_related('genre').prefetch_related('choices').order_by('id')
+    )
+    data = QuestionWithoutAnswerSerializer(questions, many=True).data
+    payload = {
+        'genre': {'id': genre.id, 'name': genre.name},
+        'questions': data,
+    }
+    return dumps(payload), len(data)
+
+
+def compress_pack(body, brotli_quality=BROTLI_QUALITY):
+    """圧縮版 {拡張子: バイト列}（同じ内容なら同じバイト列になるよう gzip の時刻は0にする）"""
+    variants = {'.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(body, quality=brotli_quality)
+    return variants
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def _delete_files(storage, name):
+    for file_name in pack_file_names(name):
+        try:
+            storage.delete(file_name)
+        except (FileNotFoundError, OSError):
+            logger.warning('Failed to delete question pack file %s', file_name, exc_info=True)
+
+
+def build_genre_pack(genre, storage=None, brotli_quality=BROTLI_QUALITY):
+    """
+    ジャンルのパックを作成し、QuestionPack を返す（有効な問題がなければパックを削除して None）
+    内容が前回と同じ場合は、ファイルが残っていれば何も書き込まない
+    """
+    storage = storage or get_pack_storage()
+    body, question_count = render_pack(genre)
+    current = QuestionPack.objects.filter(genre=genre).first()
+
+    if question_count == 0:
+        if current is not None:
+            for name in (current.name, current.previous_name):
+                if name:
+                    _delete_files(storage, name)
+            current.delete()
+        return None
+
+    content_hash = hashlib.sha256(body).hexdigest()
+    name = pack_name(genre.id, content_hash)
+    variants = compress_pack(body, brotli_quality)
+
+    # 圧縮版を先に書き、最後に本体を書く（本体があれば全ファイルがそろっている）
+    if not storage.exists(name):
+        for suffix, content in variants.items():
+            _save(storage, name + suffix, content)
+        _save(storage, name, body)
+
+    if current is not None and current.name == name:
+        return current
+
+    previous_name = current.name if current is not None else ''
+    pack, _ = QuestionPack.objects.update_or_create(genre=genre, defaults={
+        'content_hash': content_hash,
+        'name': name,
+        'previous_name': previous_name,
+        'question_count': question_count,
+        'size': len(body),
+        'gzip_size': len(variants['.gz']),
+        'brotli_size': len(variants['.br']) if '.br' in variants else None,
+    })
+    # 2つ前のパックは削除する（1つ前は更新前の一覧を取得したクライアントのために残す）
+    if current is not None and current.previous_name not in ('', name, previous_name):
+        _delete_files(storage, current.previous_name)
+    return pack
+
+
+def remove_genre_packs(genre_id, storage=None):
+    """削除されたジャンルのファイルを削除する"""
+    storage = storage or get_pack_storage()
+    for name in list_pack_files(storage):
+        if name.startswith(f'{genre_id}.'):
+            storage.delete(name)
+
+
+def build_packs(genre_ids=None, storage=None, brotli_quality=BROTLI_QUALITY):
+    """
+    パックを作成し、(ジャンルID, QuestionPack または None) のリストを返す
+    genre_ids を省略した場合は全ジャンル
+    """
+    storage = storage or get_pack_storage()
+    genres = Genre.objects.order_by('id')
+    if genre_ids is not None:
+        genre_ids = set(genre_ids)
+        genres = genres.filter(id__in=genre_ids)
+
+    results = []
+    for genre in genres:
+        results.append((genre.id, build_genre_pack(genre, storage, brotli_quality)))
+    if genre_ids is not None:
+        for genre_id in sorted(genre_ids - {genre_id for genre_id, _ in results}):
+            remove_genre_packs(genre_id, storage)
+            results.append((genre_id, None))
+    return results
+
+
+def list_pack_files(storage=None):
+    storage = storage or get_pack_storage()
+    try:
+        _, files = storage.listdir('')
+    except FileNotFoundError:
+        return []
+    return files
+
+
+def prune_pack_files(storage=None):
+    """一覧にないパックのファイル（最新と1つ前以外）を削除し、削除したファイル名を返す"""
+    storage = storage or get_pack_storage()
+    keep = set()
+    for name, previous_name in QuestionPack.objects.values_list('name', 'previous_name'):
+        keep.update(pack_file_names(name))
+        if previous_name:
+            keep.update(pack_file_names(previous_name))
+
+    removed = []
+    for file_name in list_pack_files(storage):
+        if file_name not in keep and PACK_NAME_RE.match(file_name.removesuffix('.gz').removesuffix('.br')):
+            storage.delete(file_name)
+            removed.append(file_name)
+    return removed
+
+
+def pack_file_url(name, request=None, storage=None):
+    """パックのファイルのURL（ローカルのストレージは QuestionPackFileView、それ以外はストレージの署名付きURL）"""
+    storage = storage or get_pack_storage()
+    if not is_local_storage(storage):
+        return storage.url(name)
+    url = reverse('questions:question-pack-file', args=[name])
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def ensure_pack_file(name, storage=None):
+    """
+    パックのファイルがあるか（ローカルのストレージで、一覧にある最新のパックがない場合は作り直す）
+    複数のサーバーでローカルのディスクを使う場合に、別のサーバーで作成されたパックを取得できるようにする
+    """
+    storage = storage or get_pack_storage()
+    if storage.exists(name):
+        return True
+    pack = QuestionPack.objects.select_related('genre').filter(name=name).first()
+    if pack is None or not is_local_storage(storage):
+        return False
+    build_genre_pack(pack.genre, storage, settings.QUESTION_PACK_AUTO_BROTLI_QUALITY)
+    return storage.exists(name)
+
+
+def choose_pack_file(file_name, accept_encoding, storage=None):
+    """
+    配信するファイル名と Content-Encoding（なしは None）を返す。パックがなければ None
+    名前に .gz / .br を付けた場合はそのファイル、付けない場合は Accept-Encoding で選ぶ
+    """
+    match = PACK_FILE_RE.match(file_name)
+    if match is None:
+        return None
+    storage = storage or get_pack_storage()
+    name, suffix = match.group('name'), match.group('suffix')
+    if not ensure_pack_file(name, storage):
+        return None
+    if suffix:
+        encoding = dict((suffix, encoding) for encoding, suffix in PACK_ENCODINGS)[suffix]
+        return (file_name, encoding) if storage.exists(file_name) else None
+
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, suffix in PACK_ENCODINGS:
+        if (encoding in accepted or '*' in accepted) and storage.exists(name + suffix):
+            return name + suffix, encoding
+    return name, None
+
+
+def mark_packs_pending(genre_ids):
+    """ジャンルのパックを作り直し待ちにする（失敗してもリクエスト・コマンドは失敗させない）"""
+    if not genre_ids:
+        return
+    requested_at = timezone.now()
+    try:
+        PendingQuestionPack.objects.bulk_create(
+            [PendingQuestionPack(genre_id=genre_id, requested_at=requested_at) for genre_id in sorted(genre_ids)],
+            update_conflicts=True,
+            unique_fields=['genre_id'],
+            update_fields=['requested_at'],
+        )
+    except DatabaseError:
+        logger.exception('Failed to schedule question pack rebuilds for %s', sorted(genre_ids))
+
+
+def build_pending_packs(storage=None, brotli_quality=None):
+    """
+    作り直し待ちのジャンルのパックを作り直し、build_packs と同じ形式で返す
+    作り直しの間に再び変更されたジャンルは作り直し待ちのまま残し、次の実行で作り直す
+    """
+    if brotli_quality is None:
+        brotli_quality = settings.QUESTION_PACK_AUTO_BROTLI_QUALITY
+    pending = dict(PendingQuestionPack.objects.values_list('genre_id', 'requested_at'))
+    if not pending:
+        return []
+    results = build_packs(pending, storage, brotli_quality)
+    for genre_id, requested_at in pending.items():
+        PendingQuestionPack.objects.filter(genre_id=genre_id, requested_at=requested_at).delete()
+    return results
+
+
+def _resolve_genre_ids(genre_ids):
+    return {genre_id for genre_id in genre_ids if genre_id}
+
+
+def schedule_pack_rebuild(genre_ids):
+    """
+    ジャンルのパックの作り直しを予約する
+    genre_ids にはクエリセット（values_list）も指定でき、作り直し待ちにする直前に評価する
+    """
+    if not settings.QUESTION_PACKS_AUTO_BUILD:
+        return
+    pending = getattr(_pending, 'sources', None)
+    if pending is not None:
+        pending.append(genre_ids)
+    else:
+        transaction.on_commit(lambda: mark_packs_pending(_resolve_genre_ids(genre_ids)))
+
+
+def start_collecting(sender, **kwargs):
+    """request_started: リクエスト中の変更をまとめる"""
+    if getattr(_pending, 'sources', None) is None:
+        _pending.sources = []
+
+
+def mark_request_pending(sender, **kwargs):
+    """request_finished: リクエスト中に変更されたジャンルを作り直し待ちにする"""
+    sources = getattr(_pending, 'sources', None)
+    _pending.sources = None
+    if not sources:
+        return
+    genre_ids = set()
+    for source in sources:
+        genre_ids |= _resolve_genre_ids(source)
+    mark_packs_pending(genre_ids)
+    # 記録に使った接続を、リクエスト終了時と同じく閉じる・プールへ返却する
+    close_old_connections()
@@ -1,17 +1,28 @@
 from rest_framework import serializers
-from .models import Genre, Question, Choice
+from .models import Genre, Question, Choice, QuestionPack, QuestionStats
+from .question_packs import PACK_ENCODINGS, pack_file_url
 
 
 class GenreSerializer(serializers.ModelSerializer):
-    """ジャンルのシリアライザー"""
+    """
+    ジャンルのシリアライザー
+    question_count は Genre.objects.with_question_count() で集計済みの値を使う
+    （集計していないインスタンスはジャンルごとにCOUNTクエリを発行する）
+    """
     id = serializers.CharField(required=False, allow_blank=True)  # IDをオプショナルに
-    question_count = serializers.IntegerField(source='questions.count', read_only=True)
+    question_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Genre
         fields = ['id', 'name', 'description', 'question_count', 'created_at']
         read_only_fields = ['created_at']
 
+    def get_question_count(self, obj):
+        question_count = getattr(obj, 'question_count', None)
+        if question_count is None:
+            question_count = obj.questions.count()
+        return question_count
+
 
 class ChoiceSerializer(serializers.ModelSerializer):
     """選択肢のシリアライザー"""
@@ -47,6 +58,25 @@ class QuestionSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
+class QuestionStatsSerializer(serializers.ModelSerializer):
+    """問題の項目分析（compute_question_stats で集計）"""
+
+    class Meta:
+        model = QuestionStats
+        fields = [
+            'attempts', 'correct_attempts', 'p_value', 'discrimination', 'choice_rates',
+            'top_distractor', 'top_distractor_rate', 'median_response_time', 'computed_at'
+        ]
+
+
+class AdminQuestionSerializer(QuestionSerializer):
+    """管理者用の問題のシリアライザー（項目分析付き。未集計の問題は null）"""
+    stats = QuestionStatsSerializer(read_only=True)
+
+    class Meta(QuestionSerializer.Meta):
+        fields = QuestionSerializer.Meta.fields + ['stats']
+
+
 class QuestionWithoutAnswerSerializer(serializers.ModelSerializer):
     """問題のシリアライザー（正解情報なし - クイズ用）"""
     choices = ChoiceWithoutAnswerSerializer(many=True, read_only=True)
@@ -61,3 +91,33 @@ class QuestionWithoutAnswerSerializer(serializers.ModelSerializer):
             'choices', 'created_at', 'is_active'
         ]
         read_only_fields = ['created_at']
+
+
+class QuestionPackSerializer(serializers.ModelSerializer):
+    """
+    オフライン用問題パックの一覧のシリアライザー
+    url は Accept-Encoding で圧縮版を選んで返すURL（S3 などでは非圧縮のファイル）、
+    encoded_urls は圧縮版のファイルのURL（Content-Encoding 付きで返す）
+    """
+    genre_name = serializers.CharField(source='genre.name', read_only=True)
+    url = serializers.SerializerMethodField()
+    encoded_urls = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuestionPack
+        fields = [
+            'genre', 'genre_name', 'content_hash', 'name', 'question_count',
+            'size', 'gzip_size', 'brotli_size', 'url', 'encoded_urls', 'built_at'
+        ]
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return pack_file_url(obj.name, self.context.get('request'))
+
+    def get_encoded_urls(self, obj):
+        sizes = {'gzip': obj.gzip_size, 'br': obj.brotli_size}
+        return {
+            encoding: pack_file_url(obj.name + suffix, self.context.get('request'))
+            for encoding, suffix in PACK_ENCODINGS
+            if sizes[encoding] is not None
+        }
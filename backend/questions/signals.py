@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_init, post_save, post_delete
+
+from .models import Genre, Question, StatCounter
+from .question_packs import mark_request_pending, schedule_pack_rebuild, start_collecting
+
+User = get_user_model()
+
+# モデルごとのカウンター名（is_activeを持つモデルはアクティブ件数も管理）
+COUNTED_MODELS = {
+    User: ('users_total', 'users_active'),
+    Question: ('questions_total', 'questions_active'),
+    Genre: ('genres_total', None),
+}
+
+
+def remember_is_active(sender, instance, **kwargs):
+    """読み込み時のis_activeを保持し、保存時に変化を検出する"""
+    # 遅延読み込みのフィールドを触らないよう __dict__ から取得
+    instance._stat_was_active = instance.__dict__.get('is_active')
+
+
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    total_name, active_name = COUNTED_MODELS[sender]
+    deltas = {}
+
+    if created:
+        deltas[total_name] = 1
+        if active_name and instance.is_active:
+            deltas[active_name] = 1
+    elif active_name:
+        was_active = getattr(instance, '_stat_was_active', None)
+        if was_active is not None and was_active != instance.is_active:
+            deltas[active_name] = 1 if instance.is_active else -1
+
+    if active_name:
+        instance._stat_was_active = instance.is_active
+
+    StatCounter.apply(deltas)
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    total_name, active_name = COUNTED_MODELS[sender]
+    deltas = {total_name: -1}
+    if active_name and instance.__dict__.get('is_active'):
+        deltas[active_name] = -1
+    StatCounter.apply(deltas)
+
+
+for model, (total_name, active_name) in COUNTED_MODELS.items():
+    if active_name:
+        post_init.connect(remember_is_active, sender=model, dispatch_uid=f'stat_counter_init_{model.__name__}')
+    post_save.connect(update_counters_on_save, sender=model, dispatch_uid=f'stat_counter_save_{model.__name__}')
+    post_delete.connect(update_counters_on_delete, sender=model, dispatch_uid=f'stat_counter_delete_{model.__name__}')
+
+
+# オフライン用問題パック: 変更されたジャンルのパックをリクエストの終了後（コマンドではコミット後）に作り直し待ちにする
+# 選択肢の変更は問題の保存と合わせて行われるため、問題の保存で検出する
+
+def remember_pack_genre(sender, instance, **kwargs):
+    """読み込み時のジャンルを保持し、ジャンルの変更時に移動元のパックも作り直す"""
+    instance._pack_genre_id = instance.__dict__.get('genre_id')
+
+
+def schedule_question_pack(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_pack_rebuild({instance.genre_id, getattr(instance, '_pack_genre_id', None)})
+    instance._pack_genre_id = instance.genre_id
+
+
+def schedule_genre_pack(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_pack_rebuild({instance.pk})
+
+
+post_init.connect(remember_pack_genre, sender=Question, dispatch_uid='question_pack_init')
+post_save.connect(schedule_question_pack, sender=Question, dispatch_uid='question_pack_save')
+post_delete.connect(schedule_question_pack, sender=Question, dispatch_uid='question_pack_delete')
+post_save.connect(schedule_genre_pack, sender=Genre, dispatch_uid='genre_pack_save')
+post_delete.connect(schedule_genre_pack, sender=Genre, dispatch_uid='genre_pack_delete')
+request_started.connect(start_collecting, dispatch_uid='question_pack_request_started')
+request_finished.connect(mark_request_pending, dispatch_uid='question_pack_request_finished')
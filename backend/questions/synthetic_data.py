@@ -0,0 +1,485 @@
+"""
+性能検証用の大量データ生成
+
+ジャンル・問題・選択肢・受講者を作成し、受講者ごとの活動量・ジャンルの人気・
+難易度別の正答率・曜日と時間帯の活動パターンに従ってクイズセッションと回答履歴を生成する。
+乱数は numpy の Generator をシードから作るため、同じシード・同じ設定なら同じデータになる。
+
+回答履歴とセッションはチャンク単位で書き込む。PostgreSQL では COPY、
+それ以外のDBでは bulk_create を使う。件数の少ない受講者・問題・選択肢は常に bulk_create。
+bulk_create はシグナルを発行しないため、統計カウンター（StatCounter）と問題パックの作り直しは最後にまとめて行う。
+"""
+
+import io
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Choice, Genre, Question, StatCounter
+from .question_packs import schedule_pack_rebuild
+
+DEFAULT_BATCH_SIZE = 100000
+BULK_CREATE_BATCH_SIZE = 2000
+CHOICES_PER_QUESTION = 4
+SYNTHETIC_PASSWORD = 'Synthetic-Data-Pass-1'
+
+# 分布の既定値（--profile のJSONで一部のキーだけ上書きできる）
+DEFAULT_PROFILE = {
+    # ジャンルの人気（Zipf分布の指数。0 で均等）
+    'genre_skew': 1.1,
+    # 問題の難易度（初級・中級・上級）の割合
+    'difficulty_weights': [0.4, 0.4, 0.2],
+    # 難易度別の平均的な正答率
+    'difficulty_accuracy': [0.8, 0.65, 0.5],
+    # 受講者の能力差（正答率のロジットに加える値の標準偏差）
+    'ability_spread': 0.8,
+    # 期間の最初から最後までの正答率の伸び（ロジット）
+    'learning_gain': 0.5,
+    # 受講者ごとの活動量の偏り（対数正規分布のσ。大きいほど一部の受講者に集中）
+    'activity_sigma': 1.0,
+    # 時間帯（0〜23時、TIME_ZONE の現地時刻）ごとの活動量
+    'hourly_weights': [
+        0.2, 0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 0.6, 0.9, 1.0, 1.0, 1.1,
+        1.5, 1.2, 1.0, 1.0, 1.0, 1.1, 1.3, 1.6, 1.8, 1.6, 1.0, 0.5,
+    ],
+    # 曜日（月〜日）ごとの活動量
+    'weekday_weights': [1.0, 1.0, 1.0, 1.0, 0.9, 0.5, 0.4],
+    'questions_per_session': 10,
+    # 最後まで解答されたセッションの割合（残りは end_time なし）
+    'completion_rate': 0.9,
+    # 難易度別の平均解答時間（秒）
+    'answer_seconds': [20, 35, 50],
+}
+
+PROFILE_LIST_LENGTHS = {
+    'difficulty_weights': 3,
+    'difficulty_accuracy': 3,
+    'hourly_weights': 24,
+    'weekday_weights': 7,
+    'answer_seconds': 3,
+}
+
+
+class SyntheticDataError(Exception):
+    pass
+
+
+def build_profile(overrides=None):
+    """既定の分布に上書き値を適用し、値の形式を検証する"""
+    profile = dict(DEFAULT_PROFILE)
+    for key, value in (overrides or {}).items():
+        if key not in DEFAULT_PROFILE:
+            raise SyntheticDataError(f'不明な設定です: {key}（{", ".join(DEFAULT_PROFILE)}）')
+        profile[key] = value
+
+    for key, length in PROFILE_LIST_LENGTHS.items():
+        if not isinstance(profile[key], list) or len(profile[key]) != length:
+            raise SyntheticDataError(f'{key} は{length}個の数値のリストで指定してください')
+        if any(not isinstance(value, (int, float)) or value < 0 for value in profile[key]):
+            raise SyntheticDataError(f'{key} に負の値や数値以外は指定できません')
+    if any(not 0 < value < 1 for value in profile['difficulty_accuracy']):
+        raise SyntheticDataError('difficulty_accuracy は0より大きく1未満で指定してください')
+    if not 0 <= profile['completion_rate'] <= 1:
+        raise SyntheticDataError('completion_rate は0〜1で指定してください')
+    if int(profile['questions_per_session']) < 1:
+        raise SyntheticDataError('questions_per_session は1以上で指定してください')
+    return profile
+
+
+def _normalize(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    total = weights.sum()
+    if total <= 0:
+        raise SyntheticDataError('重みの合計が0です')
+    return weights / total
+
+
+def _sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-values))
+
+
+def _logit(values):
+    values = np.asarray(values, dtype=np.float64)
+    return np.log(values / (1.0 - values))
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    auto_now / auto_now_add のフィールドに生成した日時をそのまま保存する
+    （bulk_create では pre_save で現在時刻に上書きされるため、一時的に無効にする）
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class RowWriter:
+    """
+    列単位の配列をテーブルに書き込む
+    PostgreSQL は COPY（CSV形式）、それ以外は bulk_create を使う
+    列の値は numpy 配列（int / bool / datetime64[s]）またはスカラー（全行同じ値）
+    """
+
+    def __init__(self, model, field_names):
+        self.model = model
+        self.fields = [model._meta.get_field(name) for name in field_names]
+        self.use_copy = connection.vendor == 'postgresql'
+        self.rows_written = 0
+
+    def write(self, columns, count):
+        if count == 0:
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                self._copy(columns, count)
+            else:
+                self._bulk_create(columns, count)
+        self.rows_written += count
+
+    @staticmethod
+    def _format_column(values, count):
+        if not isinstance(values, np.ndarray):
+            # CSV形式の COPY では引用符なしの空文字列が NULL
+            return [('' if values is None else str(values))] * count
+        if values.dtype == np.bool_:
+            return np.where(values, 't', 'f').tolist()
+        if np.issubdtype(values.dtype, np.datetime64):
+            return np.char.add(np.datetime_as_string(values, unit='s'), '+00:00').tolist()
+        return values.astype(str).tolist()
+
+    def _copy(self, columns, count):
+        formatted = [self._format_column(values, count) for values in columns]
+        buffer = io.StringIO('\n'.join(map(','.join, zip(*formatted))) + '\n')
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        column_names = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {table} ({column_names}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+    @staticmethod
+    def _python_column(values, count):
+        if not isinstance(values, np.ndarray):
+            return [values] * count
+        if np.issubdtype(values.dtype, np.datetime64):
+            return [value.replace(tzinfo=dt_timezone.utc) for value in values.astype('datetime64[us]').tolist()]
+        return values.tolist()
+
+    def _bulk_create(self, columns, count):
+        attnames = [field.attname for field in self.fields]
+        values = [self._python_column(column, count) for column in columns]
+        objects = [self.model(**dict(zip(attnames, row))) for row in zip(*values)]
+        self.model.objects.bulk_create(objects, batch_size=BULK_CREATE_BATCH_SIZE)
+
+
+class SyntheticDataGenerator:
+    """
+    受講者・ジャンル・問題を作成し、セッションと回答履歴を生成する
+    回答履歴は attempts 件（セッションあたり questions_per_session 件）
+    """
+
+    def __init__(self, users, genres, questions, attempts, days=365, departments=10, seed=0,
+                 profile=None, end_date=None, batch_size=DEFAULT_BATCH_SIZE, prefix='synthetic', log=None):
+        if min(users, genres, questions) < 1:
+            raise SyntheticDataError('users, genres, questions は1以上で指定してください')
+        if questions < genres:
+            raise SyntheticDataError('questions は genres 以上で指定してください（各ジャンルに1問以上）')
+        if days < 1 or attempts < 0:
+            raise SyntheticDataError('days は1以上、attempts は0以上で指定してください')
+
+        self.users = users
+        self.genres = genres
+        self.questions = questions
+        self.attempts = attempts
+        self.days = days
+        self.departments = max(1, departments)
+        self.seed = seed
+        self.profile = build_profile(profile)
+        self.end_date = end_date or timezone.localdate()
+        self.batch_size = max(batch_size, self.profile['questions_per_session'])
+        self.prefix = prefix
+        self.log = log or (lambda message: None)
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self):
+        from accounts.models import User
+
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise SyntheticDataError(
+                f'ユーザー名が {self.prefix}_ で始まるユーザーが既に存在します（--prefix を変更してください）'
+            )
+
+        started = time.perf_counter()
+        user_ids = self._create_users()
+        genre_ids = self._create_genres()
+        question_table = self._create_questions(genre_ids)
+        self.log(f'Created {len(user_ids)} users, {len(genre_ids)} genres and {len(question_table["ids"])} questions')
+
+        # 回答履歴を月別パーティションに直接書き込めるよう、対象期間のパーティションを作成する
+        from progress.partitions import ensure_partitions
+        ensure_partitions(self.end_date - timedelta(days=self.days - 1), self.end_date)
+
+        attempt_started = time.perf_counter()
+        sessions, attempts = self._generate_activity(user_ids, genre_ids, question_table)
+        attempt_elapsed = time.perf_counter() - attempt_started
+
+        progress_rows = self._create_progress(user_ids, genre_ids)
+
+        StatCounter.apply({
+            'users_total': len(user_ids),
+            'users_active': len(user_ids),
+            'genres_total': len(genre_ids),
+            'questions_total': len(question_table['ids']),
+            'questions_active': len(question_table['ids']),
+        })
+        schedule_pack_rebuild(genre_ids)
+
+        return {
+            'users': len(user_ids),
+            'genres': len(genre_ids),
+            'questions': len(question_table['ids']),
+            'choices': len(question_table['ids']) * CHOICES_PER_QUESTION,
+            'sessions': sessions,
+            'attempts': attempts,
+            'progress': progress_rows,
+            'writer': 'copy' if connection.vendor == 'postgresql' else 'bulk_create',
+            'attempts_per_minute': round(attempts / attempt_elapsed * 60) if attempt_elapsed else 0,
+            'elapsed_seconds': round(time.perf_counter() - started, 1),
+        }
+
+    def _create_users(self):
+        from accounts.models import User
+
+        rng = self.rng
+        # パスワードのハッシュ化は1回だけ行い、全員に同じハッシュを使う
+        password = make_password(SYNTHETIC_PASSWORD)
+        departments = rng.integers(0, self.departments, self.users)
+        users = [
+            User(
+                username=f'{self.prefix}_{i:07d}',
+                email=f'{self.prefix}-{i:07d}@example.invalid',
+                password=password,
+                display_name=f'受講者{i}',
+                department=f'部署{int(department) + 1:02d}',
+            )
+            for i, department in enumerate(departments)
+        ]
+        User.objects.bulk_create(users, batch_size=BULK_CREATE_BATCH_SIZE)
+        # bulk_create が主キーを返さないDBでも取得できるよう、ユーザー名で引き直す
+        ids = dict(User.objects.filter(username__startswith=f'{self.prefix}_').values_list('username', 'id'))
+        return np.array([ids[user.username] for user in users], dtype=np.int64)
+
+    def _create_genres(self):
+        ids = Genre.generate_next_ids(self.genres)
+        Genre.objects.bulk_create([
+            Genre(id=genre_id, name=f'{self.prefix} ジャンル{i + 1}') for i, genre_id in enumerate(ids)
+        ])
+        return ids
+
+    def _create_questions(self, genre_ids):
+        """問題と選択肢を作成し、生成に使う配列（ジャンル順に並べた問題）を返す"""
+        rng = self.rng
+        # 各ジャンルに1問以上割り当て、残りは均等に振り分ける（ジャンル順に並べる）
+        genre_index = np.concatenate([
+            np.arange(len(genre_ids)),
+            rng.integers(0, len(genre_ids), self.questions - len(genre_ids)),
+        ])
+        genre_index.sort()
+        difficulty = rng.choice(3, self.questions, p=_normalize(self.profile['difficulty_weights'])) + 1
+        correct_position = rng.integers(0, CHOICES_PER_QUESTION, self.questions)
+
+        question_ids = Question.generate_next_ids(self.questions)
+        choice_ids = Choice.generate_next_ids(self.questions * CHOICES_PER_QUESTION)
+
+        for start in range(0, self.questions, BULK_CREATE_BATCH_SIZE):
+            end = min(start + BULK_CREATE_BATCH_SIZE, self.questions)
+            with transaction.atomic():
+                Question.objects.bulk_create([
+                    Question(
+                        id=question_ids[i],
+                        genre_id=genre_ids[genre_index[i]],
+                        difficulty=int(difficulty[i]),
+                        title=f'{self.prefix} 問題{i + 1}',
+                        body='性能検証用に生成した問題です。',
+                        clarification='性能検証用に生成した解説です。',
+                    )
+                    for i in range(start, end)
+                ])
+                Choice.objects.bulk_create([
+                    Choice(
+                        id=choice_ids[i * CHOICES_PER_QUESTION + k],
+                        question_id=question_ids[i],
+                        content=f'選択肢{k + 1}',
+                        is_correct=k == correct_position[i],
+                        order_index=k,
+                    )
+                    for i in range(start, end)
+                    for k in range(CHOICES_PER_QUESTION)
+                ])
+
+        counts = np.bincount(genre_index, minlength=len(genre_ids))
+        return {
+            'ids': np.array(question_ids, dtype=object),
+            'choice_ids': np.array(choice_ids, dtype=object).reshape(self.questions, CHOICES_PER_QUESTION),
+            'difficulty': difficulty,
+            'correct_position': correct_position,
+            'genre_start': np.concatenate([[0], np.cumsum(counts)[:-1]]),
+            'genre_count': counts,
+        }
+
+    def _day_starts(self):
+        """対象期間の各日の現地時刻0時（UTCのエポック秒）と曜日の重み"""
+        tz = timezone.get_current_timezone()
+        first_day = self.end_date - timedelta(days=self.days - 1)
+        starts = []
+        weights = []
+        for offset in range(self.days):
+            day = first_day + timedelta(days=offset)
+            midnight = datetime(day.year, day.month, day.day, tzinfo=tz)
+            starts.append(int(midnight.timestamp()))
+            weights.append(self.profile['weekday_weights'][day.weekday()])
+        return np.array(starts, dtype=np.int64), _normalize(weights)
+
+    def _generate_activity(self, user_ids, genre_ids, question_table):
+        """セッションと回答履歴をチャンク単位で生成して書き込む"""
+        from progress.models import QuizSession, UserAttempt
+
+        profile = self.profile
+        rng = self.rng
+        per_session = int(profile['questions_per_session'])
+        total_sessions = -(-self.attempts // per_session)
+        sessions_per_chunk = max(1, self.batch_size // per_session)
+
+        activity = _normalize(rng.lognormal(0.0, profile['activity_sigma'], len(user_ids)))
+        ability = rng.normal(0.0, profile['ability_spread'], len(user_ids))
+        genre_weights = _normalize(1.0 / np.arange(1, len(genre_ids) + 1) ** profile['genre_skew'])
+        rng.shuffle(genre_weights)
+        hour_weights = _normalize(profile['hourly_weights'])
+        day_starts, day_weights = self._day_starts()
+        difficulty_logit = _logit(profile['difficulty_accuracy'])
+        answer_seconds = np.asarray(profile['answer_seconds'], dtype=np.float64)
+        genre_id_array = np.array(genre_ids, dtype=object)
+
+        # 受講者×ジャンルごとの回答数・正解数（UserProgress の作成に使う）
+        self.progress_total = np.zeros(len(user_ids) * len(genre_ids), dtype=np.int64)
+        self.progress_correct = np.zeros(len(user_ids) * len(genre_ids), dtype=np.int64)
+        self.progress_last = np.zeros(len(user_ids) * len(genre_ids), dtype=np.int64)
+
+        session_writer = RowWriter(QuizSession, [
+            'user', 'session_type', 'genre', 'difficulty', 'total_questions',
+            'correct_answers', 'start_time', 'end_time', 'is_completed', 'updated_at',
+        ])
+        attempt_writer = RowWriter(UserAttempt, [
+            'user', 'question', 'selected_choice', 'is_correct', 'attempt_time', 'response_time_seconds',
+        ])
+
+        with explicit_timestamps(QuizSession._meta.get_field('start_time'),
+                                 QuizSession._meta.get_field('updated_at'),
+                                 UserAttempt._meta.get_field('attempt_time')):
+            for chunk_start in range(0, total_sessions, sessions_per_chunk):
+                count = min(sessions_per_chunk, total_sessions - chunk_start)
+
+                user_index = rng.choice(len(user_ids), count, p=activity)
+                genre_index = rng.choice(len(genre_ids), count, p=genre_weights)
+                day_index = rng.choice(len(day_starts), count, p=day_weights)
+                start = (day_starts[day_index]
+                         + rng.choice(24, count, p=hour_weights) * 3600
+                         + rng.integers(0, 3600, count))
+
+                # セッション内の回答（最後のセッションは端数）
+                shape = (count, per_session)
+                question_index = (question_table['genre_start'][genre_index][:, None]
+                                  + (rng.random(shape) * question_table['genre_count'][genre_index][:, None]).astype(np.int64))
+                difficulty = question_table['difficulty'][question_index]
+                learning = profile['learning_gain'] * (day_index / max(1, self.days - 1))
+                probability = _sigmoid(difficulty_logit[difficulty - 1] + ability[user_index][:, None] + learning[:, None])
+                is_correct = rng.random(shape) < probability
+
+                correct_position = question_table['correct_position'][question_index]
+                wrong_position = (correct_position + rng.integers(1, CHOICES_PER_QUESTION, shape)) % CHOICES_PER_QUESTION
+                selected = question_table['choice_ids'][question_index, np.where(is_correct, correct_position, wrong_position)]
+
+                response = np.maximum(1, rng.gamma(2.0, answer_seconds[difficulty - 1] / 2.0)).astype(np.int64)
+                attempt_time = start[:, None] + np.cumsum(response, axis=1)
+
+                valid = np.ones(shape, dtype=bool)
+                if chunk_start + count == total_sessions and self.attempts % per_session:
+                    valid[-1, self.attempts % per_session:] = False
+                attempts_in_chunk = int(valid.sum())
+
+                completed = rng.random(count) < profile['completion_rate']
+                last_answer = np.where(valid, attempt_time, 0).max(axis=1)
+
+                self._write_sessions(
+                    session_writer, user_ids[user_index], genre_id_array[genre_index],
+                    valid, is_correct, start, last_answer, completed,
+                )
+
+                attempt_writer.write([
+                    np.repeat(user_ids[user_index], per_session).reshape(shape)[valid],
+                    question_table['ids'][question_index][valid],
+                    selected[valid],
+                    is_correct[valid],
+                    attempt_time[valid].astype('datetime64[s]'),
+                    response[valid],
+                ], attempts_in_chunk)
+
+                pair = (user_index[:, None] * len(genre_ids) + genre_index[:, None]).repeat(per_session, axis=1)[valid]
+                self.progress_total += np.bincount(pair, minlength=len(self.progress_total))
+                self.progress_correct += np.bincount(pair, weights=is_correct[valid], minlength=len(self.progress_total)).astype(np.int64)
+                np.maximum.at(self.progress_last, pair, attempt_time[valid])
+
+                self.log(f'{attempt_writer.rows_written} / {self.attempts} attempts, '
+                         f'{session_writer.rows_written} sessions')
+
+        return session_writer.rows_written, attempt_writer.rows_written
+
+    @staticmethod
+    def _write_sessions(writer, users, genres, valid, is_correct, start, last_answer, completed):
+        """完了・未完了（end_time が NULL）に分けてセッションを書き込む"""
+        answered = valid.sum(axis=1)
+        correct = (is_correct & valid).sum(axis=1)
+        for is_completed, mask in ((True, completed), (False, ~completed)):
+            end_time = (last_answer[mask] + 5).astype('datetime64[s]') if is_completed else None
+            writer.write([
+                users[mask],
+                'genre',
+                genres[mask],
+                None,
+                answered[mask],
+                correct[mask],
+                start[mask].astype('datetime64[s]'),
+                end_time,
+                is_completed,
+                end_time if is_completed else start[mask].astype('datetime64[s]'),
+            ], int(mask.sum()))
+
+    def _create_progress(self, user_ids, genre_ids):
+        """生成した回答履歴から受講者×ジャンルの学習進捗を作成する"""
+        from progress.models import UserProgress
+
+        pairs = np.flatnonzero(self.progress_total)
+        last_study = self.progress_last[pairs].astype('datetime64[s]').astype('datetime64[us]').tolist()
+        rows = [
+            UserProgress(
+                user_id=int(user_ids[pair // len(genre_ids)]),
+                genre_id=genre_ids[pair % len(genre_ids)],
+                total_attempts=int(self.progress_total[pair]),
+                correct_attempts=int(self.progress_correct[pair]),
+                last_study_date=last.replace(tzinfo=dt_timezone.utc),
+            )
+            for pair, last in zip(pairs, last_study)
+        ]
+        with explicit_timestamps(UserProgress._meta.get_field('last_study_date')):
+            UserProgress.objects.bulk_create(rows, batch_size=BULK_CREATE_BATCH_SIZE)
+        return len(rows)
@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     GenreListView, 
     QuestionListView, 
     RandomQuestionsView,
     QuestionDetailView,
-    CheckAnswerView
+    CheckAnswerView,
+    QuestionPackListView,
+    QuestionPackFileView,
 )
 
+# ASGI（uvicorn ワーカー）で動かす場合は読み取り中心のAPIを非同期版に切り替える
+if settings.ASYNC_QUIZ_VIEWS:
+    from .async_views import (
+        AsyncGenreListView as GenreListView,
+        AsyncRandomQuestionsView as RandomQuestionsView,
+        AsyncQuestionDetailView as QuestionDetailView,
+        AsyncCheckAnswerView as CheckAnswerView,
+    )
+
 app_name = 'questions'
 
 urlpatterns = [
@@ -17,5 +29,8 @@ urlpatterns = [
     path('questions/', QuestionListView.as_view(), name='question-list'),
     path('questions/random/', RandomQuestionsView.as_view(), name='random-questions'),
     path('questions/check-answer/', CheckAnswerView.as_view(), name='check-answer'),
+    # オフライン用問題パック（ファイル名は内容のハッシュを含む）
+    path('questions/packs/', QuestionPackListView.as_view(), name='question-pack-list'),
+    path('questions/packs/<str:name>', QuestionPackFileView.as_view(), name='question-pack-file'),
     path('questions/<str:id>/', QuestionDetailView.as_view(), name='question-detail'),
 ]
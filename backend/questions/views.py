@@ -4,12 +4,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-import random
 
-from .models import Genre, Question, Choice
-from .serializers import GenreSerializer, QuestionSerializer, QuestionWithoutAnswerSerializer
+from .models import Genre, Question, Choice, QuestionPack
+from .question_packs import PRIVATE_IMMUTABLE_CACHE_CONTROL, choose_pack_file, get_pack_storage
+from .serializers import (
+    GenreSerializer, QuestionSerializer, QuestionWithoutAnswerSerializer, QuestionPackSerializer
+)
 
 
 class GenreListView(generics.ListAPIView):
@@ -17,7 +20,7 @@ class GenreListView(generics.ListAPIView):
     ジャンル一覧を取得するAPI
     認証不要で誰でもアクセス可能
     """
-    queryset = Genre.objects.all()
+    queryset = Genre.objects.with_question_count()
     serializer_class = GenreSerializer
     permission_classes = [AllowAny]
     
@@ -78,14 +81,8 @@ class RandomQuestionsView(APIView):
         if difficulty:
             queryset = queryset.filter(difficulty=difficulty)
             
-        # 問題IDのリストを取得
-        question_ids = list(queryset.values_list('id', flat=True))
-        
         # ランダムに選択
-        if len(question_ids) <= count:
-            selected_ids = question_ids
-        else:
-            selected_ids = random.sample(question_ids, count)
+        selected_ids = queryset.draw_ids(count)
             
         # 選択されたIDで問題を取得
         questions = queryset.filter(id__in=selected_ids)
@@ -155,3 +152,51 @@ class CheckAnswerView(APIView):
             return Response({
                 'error': '選択肢が見つかりません'
             }, status=status.HTTP_404_NOT_FOUND)
+
+
+class QuestionPackListView(APIView):
+    """
+    オフライン用問題パックの一覧API
+    ジャンルごとの最新のパックの名前（内容のハッシュを含む）とURLを返す。
+    クライアントは content_hash が変わったパックだけを取得し直す（S3 などのURLは有効期限付きの署名付きURL）
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        packs = QuestionPack.objects.select_related('genre')
+        serializer = QuestionPackSerializer(packs, many=True, context={'request': request})
+        response = Response({
+            'count': len(serializer.data),
+            'packs': serializer.data
+        }, status=status.HTTP_200_OK)
+        # 一覧は毎回確認させる（パックのファイルは名前が変わるため長期間キャッシュさせる）
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class QuestionPackFileView(APIView):
+    """
+    オフライン用問題パックのファイル配信API（保存先がローカルの場合）
+    Accept-Encoding に応じて brotli・gzip の圧縮済みファイルをそのまま返す（.gz / .br を付けた名前は指定の形式）
+    名前に内容のハッシュを含み、同じ名前の内容は変わらないため immutable でキャッシュさせる（認証が必要なため private）
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name):
+        storage = get_pack_storage()
+        chosen = choose_pack_file(name, request.META.get('HTTP_ACCEPT_ENCODING'), storage)
+        if chosen is None:
+            raise Http404('問題パックが見つかりません')
+        file_name, encoding = chosen
+
+        etag = '"{}{}"'.format(name.split('.')[1], f'-{encoding}' if encoding else '')
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(storage.open(file_name, 'rb'), content_type='application/json; charset=utf-8')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = PRIVATE_IMMUTABLE_CACHE_CONTROL
+        response['Vary'] = 'Accept-Encoding'
+        return response
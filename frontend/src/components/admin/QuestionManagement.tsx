@@ -92,12 +92,13 @@ const QuestionManagement: React.FC = () => {
     difficulty: 1,
     is_active: true,
     reviewed_at: null as string | null,
+    // 既存の選択肢は id を保持して送信する（回答履歴が参照する選択肢を書き換えないため）
     choices: [
       { content: '', is_correct: false },
       { content: '', is_correct: false },
       { content: '', is_correct: false },
       { content: '', is_correct: false }
-    ]
+    ] as { id?: string; content: string; is_correct: boolean }[]
   });
 
   useEffect(() => {
@@ -324,6 +325,7 @@ const QuestionManagement: React.FC = () => {
       is_active: question.is_active,
       reviewed_at: question.reviewed_at || null,
       choices: question.choices.length > 0 ? question.choices.map(choice => ({
+        id: choice.id,
         content: choice.content,
         is_correct: choice.is_correct
       })) : [
@@ -388,6 +390,7 @@ const QuestionManagement: React.FC = () => {
         is_active: editForm.is_active,
         reviewed_at: editForm.reviewed_at,
         choices: validChoices.map((choice, index) => ({
+          id: choice.id,
           content: choice.content,
           is_correct: choice.is_correct,
           order_index: index